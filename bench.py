@@ -0,0 +1,1086 @@
+# =========================
+# 基准测试：本地生成 .xlsx 夹具 + 逐引擎计时（Linux CI 可用，不需要 Excel / xbot）
+#
+# 用法：
+#   python bench.py                         # 默认场景集，结果 JSON 打印到 stdout
+#   python bench.py --rows 5000 --images-per-row 2 --anchor twoCell --engines zip,native --out r.json
+#   python bench.py --suite --out bench.json --label v1.2
+#   python bench.py --com --rows 2000 --latency-ms 1  # 假 Excel 上跑三个模块的 COM 引擎，统计跨进程往返次数
+#   python bench.py --check                 # 回归检查（夹具 + 假 Excel），有失败时退出码为 1
+#
+# 每个 (场景, 引擎) 在独立的 spawn 子进程中运行，记录：
+#   wall_s / peak_rss_kb / read_bytes / written_bytes / images / images_per_s
+# =========================
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import zipfile
+import platform
+import argparse
+import tempfile
+
+
+CT_NS = "http://schemas.openxmlformats.org/package/2006/content-types"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+XDR_NS = "http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing"
+A_NS = "http://schemas.openxmlformats.org/drawingml/2006/main"
+
+REL_T = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/"
+IMAGE_CT = {"png": "image/png", "jpg": "image/jpeg"}
+
+EMU_PER_PX = 9525
+
+
+# =========================
+# 夹具生成
+# =========================
+def _make_image_bytes(rnd, fmt, size):
+    from PIL import Image as PILImage
+    w, h = size
+    base = (rnd.randrange(256), rnd.randrange(256), rnd.randrange(256))
+    pil = PILImage.new("RGB", (w, h), base)
+    # 加一些噪点，让编码后的大小接近真实照片而不是纯色
+    px = pil.load()
+    for _ in range(max(1, w * h // 16)):
+        px[rnd.randrange(w), rnd.randrange(h)] = (rnd.randrange(256), rnd.randrange(256), rnd.randrange(256))
+    out = io.BytesIO()
+    pil.save(out, format="JPEG" if fmt == "jpg" else "PNG")
+    return out.getvalue()
+
+
+def _xml_text(s):
+    return str(s).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+
+
+def _col_letter(n):
+    s = ""
+    while n > 0:
+        n, r = divmod(n - 1, 26)
+        s = chr(65 + r) + s
+    return s
+
+
+def make_workbook(path, rows=100, images_per_row=1, anchor="twoCell", image_size=(64, 64),
+                  formats=("png", "jpg"), dup_ratio=0.0, layout="row", merge_span=3,
+                  sheet_name="Sheet2", seed=0):
+    """
+    生成测试用 .xlsx（直接写 OOXML，不依赖 openpyxl）
+    anchor:
+      - "twoCell" / "oneCell": drawing 浮动图片
+      - "cell":  Excel「放置在单元格中」图片（metadata + richData）
+      - "wps":   WPS =DISPIMG("ID_xxx",1) + xl/cellimages.xml
+    layout:
+      - "row":    B 列名称、A 列图片（export.py 默认布局）
+      - "merged": A 列名称每 merge_span 行合并一次、B 列图片（export1.py 布局）
+    dup_ratio: 重复图片比例（0 = 每张都不同，0.9 = 90% 复用已有图片）
+    返回: {"images": 图片总数, "media": 不同 media 部件数, "bytes": 文件大小}
+    """
+    rnd = random.Random(seed)
+    if layout == "merged":
+        name_col, img_col = 1, 2
+    else:
+        name_col, img_col = 2, 1
+
+    # 1) 为每个图片位置分配 media（按 dup_ratio 复用）
+    media = []          # [(part_name, bytes)]
+    placements = []     # [(row, k, media_index)]
+    for r in range(1, int(rows) + 1):
+        for k in range(int(images_per_row)):
+            if media and rnd.random() < float(dup_ratio):
+                idx = rnd.randrange(len(media))
+            else:
+                fmt = formats[len(media) % len(formats)]
+                data = _make_image_bytes(rnd, fmt, image_size)
+                idx = len(media)
+                media.append(("image{}.{}".format(idx + 1, fmt), data))
+            placements.append((r, k, idx))
+
+    z = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED)
+
+    # 2) [Content_Types].xml / 包关系 / 工作簿
+    overrides = [
+        ("/xl/workbook.xml", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"),
+        ("/xl/worksheets/sheet1.xml", "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"),
+        ("/xl/sharedStrings.xml", "application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"),
+    ]
+    if anchor in ("twoCell", "oneCell"):
+        overrides.append(("/xl/drawings/drawing1.xml", "application/vnd.openxmlformats-officedocument.drawing+xml"))
+    if anchor == "cell":
+        overrides.append(("/xl/metadata.xml",
+                          "application/vnd.openxmlformats-officedocument.spreadsheetml.sheetMetadata+xml"))
+    ct = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?>', '<Types xmlns="{}">'.format(CT_NS),
+          '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>',
+          '<Default Extension="xml" ContentType="application/xml"/>']
+    for ext, ctype in IMAGE_CT.items():
+        ct.append('<Default Extension="{}" ContentType="{}"/>'.format(ext, ctype))
+    for part, ctype in overrides:
+        ct.append('<Override PartName="{}" ContentType="{}"/>'.format(part, ctype))
+    ct.append("</Types>")
+    z.writestr("[Content_Types].xml", "".join(ct))
+
+    z.writestr("_rels/.rels",
+               '<Relationships xmlns="{}"><Relationship Id="rId1" Type="{}officeDocument" '
+               'Target="xl/workbook.xml"/></Relationships>'.format(PKG_REL_NS, REL_T))
+    z.writestr("xl/workbook.xml",
+               '<workbook xmlns="{}" xmlns:r="{}"><sheets><sheet name="{}" sheetId="1" r:id="rId1"/>'
+               '</sheets></workbook>'.format(MAIN_NS, R_NS, _xml_text(sheet_name)))
+
+    wb_rels = [
+        ("rId1", REL_T + "worksheet", "worksheets/sheet1.xml"),
+        ("rId2", REL_T + "sharedStrings", "sharedStrings.xml"),
+    ]
+    if anchor == "cell":
+        wb_rels += [
+            ("rId3", REL_T + "sheetMetadata", "metadata.xml"),
+            ("rId4", "http://schemas.microsoft.com/office/2022/10/relationships/richValueRel",
+             "richData/richValueRel.xml"),
+            ("rId5", "http://schemas.microsoft.com/office/2017/06/relationships/rdRichValue",
+             "richData/rdrichvalue.xml"),
+            ("rId6", "http://schemas.microsoft.com/office/2017/06/relationships/rdRichValueStructure",
+             "richData/rdrichvaluestructure.xml"),
+        ]
+    if anchor == "wps":
+        wb_rels.append(("rId7", "http://www.wps.cn/officeDocument/2020/cellImage", "cellimages.xml"))
+    z.writestr("xl/_rels/workbook.xml.rels",
+               '<Relationships xmlns="{}">{}</Relationships>'.format(PKG_REL_NS, "".join(
+                   '<Relationship Id="{}" Type="{}" Target="{}"/>'.format(i, t, g) for i, t, g in wb_rels)))
+
+    # 3) 工作表：名称列（共享字符串）+ 单元格图片（cell / wps）
+    by_row = {}
+    for i, (r, k, idx) in enumerate(placements):
+        by_row.setdefault(r, []).append((k, idx, i))
+
+    strings = []
+    merges = []
+    sheet = ['<worksheet xmlns="{}" xmlns:r="{}"><sheetData>'.format(MAIN_NS, R_NS)]
+    for r in range(1, int(rows) + 1):
+        cells = []
+        name = None
+        if layout == "merged":
+            if (r - 1) % int(merge_span) == 0:
+                name = "group{}".format((r - 1) // int(merge_span) + 1)
+                end = min(int(rows), r + int(merge_span) - 1)
+                if end > r:
+                    merges.append("{0}{1}:{0}{2}".format(_col_letter(name_col), r, end))
+        else:
+            name = "item{}".format(r)
+
+        row_cells = {}
+        if name is not None:
+            strings.append(name)
+            row_cells[name_col] = '<c r="{}{}" t="s"><v>{}</v></c>'.format(_col_letter(name_col), r, len(strings) - 1)
+
+        # 单元格图片一格一张；多图时向右顺延
+        for k, idx, i in by_row.get(r, []):
+            col = img_col + k
+            if col == name_col:
+                col += 1
+            ref = "{}{}".format(_col_letter(col), r)
+            if anchor == "cell":
+                row_cells[col] = '<c r="{}" t="e" vm="{}"><v>#VALUE!</v></c>'.format(ref, i + 1)
+            elif anchor == "wps":
+                row_cells[col] = ('<c r="{0}" t="str"><f>_xlfn.DISPIMG("ID_{1}",1)</f>'
+                                  '<v>=DISPIMG("ID_{1}",1)</v></c>').format(ref, i + 1)
+
+        for col in sorted(row_cells):
+            cells.append(row_cells[col])
+        sheet.append('<row r="{}">{}</row>'.format(r, "".join(cells)))
+    sheet.append("</sheetData>")
+    if merges:
+        sheet.append('<mergeCells count="{}">{}</mergeCells>'.format(
+            len(merges), "".join('<mergeCell ref="{}"/>'.format(m) for m in merges)))
+    if anchor in ("twoCell", "oneCell"):
+        sheet.append('<drawing r:id="rId1"/>')
+    sheet.append("</worksheet>")
+    z.writestr("xl/worksheets/sheet1.xml", "".join(sheet))
+
+    z.writestr("xl/sharedStrings.xml", '<sst xmlns="{}" count="{}" uniqueCount="{}">{}</sst>'.format(
+        MAIN_NS, len(strings), len(strings), "".join("<si><t>{}</t></si>".format(_xml_text(s)) for s in strings)))
+
+    # 4) 图片结构
+    for part, data in media:
+        z.writestr("xl/media/" + part, data)
+    media_rels = "".join(
+        '<Relationship Id="rId{}" Type="{}image" Target="../media/{}"/>'.format(j + 1, REL_T, part)
+        for j, (part, _) in enumerate(media))
+    w_emu = int(image_size[0]) * EMU_PER_PX
+    h_emu = int(image_size[1]) * EMU_PER_PX
+
+    if anchor in ("twoCell", "oneCell"):
+        z.writestr("xl/worksheets/_rels/sheet1.xml.rels",
+                   '<Relationships xmlns="{}"><Relationship Id="rId1" Type="{}drawing" '
+                   'Target="../drawings/drawing1.xml"/></Relationships>'.format(PKG_REL_NS, REL_T))
+        z.writestr("xl/drawings/_rels/drawing1.xml.rels",
+                   '<Relationships xmlns="{}">{}</Relationships>'.format(PKG_REL_NS, media_rels))
+        anchors = []
+        for i, (r, k, idx) in enumerate(placements):
+            col0 = img_col - 1 + k
+            frm = ("<xdr:from><xdr:col>{}</xdr:col><xdr:colOff>0</xdr:colOff><xdr:row>{}</xdr:row>"
+                   "<xdr:rowOff>0</xdr:rowOff></xdr:from>").format(col0, r - 1)
+            pic = ('<xdr:pic><xdr:nvPicPr><xdr:cNvPr id="{0}" name="Picture {0}"/><xdr:cNvPicPr/></xdr:nvPicPr>'
+                   '<xdr:blipFill><a:blip r:embed="rId{1}"/><a:stretch><a:fillRect/></a:stretch></xdr:blipFill>'
+                   '<xdr:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{2}" cy="{3}"/></a:xfrm>'
+                   '<a:prstGeom prst="rect"><a:avLst/></a:prstGeom></xdr:spPr></xdr:pic>'
+                   ).format(i + 2, idx + 1, w_emu, h_emu)
+            if anchor == "twoCell":
+                to = ("<xdr:to><xdr:col>{}</xdr:col><xdr:colOff>0</xdr:colOff><xdr:row>{}</xdr:row>"
+                      "<xdr:rowOff>0</xdr:rowOff></xdr:to>").format(col0 + 1, r)
+                anchors.append('<xdr:twoCellAnchor editAs="oneCell">{}{}{}<xdr:clientData/></xdr:twoCellAnchor>'
+                               .format(frm, to, pic))
+            else:
+                anchors.append('<xdr:oneCellAnchor>{}<xdr:ext cx="{}" cy="{}"/>{}<xdr:clientData/>'
+                               '</xdr:oneCellAnchor>'.format(frm, w_emu, h_emu, pic))
+        z.writestr("xl/drawings/drawing1.xml",
+                   '<xdr:wsDr xmlns:xdr="{}" xmlns:a="{}" xmlns:r="{}">{}</xdr:wsDr>'.format(
+                       XDR_NS, A_NS, R_NS, "".join(anchors)))
+
+    elif anchor == "cell":
+        n = len(placements)
+        rd_ns = "http://schemas.microsoft.com/office/spreadsheetml/2017/richdata"
+        z.writestr("xl/metadata.xml", (
+            '<metadata xmlns="{0}" xmlns:xlrd="{1}"><metadataTypes count="1">'
+            '<metadataType name="XLRICHVALUE" minSupportedVersion="120000"/></metadataTypes>'
+            '<futureMetadata name="XLRICHVALUE" count="{2}">{3}</futureMetadata>'
+            '<valueMetadata count="{2}">{4}</valueMetadata></metadata>').format(
+            MAIN_NS, rd_ns, n,
+            "".join('<bk><extLst><ext uri="{{3e2802c4-a4d2-4d8b-9148-e3be6c30e623}}"><xlrd:rvb i="{}"/></ext>'
+                    '</extLst></bk>'.format(i) for i in range(n)),
+            "".join('<bk><rc t="1" v="{}"/></bk>'.format(i) for i in range(n))))
+        z.writestr("xl/richData/rdrichvaluestructure.xml",
+                   '<rvStructures xmlns="{}" count="1"><s t="_localImage">'
+                   '<k n="_rvRel:LocalImageIdentifier" t="i"/><k n="CalcOrigin" t="i"/></s></rvStructures>'
+                   .format(rd_ns))
+        z.writestr("xl/richData/rdrichvalue.xml", '<rvData xmlns="{}" count="{}">{}</rvData>'.format(
+            rd_ns, n, "".join('<rv s="0"><v>{}</v><v>5</v></rv>'.format(idx) for _, _, idx in placements)))
+        z.writestr("xl/richData/richValueRel.xml",
+                   '<richValueRels xmlns="http://schemas.microsoft.com/office/spreadsheetml/2022/richvaluerel" '
+                   'xmlns:r="{}">{}</richValueRels>'.format(
+                       R_NS, "".join('<rel r:id="rId{}"/>'.format(j + 1) for j in range(len(media)))))
+        z.writestr("xl/richData/_rels/richValueRel.xml.rels",
+                   '<Relationships xmlns="{}">{}</Relationships>'.format(PKG_REL_NS, media_rels))
+
+    elif anchor == "wps":
+        items = []
+        for i, (r, k, idx) in enumerate(placements):
+            items.append('<etc:cellImage><xdr:pic><xdr:nvPicPr><xdr:cNvPr id="{0}" name="ID_{0}" descr=""/>'
+                         '<xdr:cNvPicPr/></xdr:nvPicPr><xdr:blipFill><a:blip r:embed="rId{1}"/>'
+                         '<a:stretch><a:fillRect/></a:stretch></xdr:blipFill></xdr:pic></etc:cellImage>'
+                         .format(i + 1, idx + 1))
+        z.writestr("xl/cellimages.xml",
+                   '<etc:cellImages xmlns:xdr="{}" xmlns:r="{}" xmlns:a="{}" '
+                   'xmlns:etc="http://www.wps.cn/officeDocument/2017/etCustomData">{}</etc:cellImages>'
+                   .format(XDR_NS, R_NS, A_NS, "".join(items)))
+        z.writestr("xl/_rels/cellimages.xml.rels", '<Relationships xmlns="{}">{}</Relationships>'.format(
+            PKG_REL_NS, media_rels.replace("../media/", "media/")))
+
+    z.close()
+    return {"images": len(placements), "media": len(media), "bytes": os.path.getsize(path)}
+
+
+# =========================
+# 计时：每个引擎在独立子进程里跑，峰值 RSS 互不干扰
+# =========================
+def _proc_io():
+    """
+    Linux: /proc/self/io 的 rchar/wchar（含页缓存命中的读写字节数）
+    """
+    out = {}
+    try:
+        with open("/proc/self/io", "r") as f:
+            for line in f:
+                k, v = line.split(":", 1)
+                out[k.strip()] = int(v)
+    except Exception:
+        pass
+    return out
+
+
+def _peak_rss_kb():
+    """
+    Linux 优先读 /proc/self/status 的 VmHWM（exec 后重新计数）；
+    ru_maxrss 在 Linux 上会继承 fork 时父进程的峰值，只作兜底
+    """
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except Exception:
+        pass
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return int(rss / 1024) if sys.platform == "darwin" else int(rss)
+    except Exception:
+        return None
+
+
+def _dir_stats(path):
+    n = 0
+    size = 0
+    for name in os.listdir(path):
+        p = os.path.join(path, name)
+        if os.path.isfile(p) and not name.endswith(".json"):
+            n += 1
+            size += os.path.getsize(p)
+    return n, size
+
+
+def _run_engine_child(conn, xlsx_path, out_dir, kwargs):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    devnull = open(os.devnull, "w")
+    real_stdout = sys.stdout
+    try:
+        import export
+        io0 = _proc_io()
+        t0 = time.perf_counter()
+        sys.stdout = devnull
+        try:
+            ok = export.export_images_by_row(xlsx_path, out_dir, **kwargs)
+        finally:
+            sys.stdout = real_stdout
+        wall = time.perf_counter() - t0
+        io1 = _proc_io()
+        conn.send({
+            "ok": bool(ok),
+            "wall_s": round(wall, 4),
+            "peak_rss_kb": _peak_rss_kb(),
+            "read_bytes": (io1.get("rchar", 0) - io0.get("rchar", 0)) if io0 else None,
+            "written_bytes": (io1.get("wchar", 0) - io0.get("wchar", 0)) if io0 else None,
+        })
+    except Exception as e:
+        conn.send({"ok": False, "error": repr(e)})
+    finally:
+        devnull.close()
+        conn.close()
+
+
+def run_engine(xlsx_path, engine, sheet_name="Sheet2", layout="row", **kwargs):
+    import multiprocessing
+    ctx = multiprocessing.get_context("spawn")
+    out_dir = tempfile.mkdtemp(prefix="bench_out_")
+    try:
+        name_col, img_col = ("A", "B") if layout == "merged" else ("B", "A")
+        call = dict(sheetName=sheet_name, nameCol=name_col, imgCol=img_col, engine=engine)
+        call.update(kwargs)
+
+        parent, child = ctx.Pipe(duplex=False)
+        p = ctx.Process(target=_run_engine_child, args=(child, xlsx_path, out_dir, call))
+        p.start()
+        child.close()
+        res = parent.recv() if parent.poll(3600) else {"ok": False, "error": "timeout"}
+        p.join()
+
+        files, size = _dir_stats(out_dir)
+        res["images"] = files
+        res["output_bytes"] = size
+        wall = res.get("wall_s") or 0
+        res["images_per_s"] = round(files / wall, 1) if wall > 0 else None
+        return res
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+# =========================
+# COM 引擎：纯 Python 的假 Excel 对象模型（Linux 可用）
+# - 通过 excel_com.set_excel_factory 注入，三个模块的 COM 引擎逻辑可以在没有 Excel 的机器上跑通
+# - 每次属性读取 / 方法调用 / 属性赋值计一次跨进程往返（FakeCalls），可选每次往返的模拟延迟
+# - 只实现导出用到的对象：Application / Workbook / Worksheet / Range / Shape / ChartObject
+# - FakeClipboard 是剪贴板替身（excel_com.set_clipboard 注入）：复制后 delay 秒才出现图片，用于检验就绪轮询
+# =========================
+class FakeCalls(object):
+    def __init__(self, latency=0.0):
+        self.total = 0
+        self.by_name = {}
+        self.latency = float(latency or 0)
+
+    def hit(self, name):
+        self.total += 1
+        self.by_name[name] = self.by_name.get(name, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def top(self, n=10):
+        return sorted(self.by_name.items(), key=lambda kv: -kv[1])[:n]
+
+
+class FakeClipboard(object):
+    """
+    CopyPicture 时序号 +1，delay 秒后才有图片格式（模拟 Excel 异步写剪贴板）；polls 为轮询次数
+    """
+
+    def __init__(self, delay=0.0):
+        self.delay = float(delay or 0)
+        self.seq = 0
+        self.ready_at = 0.0
+        self.polls = 0
+
+    def copied(self):
+        self.seq += 1
+        self.ready_at = time.monotonic() + self.delay
+
+    def sequence(self):
+        return self.seq
+
+    def has_image(self):
+        self.polls += 1
+        return self.seq > 0 and time.monotonic() >= self.ready_at
+
+
+class _FakeCom(object):
+    """公开属性的读取 / 调用 / 赋值各计一次往返；下划线开头的内部属性不计"""
+
+    def __getattribute__(self, name):
+        if name[:1] != "_":
+            object.__getattribute__(self, "_calls").hit(name)
+        return object.__getattribute__(self, name)
+
+    def __setattr__(self, name, value):
+        if name[:1] != "_":
+            self._calls.hit(name)
+        object.__setattr__(self, name, value)
+
+
+class _FakeObj(_FakeCom):
+    """只有固定属性的 COM 对象（Rows.Count / ChartArea 等）"""
+
+    def __init__(self, calls, **attrs):
+        object.__setattr__(self, "_calls", calls)
+        for k, v in attrs.items():
+            object.__setattr__(self, k, v)
+
+
+class FakeSheet(object):
+    """
+    工作表数据（不计往返）：values {(row, col): 值}、merges [(r0, c0, r1, c1)]、
+    pictures 有单元格内图片的 {(row, col)}、shapes [(type, top, left, width, height)]
+    行高 / 列宽统一为 row_h / col_w（pt）
+    """
+
+    def __init__(self, name, values=None, merges=None, pictures=None, shapes=None, row_h=15.0, col_w=48.0):
+        self.name = name
+        self.values = values or {}
+        self.merges = list(merges or [])
+        self.pictures = set(pictures or [])
+        self.shapes = list(shapes or [])
+        self.row_h = float(row_h)
+        self.col_w = float(col_w)
+        self.clipboard = None
+        self.clip = None  # FakeClipboard（由 FakeExcel 设置）
+        self.merge_of = {}
+        for m in self.merges:
+            for r in range(m[0], m[2] + 1):
+                for c in range(m[1], m[3] + 1):
+                    self.merge_of[(r, c)] = m
+
+    def row_at(self, y):
+        return max(1, int(y // self.row_h) + 1)
+
+    def col_at(self, x):
+        return max(1, int(x // self.col_w) + 1)
+
+    def last_row(self):
+        rows = [r for (r, c) in self.values] + [r for (r, c) in self.pictures] + [m[2] for m in self.merges]
+        rows += [self.row_at(sh[1] + sh[4]) for sh in self.shapes]
+        return int(max(rows or [1]))
+
+
+def _fake_addr(r, c):
+    s = ""
+    n = c
+    while n > 0:
+        n, m = divmod(n - 1, 26)
+        s = chr(65 + m) + s
+    return "${}${}".format(s, r)
+
+
+class _FakeRange(_FakeCom):
+    def __init__(self, calls, ws, r0, c0, r1=None, c1=None):
+        object.__setattr__(self, "_calls", calls)
+        object.__setattr__(self, "_ws", ws)
+        object.__setattr__(self, "_a", (r0, c0, r1 or r0, c1 or c0))
+
+    def _sheet(self):
+        return self._ws._sheet
+
+    def _cells(self):
+        r0, c0, r1, c1 = self._a
+        return [(r, c) for r in range(r0, r1 + 1) for c in range(c0, c1 + 1)]
+
+    @property
+    def Value(self):
+        r0, c0, r1, c1 = self._a
+        values = self._sheet().values
+        if (r0, c0) == (r1, c1):
+            return values.get((r0, c0))
+        return tuple(tuple(values.get((r, c)) for c in range(c0, c1 + 1)) for r in range(r0, r1 + 1))
+
+    @property
+    def MergeCells(self):
+        merged = [rc in self._sheet().merge_of for rc in self._cells()]
+        if all(merged):
+            return True
+        return None if any(merged) else False
+
+    @property
+    def MergeArea(self):
+        m = self._sheet().merge_of.get(self._a[:2])
+        if m is None:
+            return _FakeRange(self._calls, self._ws, self._a[0], self._a[1])
+        return _FakeRange(self._calls, self._ws, *m)
+
+    @property
+    def Address(self):
+        r0, c0, r1, c1 = self._a
+        if (r0, c0) == (r1, c1):
+            return _fake_addr(r0, c0)
+        return "{}:{}".format(_fake_addr(r0, c0), _fake_addr(r1, c1))
+
+    @property
+    def Row(self):
+        return self._a[0]
+
+    @property
+    def Column(self):
+        return self._a[1]
+
+    @property
+    def Rows(self):
+        return _FakeObj(self._calls, Count=self._a[2] - self._a[0] + 1)
+
+    @property
+    def Top(self):
+        return (self._a[0] - 1) * self._sheet().row_h
+
+    @property
+    def Left(self):
+        return (self._a[1] - 1) * self._sheet().col_w
+
+    @property
+    def Height(self):
+        return (self._a[2] - self._a[0] + 1) * self._sheet().row_h
+
+    @property
+    def Width(self):
+        return (self._a[3] - self._a[1] + 1) * self._sheet().col_w
+
+    def Cells(self, i, j):
+        return _FakeRange(self._calls, self._ws, self._a[0] + int(i) - 1, self._a[1] + int(j) - 1)
+
+    def End(self, direction):
+        col = self._a[1]
+        rows = [r for (r, c) in self._sheet().values if c == col and r <= self._a[0]]
+        return _FakeRange(self._calls, self._ws, max(rows or [1]), col)
+
+    def CopyPicture(self, Appearance=1, Format=2):
+        sheet = self._sheet()
+        sheet.clipboard = "picture" if self._a[:2] in sheet.pictures else "blank"
+        if sheet.clip is not None:
+            sheet.clip.copied()
+
+
+class _FakeCells(_FakeCom):
+    def __init__(self, calls, ws):
+        object.__setattr__(self, "_calls", calls)
+        object.__setattr__(self, "_ws", ws)
+
+    def __call__(self, r, c):
+        return _FakeRange(self._calls, self._ws, int(r), int(c))
+
+    def SpecialCells(self, kind):
+        return _FakeRange(self._calls, self._ws, self._ws._sheet.last_row(), 1)
+
+
+class _FakeRows(_FakeCom):
+    def __init__(self, calls, ws):
+        object.__setattr__(self, "_calls", calls)
+        object.__setattr__(self, "_ws", ws)
+
+    @property
+    def Count(self):
+        return 1048576
+
+    def __call__(self, i):
+        return _FakeRange(self._calls, self._ws, int(i), 1)
+
+
+class _FakeShape(_FakeCom):
+    def __init__(self, calls, ws, spec):
+        object.__setattr__(self, "_calls", calls)
+        object.__setattr__(self, "_ws", ws)
+        object.__setattr__(self, "_spec", spec)
+
+    @property
+    def Type(self):
+        return self._spec[0]
+
+    @property
+    def Top(self):
+        return self._spec[1]
+
+    @property
+    def Left(self):
+        return self._spec[2]
+
+    @property
+    def Width(self):
+        return self._spec[3]
+
+    @property
+    def Height(self):
+        return self._spec[4]
+
+    @property
+    def TopLeftCell(self):
+        sheet = self._ws._sheet
+        return _FakeRange(self._calls, self._ws, sheet.row_at(self._spec[1]), sheet.col_at(self._spec[2]))
+
+    @property
+    def BottomRightCell(self):
+        sheet = self._ws._sheet
+        _, top, left, w, h = self._spec
+        return _FakeRange(self._calls, self._ws, sheet.row_at(top + h - 1e-6), sheet.col_at(left + w - 1e-6))
+
+    def CopyPicture(self, Appearance=1, Format=2):
+        sheet = self._ws._sheet
+        sheet.clipboard = "picture"
+        if sheet.clip is not None:
+            sheet.clip.copied()
+
+
+class _FakeShapes(_FakeCom):
+    def __init__(self, calls, ws):
+        object.__setattr__(self, "_calls", calls)
+        object.__setattr__(self, "_ws", ws)
+
+    @property
+    def Count(self):
+        return len(self._ws._sheet.shapes)
+
+    def Item(self, i):
+        return _FakeShape(self._calls, self._ws, self._ws._sheet.shapes[int(i) - 1])
+
+
+class _FakeChart(_FakeCom):
+    def __init__(self, calls, ws):
+        object.__setattr__(self, "_calls", calls)
+        object.__setattr__(self, "_ws", ws)
+        object.__setattr__(self, "_content", None)
+        object.__setattr__(self, "ChartArea", _FakeObj(calls, Select=lambda: None))
+
+    def Paste(self):
+        if self._ws._sheet.clipboard is None:
+            raise RuntimeError("剪贴板为空")
+        object.__setattr__(self, "_content", self._ws._sheet.clipboard)
+
+    @property
+    def Shapes(self):
+        return _FakeObj(self._calls, Count=0 if self._content is None else 1)
+
+    def Export(self, path):
+        with open(path, "wb") as f:
+            f.write(_fake_png(self._content == "picture"))
+
+
+class _FakeChartObject(_FakeCom):
+    def __init__(self, calls, ws):
+        object.__setattr__(self, "_calls", calls)
+        object.__setattr__(self, "Chart", _FakeChart(calls, ws))
+
+    def Delete(self):
+        pass
+
+
+class _FakeChartObjects(_FakeCom):
+    def __init__(self, calls, ws):
+        object.__setattr__(self, "_calls", calls)
+        object.__setattr__(self, "_ws", ws)
+
+    def Add(self, left, top, width, height):
+        return _FakeChartObject(self._calls, self._ws)
+
+
+class FakeWorksheet(_FakeCom):
+    def __init__(self, calls, sheet):
+        object.__setattr__(self, "_calls", calls)
+        object.__setattr__(self, "_sheet", sheet)
+
+    @property
+    def Name(self):
+        return self._sheet.name
+
+    @property
+    def Cells(self):
+        return _FakeCells(self._calls, self)
+
+    @property
+    def Rows(self):
+        return _FakeRows(self._calls, self)
+
+    def Columns(self, i):
+        return _FakeRange(self._calls, self, 1, int(i))
+
+    def Range(self, a, b=None):
+        r0, c0 = a._a[:2]
+        r1, c1 = (b._a[:2] if b is not None else a._a[2:])
+        return _FakeRange(self._calls, self, min(r0, r1), min(c0, c1), max(r0, r1), max(c0, c1))
+
+    @property
+    def UsedRange(self):
+        return _FakeRange(self._calls, self, 1, 1, self._sheet.last_row(), 1)
+
+    @property
+    def Shapes(self):
+        return _FakeShapes(self._calls, self)
+
+    def ChartObjects(self):
+        return _FakeChartObjects(self._calls, self)
+
+
+class FakeWorkbook(_FakeCom):
+    def __init__(self, calls, sheets):
+        object.__setattr__(self, "_calls", calls)
+        object.__setattr__(self, "_sheets", sheets)
+
+    def Worksheets(self, key):
+        if isinstance(key, int):
+            return FakeWorksheet(self._calls, self._sheets[key - 1])
+        for sheet in self._sheets:
+            if sheet.name == key:
+                return FakeWorksheet(self._calls, sheet)
+        raise KeyError(key)
+
+    def Close(self, save=False):
+        pass
+
+
+class FakeExcel(_FakeCom):
+    """
+    假的 Excel.Application：Workbooks.Open(任意路径) 都打开同一组 FakeSheet
+    calls.total 为累计往返次数；clipboard 为各工作表共用的 FakeClipboard
+    """
+
+    def __init__(self, sheets, latency=0.0, clip_delay=0.0):
+        calls = FakeCalls(latency)
+        clipboard = FakeClipboard(clip_delay)
+        for sheet in sheets:
+            sheet.clip = clipboard
+        object.__setattr__(self, "_calls", calls)
+        object.__setattr__(self, "calls", calls)
+        object.__setattr__(self, "clipboard", clipboard)
+        object.__setattr__(self, "Workbooks", _FakeObj(calls, Open=lambda path: FakeWorkbook(calls, sheets)))
+
+    def Quit(self):
+        pass
+
+
+_FAKE_PNG = {}
+
+
+def _fake_png(picture):
+    """Chart.Export 的输出：有图片时为随机噪点 PNG（约 27 KB），空白时为纯白小 PNG"""
+    if picture not in _FAKE_PNG:
+        from PIL import Image as PILImage
+        if picture:
+            pil = PILImage.frombytes("RGB", (96, 96), random.Random(0).randbytes(96 * 96 * 3))
+        else:
+            pil = PILImage.new("RGB", (64, 64), (255, 255, 255))
+        out = io.BytesIO()
+        pil.save(out, format="PNG")
+        _FAKE_PNG[picture] = out.getvalue()
+    return _FAKE_PNG[picture]
+
+
+def make_fake_excel(rows=1000, images_per_row=1, layout="row", merge_span=3, sheet_name="Sheet2", latency=0.0,
+                    clip_delay=0.0):
+    """
+    layout:
+      - "row":    B 列名称、A 列浮动图片 shape（export.py / allow_cell_fallback.py 的 COM 引擎）
+      - "merged": A 列名称每 merge_span 行合并一次、B 列单元格内图片（export1.py）
+    """
+    values, merges, pictures, shapes = {}, [], set(), []
+    row_h, col_w = 15.0, 48.0
+    if layout == "merged":
+        span = max(1, int(merge_span))
+        for r0 in range(1, int(rows) + 1, span):
+            r1 = min(int(rows), r0 + span - 1)
+            values[(r0, 1)] = "name{}".format(r0)
+            if r1 > r0:
+                merges.append((r0, 1, r1, 1))
+        for r in range(1, int(rows) + 1):
+            pictures.add((r, 2))
+    else:
+        for r in range(1, int(rows) + 1):
+            values[(r, 2)] = "name{}".format(r)
+            for k in range(int(images_per_row)):
+                shapes.append((13, (r - 1) * row_h + 1, k * col_w / 4 + 1, col_w / 4 - 2, row_h - 2))
+    sheet = FakeSheet(sheet_name, values, merges, pictures, shapes, row_h, col_w)
+    return FakeExcel([sheet], latency=latency, clip_delay=clip_delay)
+
+
+def run_com(tool="export", rows=1000, images_per_row=1, layout=None, merge_span=3, latency=0.0, clip_delay=0.0,
+            **kwargs):
+    """
+    用假 Excel 跑一个模块的 COM 引擎，返回往返次数 / 剪贴板轮询次数 / 耗时 / 导出图片数
+    tool: "export" / "allow_cell_fallback" / "export1"（export1 默认 merged 布局）
+    clip_delay: 剪贴板替身在复制后多久才就绪（秒）
+    """
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import importlib
+    import excel_com
+    mod = importlib.import_module(tool)
+    if layout is None:
+        layout = "merged" if tool == "export1" else "row"
+    sheet_name = "Sheet1" if tool == "export1" else "Sheet2"
+    app = make_fake_excel(rows, images_per_row, layout, merge_span, sheet_name, latency, clip_delay)
+
+    work_dir = tempfile.mkdtemp(prefix="bench_com_")
+    devnull = open(os.devnull, "w")
+    real_stdout = sys.stdout
+    try:
+        xlsx_path = os.path.join(work_dir, "fake.xlsx")
+        open(xlsx_path, "wb").close()  # 入口只检查文件存在，内容由假 Excel 提供
+        out_dir = os.path.join(work_dir, "out")
+        os.makedirs(out_dir)
+        excel_com.set_excel_factory(lambda: app)
+        excel_com.set_clipboard(app.clipboard)
+        name_col, img_col = ("A", "B") if layout == "merged" else ("B", "A")
+        call = dict(sheetName=sheet_name, nameCol=name_col, imgCol=img_col)
+        if tool != "export1":
+            call["engine"] = "com"
+        call.update(kwargs)
+        t0 = time.perf_counter()
+        sys.stdout = devnull
+        try:
+            ok = mod.export_images_by_row(xlsx_path, out_dir, **call)
+        finally:
+            sys.stdout = real_stdout
+        wall = time.perf_counter() - t0
+        files, _ = _dir_stats(out_dir)
+        return {
+            "tool": tool,
+            "layout": layout,
+            "rows": int(rows),
+            "ok": bool(ok),
+            "images": files,
+            "round_trips": app.calls.total,
+            "round_trips_per_row": round(app.calls.total / max(1, int(rows)), 2),
+            "top_calls": app.calls.top(),
+            "clipboard_polls": app.clipboard.polls,
+            "wall_s": round(wall, 4),
+        }
+    finally:
+        excel_com.set_excel_factory(None)
+        excel_com.set_clipboard(None)
+        devnull.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# =========================
+# 回归检查（--check）：在夹具 + 假 Excel 上复现已修过的问题，返回 [{"name", "ok", "detail"}]
+# =========================
+def _run_quiet(fn, *args, **kwargs):
+    devnull = open(os.devnull, "w")
+    real_stdout = sys.stdout
+    sys.stdout = devnull
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        sys.stdout = real_stdout
+        devnull.close()
+
+
+def check_auto_incremental(rows=20):
+    """
+    auto + incremental=1 连跑两次：第二次工作簿未变化整本跳过，
+    不应启动 Excel（假 Excel 零往返）、也不应产生新文件（如 name1_2.png）
+    """
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import excel_com
+    import export
+    work_dir = tempfile.mkdtemp(prefix="bench_check_")
+    try:
+        xlsx_path = os.path.join(work_dir, "book.xlsx")
+        make_workbook(xlsx_path, rows=rows)
+        out_dir = os.path.join(work_dir, "out")
+        os.makedirs(out_dir)
+        app = make_fake_excel(rows)
+        counter = app.calls  # 只取一次：经假对象取属性本身也计入往返
+        excel_com.set_excel_factory(lambda: app)
+        excel_com.set_clipboard(app.clipboard)
+        call = dict(sheetName="Sheet2", nameCol="B", imgCol="A", engine="auto", incremental=1)
+        _run_quiet(export.export_images_by_row, xlsx_path, out_dir, **call)
+        first = sorted(os.listdir(out_dir))
+        calls = counter.total
+        _run_quiet(export.export_images_by_row, xlsx_path, out_dir, **call)
+        second = sorted(os.listdir(out_dir))
+        new_files = sorted(set(second) - set(first))
+        com_calls = counter.total - calls
+        return {
+            "name": "auto_incremental_unchanged",
+            "ok": com_calls == 0 and not new_files,
+            "detail": {"files": len(first), "second_run_com_calls": com_calls, "new_files": new_files[:10]},
+        }
+    finally:
+        excel_com.set_excel_factory(None)
+        excel_com.set_clipboard(None)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+CHECKS = [check_auto_incremental]
+
+
+def run_checks():
+    results = []
+    for check in CHECKS:
+        try:
+            results.append(check())
+        except Exception as e:
+            results.append({"name": check.__name__, "ok": False, "detail": repr(e)})
+    return results
+
+
+# =========================
+# 场景
+# =========================
+DEFAULT_ENGINES = ("openpyxl", "zip", "native")
+
+DEFAULT_SUITE = [
+    {"name": "twoCell_1k", "rows": 1000, "images_per_row": 1, "anchor": "twoCell"},
+    {"name": "oneCell_1k_x2", "rows": 1000, "images_per_row": 2, "anchor": "oneCell"},
+    {"name": "twoCell_1k_dup90", "rows": 1000, "images_per_row": 1, "anchor": "twoCell", "dup_ratio": 0.9},
+    {"name": "twoCell_200_large", "rows": 200, "images_per_row": 1, "anchor": "twoCell", "image_size": [640, 480]},
+    # 大图：对比 memory_budget_mb 前后的峰值内存（--memory-budget-mb）
+    {"name": "twoCell_30_photo", "rows": 30, "images_per_row": 1, "anchor": "twoCell", "image_size": [1600, 1200],
+     "formats": ["png"]},
+    {"name": "cell_1k", "rows": 1000, "images_per_row": 1, "anchor": "cell"},
+    {"name": "wps_1k", "rows": 1000, "images_per_row": 1, "anchor": "wps"},
+    {"name": "merged_cell_1k", "rows": 1000, "images_per_row": 1, "anchor": "cell", "layout": "merged"},
+]
+
+_FIXTURE_KEYS = ("rows", "images_per_row", "anchor", "image_size", "formats", "dup_ratio",
+                 "layout", "merge_span", "seed")
+
+
+def run_scenario(scenario, engines=DEFAULT_ENGINES, work_dir=None, engine_kwargs=None):
+    own_dir = work_dir is None
+    if own_dir:
+        work_dir = tempfile.mkdtemp(prefix="bench_")
+    try:
+        fx_args = dict((k, scenario[k]) for k in _FIXTURE_KEYS if k in scenario)
+        if "image_size" in fx_args:
+            fx_args["image_size"] = tuple(fx_args["image_size"])
+        xlsx_path = os.path.join(work_dir, "{}.xlsx".format(scenario.get("name", "bench")))
+        t0 = time.perf_counter()
+        fixture = make_workbook(xlsx_path, **fx_args)
+        fixture["gen_s"] = round(time.perf_counter() - t0, 3)
+
+        out = []
+        for engine in engines:
+            res = run_engine(xlsx_path, engine, layout=scenario.get("layout", "row"), **(engine_kwargs or {}))
+            res["engine"] = engine
+            res["scenario"] = scenario.get("name")
+            res["fixture"] = fixture
+            out.append(res)
+        return out
+    finally:
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def run_suite(suite=None, engines=DEFAULT_ENGINES, label=None, engine_kwargs=None):
+    results = []
+    for scenario in suite or DEFAULT_SUITE:
+        results.extend(run_scenario(scenario, engines=engines, engine_kwargs=engine_kwargs))
+    return {
+        "label": label,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+
+
+def _parse_args(argv):
+    ap = argparse.ArgumentParser(description="export_images_by_row 引擎基准测试")
+    ap.add_argument("--suite", action="store_true", help="运行默认场景集（默认行为）")
+    ap.add_argument("--rows", type=int, help="单场景：行数")
+    ap.add_argument("--images-per-row", type=int, default=1)
+    ap.add_argument("--anchor", default="twoCell", choices=["twoCell", "oneCell", "cell", "wps"])
+    ap.add_argument("--image-size", default="64x64", help="如 640x480")
+    ap.add_argument("--formats", default="png,jpg")
+    ap.add_argument("--dup-ratio", type=float, default=0.0)
+    ap.add_argument("--layout", default="row", choices=["row", "merged"])
+    ap.add_argument("--engines", default=",".join(DEFAULT_ENGINES))
+    ap.add_argument("--workers", type=int, default=1, help="传给 export_images_by_row 的 workers")
+    ap.add_argument("--memory-budget-mb", type=float, default=0, help="传给 export_images_by_row 的 memory_budget_mb")
+    ap.add_argument("--label", default=None, help="结果标签（如版本号），便于对比回归")
+    ap.add_argument("--out", default=None, help="JSON 输出文件；不填则打印到 stdout")
+    ap.add_argument("--com", action="store_true", help="用假 Excel 对象模型跑 COM 引擎（统计往返次数）")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="--com：每次往返的模拟延迟（毫秒）")
+    ap.add_argument("--clip-delay-ms", type=float, default=0.0, help="--com：剪贴板复制后就绪的模拟延迟（毫秒）")
+    ap.add_argument("--check", action="store_true", help="运行回归检查（夹具 + 假 Excel），有失败时退出码为 1")
+    return ap.parse_args(argv)
+
+
+def main(argv=None):
+    a = _parse_args(argv)
+    engines = [e.strip() for e in a.engines.split(",") if e.strip()]
+    if a.check:
+        results = run_checks()
+        print(json.dumps(results, ensure_ascii=False, indent=1))
+        if not all(r["ok"] for r in results):
+            sys.exit(1)
+        return results
+    if a.com:
+        report = {
+            "label": a.label,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "latency_ms": a.latency_ms,
+            "results": [run_com(tool, rows=a.rows or 1000, images_per_row=a.images_per_row,
+                                latency=a.latency_ms / 1000.0, clip_delay=a.clip_delay_ms / 1000.0)
+                        for tool in ("export", "allow_cell_fallback", "export1")],
+        }
+        text = json.dumps(report, ensure_ascii=False, indent=1)
+        if a.out:
+            with open(a.out, "w", encoding="utf-8") as f:
+                f.write(text)
+        else:
+            print(text)
+        return report
+    suite = None
+    if a.rows:
+        w, h = [int(x) for x in a.image_size.lower().split("x")]
+        suite = [{
+            "name": "custom",
+            "rows": a.rows,
+            "images_per_row": a.images_per_row,
+            "anchor": a.anchor,
+            "image_size": [w, h],
+            "formats": tuple(f.strip() for f in a.formats.split(",") if f.strip()),
+            "dup_ratio": a.dup_ratio,
+            "layout": a.layout,
+        }]
+    engine_kwargs = {"workers": a.workers}
+    if a.memory_budget_mb:
+        engine_kwargs["memory_budget_mb"] = a.memory_budget_mb
+    report = run_suite(suite, engines=engines, label=a.label, engine_kwargs=engine_kwargs)
+    text = json.dumps(report, ensure_ascii=False, indent=1)
+    if a.out:
+        with open(a.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+# =========================
+# Excel COM 驱动层：三个导出模块共用的 COM 访问
+# - 每次属性读取 / 方法调用都是一次跨进程往返（约 1 ms），这里把逐行 / 逐 shape 的读取合并成批量读取：
+#   名称列一次 Range.Value 二维数组、合并区域按区域跳读、shape 元数据一次遍历收集、行高 / 列宽按下标缓存
+# - Excel 由 dispatch_excel() 创建；set_excel_factory() 可替换为纯 Python 的假对象模型
+#   （见 bench.py 的 FakeExcel），在 Linux 上统计往返次数、测试 / 基准引擎逻辑
+# - CopyPicture 之后用剪贴板就绪轮询（指数退避 + 截止时间）代替固定等待；
+#   剪贴板同样可用 set_clipboard() 替换为替身对象
+# - 本模块不依赖 xbot；win32com / win32clipboard 只在用到时才导入
+# =========================
+
+import re
+import time
+
+
+XL_UP = -4162
+XL_LAST_CELL = 11  # xlCellTypeLastCell
+PIC_TYPES = (11, 13)  # msoLinkedPicture=11, msoPicture=13
+
+# 单次 Range.Value 读取的最大行数（超大表分块读，避免一次返回过大的数组）
+READ_CHUNK = 65536
+
+_factory = None
+
+
+def set_excel_factory(factory):
+    """
+    factory() -> Excel.Application 兼容对象；传 None 恢复为 win32com DispatchEx
+    """
+    global _factory
+    _factory = factory
+
+
+def available():
+    if _factory is not None:
+        return True
+    try:
+        import win32com.client  # type: ignore  # noqa: F401
+        return True
+    except Exception:
+        return False
+
+
+def dispatch_excel():
+    if _factory is not None:
+        return _factory()
+    import win32com.client  # type: ignore
+    return win32com.client.DispatchEx("Excel.Application")
+
+
+# =========================
+# 就绪轮询：代替 CopyPicture 之后的固定 sleep
+# - 条件满足立即返回；否则按 first, first*factor, ...（不超过 max_step）的间隔重试，直到 timeout 秒
+# - 剪贴板就绪 = 剪贴板序号已变化（本次复制之后）且有图片格式
+# - Chart.Paste 在剪贴板就绪后同步完成，Paste 之后不再轮询 Chart（每次导出省一次 Shapes.Count 往返）
+# - sleep / clock 可注入（xbot.sleep、测试用的假时钟）
+# =========================
+POLL_FIRST = 0.01
+POLL_FACTOR = 2.0
+POLL_MAX_STEP = 0.2
+CLIP_TIMEOUT = 2.0
+# 拿不到剪贴板（没有 win32clipboard）时退回旧的固定等待
+CLIP_FALLBACK_WAIT = 0.15
+
+
+def wait_until(ready, timeout=CLIP_TIMEOUT, first=POLL_FIRST, factor=POLL_FACTOR, max_step=POLL_MAX_STEP,
+               sleep=None, clock=None):
+    """
+    ready() 为真返回 True；超过 timeout 秒仍未就绪返回 False（ready 抛异常视为未就绪）
+    """
+    sleep = sleep or time.sleep
+    clock = clock or time.monotonic
+    deadline = clock() + float(timeout)
+    step = float(first)
+    while True:
+        try:
+            if ready():
+                return True
+        except Exception:
+            pass
+        now = clock()
+        if now >= deadline:
+            return False
+        sleep(min(step, deadline - now))
+        step = min(step * float(factor), float(max_step))
+
+
+class _Win32Clipboard(object):
+    # CF_BITMAP=2, CF_DIB=8, CF_ENHMETAFILE=14
+    IMAGE_FORMATS = (2, 8, 14)
+
+    def __init__(self, mod):
+        self.mod = mod
+
+    def sequence(self):
+        return self.mod.GetClipboardSequenceNumber()
+
+    def has_image(self):
+        return any(self.mod.IsClipboardFormatAvailable(f) for f in self.IMAGE_FORMATS)
+
+
+_clipboard = None
+
+
+def set_clipboard(clipboard):
+    """
+    clipboard: 有 sequence() / has_image() 的对象；传 None 恢复为 win32clipboard
+    """
+    global _clipboard
+    _clipboard = clipboard
+
+
+def get_clipboard():
+    """返回当前剪贴板；没有 win32clipboard 时返回 None"""
+    if _clipboard is not None:
+        return _clipboard
+    try:
+        import win32clipboard  # type: ignore
+    except Exception:
+        return None
+    return _Win32Clipboard(win32clipboard)
+
+
+def clipboard_sequence():
+    """复制之前先取序号，wait_clipboard 据此判断剪贴板是否已是本次复制的内容"""
+    clip = get_clipboard()
+    if clip is None:
+        return None
+    try:
+        return clip.sequence()
+    except Exception:
+        return None
+
+
+def wait_clipboard(seq_before, timeout=CLIP_TIMEOUT, sleep=None, clock=None):
+    clip = get_clipboard()
+    if clip is None:
+        (sleep or time.sleep)(CLIP_FALLBACK_WAIT)
+        return True
+
+    def ready():
+        return (seq_before is None or clip.sequence() != seq_before) and clip.has_image()
+
+    return wait_until(ready, timeout, sleep=sleep, clock=clock)
+
+
+# =========================
+# 地址解析："$A$2" / "$A$2:$C$5" -> (r0, c0, r1, c1)
+# =========================
+_ADDR_RE = re.compile(r"^\$?([A-Za-z]{1,3})\$?(\d+)(?::\$?([A-Za-z]{1,3})\$?(\d+))?$")
+
+
+def _col_index(letters):
+    n = 0
+    for ch in letters.upper():
+        n = n * 26 + (ord(ch) - 64)
+    return n
+
+
+def parse_address(addr):
+    m = _ADDR_RE.match(str(addr or "").strip())
+    if not m:
+        return None
+    r0, c0 = int(m.group(2)), _col_index(m.group(1))
+    if m.group(3):
+        return r0, c0, int(m.group(4)), _col_index(m.group(3))
+    return r0, c0, r0, c0
+
+
+# =========================
+# 批量读取单元格值
+# =========================
+def _column_range(xl_ws, col, first_row, last_row):
+    return xl_ws.Range(xl_ws.Cells(int(first_row), int(col)), xl_ws.Cells(int(last_row), int(col)))
+
+
+def _column_of(value, n):
+    """
+    Range.Value：单个单元格返回标量，多个单元格返回 ((v,), (v,), ...)
+    """
+    if n == 1:
+        return [value]
+    return [row[0] if row else None for row in (value or ())]
+
+
+def read_column(xl_ws, col, first_row, last_row):
+    """
+    一次（超大表按 READ_CHUNK 分块）Range.Value 读出 col 列 first_row..last_row：返回 {row: value}
+    """
+    first_row, last_row = int(first_row), int(last_row)
+    out = {}
+    r = first_row
+    while r <= last_row:
+        r1 = min(last_row, r + READ_CHUNK - 1)
+        values = _column_of(_column_range(xl_ws, col, r, r1).Value, r1 - r + 1)
+        for i, v in enumerate(values):
+            out[r + i] = v
+        r = r1 + 1
+    return out
+
+
+def _empty(v):
+    return v is None or (isinstance(v, str) and not v.strip())
+
+
+def read_merged_column(xl_ws, col, first_row, last_row):
+    """
+    读取 col 列 first_row..last_row，合并单元格取所在合并区域左上角的值：返回 {row: value}
+    - 值整列一次读出；整列都没有合并（Range.MergeCells 为 False）时不再逐行检查
+    - 合并区域里除左上角外的单元格值为空：只对空单元格查 MergeArea，
+      一次拿到整个区域的地址并跳过区域内其余行（每个区域 3 次调用，而不是每行 3 次）
+    """
+    first_row, last_row = int(first_row), int(last_row)
+    values = read_column(xl_ws, col, first_row, last_row)
+    try:
+        any_merged = _column_range(xl_ws, col, first_row, last_row).MergeCells
+    except Exception:
+        any_merged = None
+    if any_merged is False:
+        return values
+
+    r = first_row
+    while r <= last_row:
+        if not _empty(values.get(r)):
+            r += 1
+            continue
+        try:
+            area = parse_address(xl_ws.Cells(r, int(col)).MergeArea.Address)
+        except Exception:
+            area = None
+        if area is None or (area[0] == area[2] and area[1] == area[3]):
+            r += 1
+            continue
+        r0, c0, r1, _ = area
+        if c0 == int(col) and first_row <= r0 <= last_row:
+            v = values.get(r0)
+        else:
+            try:
+                v = xl_ws.Cells(r0, c0).Value
+            except Exception:
+                v = None
+        for rr in range(max(r, r0), min(r1, last_row) + 1):
+            if _empty(values.get(rr)):
+                values[rr] = v
+        r = max(r, r1) + 1
+    return values
+
+
+def column_has_merges(xl_ws, col, first_row, last_row):
+    """
+    整列区域是否有合并单元格：False = 一个都没有（可以跳过逐格的 MergeCells 检查）；True / None = 有
+    """
+    try:
+        return _column_range(xl_ws, col, first_row, last_row).MergeCells is not False
+    except Exception:
+        return True
+
+
+def last_row_up(xl_ws, col):
+    """col 列最后一个非空单元格的行号（End(xlUp)）"""
+    return int(xl_ws.Cells(xl_ws.Rows.Count, int(col)).End(XL_UP).Row)
+
+
+def last_row_used(xl_ws, fallback_col):
+    """
+    比 End(xlUp) 更可靠：LastCell / UsedRange 能覆盖“只有图片/格式但没值”的行
+    （合并名称列的最后几行、单元格内图片所在的行）；都失败时退回 fallback_col 列的 End(xlUp)
+    """
+    try:
+        return int(xl_ws.Cells.SpecialCells(XL_LAST_CELL).Row)
+    except Exception:
+        pass
+    try:
+        ur = xl_ws.UsedRange
+        return int(ur.Row + ur.Rows.Count - 1)
+    except Exception:
+        pass
+    try:
+        return last_row_up(xl_ws, fallback_col)
+    except Exception:
+        return 1
+
+
+# =========================
+# shape 元数据：一次遍历收集
+# =========================
+class _Spans(object):
+    """
+    行 / 列的起始坐标（pt）按下标缓存：多个 shape 落在同一行时只读一次
+    重叠判断只需要区间内部的分界线，不读行高 / 列宽
+    """
+
+    def __init__(self, xl_ws):
+        self.xl_ws = xl_ws
+        self.rows = {}
+        self.cols = {}
+
+    def row(self, i):
+        s = self.rows.get(i)
+        if s is None:
+            s = self.rows[i] = float(self.xl_ws.Rows(i).Top)
+        return s
+
+    def col(self, i):
+        s = self.cols.get(i)
+        if s is None:
+            s = self.cols[i] = float(self.xl_ws.Columns(i).Left)
+        return s
+
+
+def best_index(lo, hi, a, b, start_of):
+    """
+    在下标 lo..hi 中找与区间 [a, b)（pt）重叠最多的行/列，并列取较小者
+    start_of(i) -> 第 i 行/列的起始坐标；[a, b) 从 lo 开始、在 hi 结束，所以只读 lo+1..hi 的分界线
+    """
+    lo, hi = int(lo), int(hi)
+    best_i, best_ov = lo, None
+    start = a
+    for i in range(lo, hi + 1):
+        end = start_of(i + 1) if i < hi else b
+        ov = min(b, end) - max(a, start)
+        if best_ov is None or ov > best_ov:
+            best_i, best_ov = i, ov
+        start = end
+    return best_i
+
+
+def _cell_of(rng):
+    a = parse_address(rng.Address)
+    if a is not None:
+        return a[0], a[1]
+    return int(rng.Row), int(rng.Column)
+
+
+def collect_shapes(xl_ws, anchor_match="overlap", pic_types=PIC_TYPES):
+    """
+    遍历一次 Shapes，返回图片 shape：[{"index", "shape", "row", "col", "width", "height"}, ...]
+    - 非图片类型只读 Type 就跳过
+    - 左上角 / 右下角单元格各用一次 Address 读取行列
+    - anchor_match="overlap"：在左上角..右下角范围内按重叠面积取行/列（行高 / 列宽按下标缓存）；
+      左上角与右下角是同一个单元格时（绝大多数图片）结果就是该单元格，不再读 Top / Left / 行高列宽
+    - width / height 读一次后随结果返回，导出时不再读取
+    读取失败的 shape 跳过
+    """
+    spans = _Spans(xl_ws)
+    out = []
+    shapes = xl_ws.Shapes
+    for i in range(1, int(shapes.Count) + 1):
+        shp = shapes.Item(i)
+        try:
+            if int(shp.Type) not in pic_types:
+                continue
+            r, c = _cell_of(shp.TopLeftCell)
+            width, height = float(shp.Width), float(shp.Height)
+        except Exception:
+            continue
+
+        if anchor_match == "overlap":
+            try:
+                br_r, br_c = _cell_of(shp.BottomRightCell)
+                if br_r != r:
+                    top = float(shp.Top)
+                    r = best_index(r, br_r, top, top + height, spans.row)
+                if br_c != c:
+                    left = float(shp.Left)
+                    c = best_index(c, br_c, left, left + width, spans.col)
+            except Exception:
+                pass
+
+        out.append({"index": i, "shape": shp, "row": r, "col": c, "width": width, "height": height})
+    return out
@@ -5,52 +5,916 @@
 # 4. 可视化流程中可以通过"调用模块"的指令使用此模块
 
 import os
-import re
+import threading
 import io
-from collections import defaultdict
-
-from xbot import print as xprint
+import json
+import glob
+import time
+import shutil
+import hashlib
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+try:
+    from xbot import print as xprint, sleep as xsleep
+except ImportError:
+    xprint = None  # 非 Xbot 环境（命令行 / CI），xlog 退回 builtins.print
+    xsleep = None  # 剪贴板就绪轮询退回 time.sleep
 
 from openpyxl import load_workbook
-from openpyxl.utils import column_index_from_string
+from openpyxl.utils import column_index_from_string, get_column_letter
 from openpyxl.utils.cell import coordinate_to_tuple
 
+try:
+    from . import xlsx_native, excel_com, journal, export_core  # Xbot 应用内以包方式加载
+except ImportError:
+    import xlsx_native
+    import excel_com
+    import journal
+    import export_core
+
 
 # =========================
-# 安全打印：永远只传 1 个字符串参数给 xbot.print
+# 日志：分级 + 缓冲 + 进度汇总（见 export_core.Log），永远只传 1 个字符串参数给 xbot.print
+# 不在 Xbot 中运行时退回 builtins.print；tar 写到 stdout 时 _LOG.stream 改为 stderr
 # =========================
-def xlog(msg):
+def _print_raw(text):
     try:
-        xprint(str(msg))
+        xprint(text)
     except Exception:
         try:
             import builtins
-            builtins.print(str(msg))
+            builtins.print(text)
         except Exception:
             pass
 
 
+_LOG = export_core.Log(_print_raw)
+
+
+def xlog(msg, level="info"):
+    _LOG.emit(msg, level)
+
+
+# =========================
+# 文件名清洗 + 防覆盖命名（三个模块共用，见 export_core）
+# =========================
+_safe_filename = export_core.safe_filename
+_NameRegistry = export_core.NameRegistry
+
+
+# =========================
+# 输出端（sink）：图片写到哪里
+# - "dir"（默认）：逐个文件写入 imgSavePath
+# - "zip"：写入单个 zip；PNG/JPEG/GIF/WebP 本身已压缩，用 STORED 原样存入，其它格式 DEFLATE
+# - "tar"：写入单个 tar（流式写出，可写到文件或 "-" = stdout），重复图片用 tar 硬链接条目
+# 命名规则与目录输出一致（_safe_filename + _NameRegistry 同名后缀），归档内命名只在内存中分配
+# 写入归档时加锁，workers>1 的写出线程可以并发转码
+# write_stream(key, fp, size, chunk)：从文件对象分块写入（低内存模式，见 _Budget），返回写出字节数
+# =========================
+SINKS = ("dir", "zip", "tar")
+_STORED_EXTS = set(["png", "jpg", "jpeg", "gif", "webp"])
+
+
+class _DirSink(object):
+    kind = "dir"
+    can_link = True
+
+    def __init__(self, dir_path, reclaim_empty=False):
+        self.dir_path = dir_path
+        self.reclaim_empty = reclaim_empty
+        self.registry = _NameRegistry(dir_path, reclaim_empty)
+
+    def allocate(self, filename):
+        return self.registry.allocate(filename)
+
+    def release(self, key, forget=True):
+        self.registry.release(key, forget)
+
+    def write(self, key, payload):
+        with open(key, "wb") as f:
+            f.write(payload)
+
+    def write_stream(self, key, fp, size, chunk):
+        with open(key, "wb") as f:
+            shutil.copyfileobj(fp, f, chunk)
+        return size
+
+    def link(self, canonical, key):
+        # 源文件不在时不动占位，由调用方改为直接写出
+        if not os.path.isfile(canonical):
+            return False
+        # key 上是命名时创建的空占位文件，先删除再建硬链接
+        os.remove(key)
+        os.link(canonical, key)
+        return True
+
+    def read(self, key):
+        with open(key, "rb") as f:
+            return f.read()
+
+    def read_meta(self, name):
+        path = os.path.join(self.dir_path, name)
+        if not os.path.isfile(path):
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def write_meta(self, name, payload):
+        _atomic_write(os.path.join(self.dir_path, name), payload)
+
+    def sub(self, name):
+        path = os.path.join(self.dir_path, name)
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        return _DirSink(path, self.reclaim_empty)
+
+    def close(self):
+        # 没写出内容的空占位（中途异常 / 中断）不留在目录里
+        self.registry.cleanup()
+
+
+class _ZipSink(object):
+    kind = "zip"
+    can_link = False  # zip 没有链接条目，重复图片在 hardlink 模式下写副本
+
+    def __init__(self, path):
+        import zipfile
+        self.path = path
+        self.zipfile = zipfile
+        self.zf = zipfile.ZipFile(path, "w", allowZip64=True)
+        self.registry = _NameRegistry(None)
+        self.lock = threading.Lock()
+
+    def allocate(self, filename):
+        return self.registry.allocate(filename)
+
+    def release(self, key, forget=True):
+        self.registry.release(key, forget)
+
+    def _info(self, key):
+        info = self.zipfile.ZipInfo(key, date_time=time.localtime()[:6])
+        ext = os.path.splitext(key)[1].lstrip(".").lower()
+        info.compress_type = self.zipfile.ZIP_STORED if ext in _STORED_EXTS else self.zipfile.ZIP_DEFLATED
+        return info
+
+    def write(self, key, payload):
+        info = self._info(key)
+        with self.lock:
+            self.zf.writestr(info, payload)
+
+    def write_stream(self, key, fp, size, chunk):
+        info = self._info(key)
+        info.file_size = size  # 预知大小，超过 4 GB 时自动用 ZIP64
+        with self.lock:
+            with self.zf.open(info, "w") as out:
+                shutil.copyfileobj(fp, out, chunk)
+        return size
+
+    def link(self, canonical, key):
+        return False
+
+    def read_meta(self, name):
+        return None
+
+    def write_meta(self, name, payload):
+        self.write(name, payload)
+
+    def sub(self, name):
+        return _PrefixSink(self, name)
+
+    def close(self):
+        self.zf.close()
+
+
+class _TarSink(object):
+    kind = "tar"
+    can_link = True
+
+    def __init__(self, path):
+        import sys
+        import tarfile
+        self.path = path
+        self.tarfile = tarfile
+        if path == "-":
+            # 流式写到 stdout；日志改走 stderr，避免混入 tar 数据（本进程之后的日志都走 stderr）
+            _LOG.stream = sys.stderr
+            self.tf = tarfile.open(fileobj=sys.stdout.buffer, mode="w|")
+        else:
+            self.tf = tarfile.open(path, mode="w")
+        self.registry = _NameRegistry(None)
+        self.lock = threading.Lock()
+
+    def allocate(self, filename):
+        return self.registry.allocate(filename)
+
+    def release(self, key, forget=True):
+        self.registry.release(key, forget)
+
+    def _info(self, key):
+        info = self.tarfile.TarInfo(key)
+        info.mtime = int(time.time())
+        info.mode = 0o644
+        return info
+
+    def write(self, key, payload):
+        info = self._info(key)
+        info.size = len(payload)
+        with self.lock:
+            self.tf.addfile(info, io.BytesIO(payload))
+
+    def write_stream(self, key, fp, size, chunk):
+        info = self._info(key)
+        info.size = size
+        with self.lock:
+            self.tf.addfile(info, fp)
+        return size
+
+    def link(self, canonical, key):
+        info = self._info(key)
+        info.type = self.tarfile.LNKTYPE
+        info.linkname = canonical
+        with self.lock:
+            self.tf.addfile(info)
+        return True
+
+    def read_meta(self, name):
+        return None
+
+    def write_meta(self, name, payload):
+        self.write(name, payload)
+
+    def sub(self, name):
+        return _PrefixSink(self, name)
+
+    def close(self):
+        self.tf.close()
+        if self.path == "-":
+            import sys
+            sys.stdout.buffer.flush()
+
+
+class _PrefixSink(object):
+    """
+    归档内的子目录（多工作表导出时每个工作表一个前缀）：命名在前缀内独立分配，写入共用同一个归档
+    """
+
+    def __init__(self, parent, prefix):
+        self.parent = parent
+        self.prefix = prefix
+        self.kind = parent.kind
+        self.can_link = parent.can_link
+        self.registry = _NameRegistry(None)
+
+    def allocate(self, filename):
+        return "{}/{}".format(self.prefix, self.registry.allocate(filename))
+
+    def release(self, key, forget=True):
+        self.registry.release(key, forget)
+
+    def write(self, key, payload):
+        self.parent.write(key, payload)
+
+    def write_stream(self, key, fp, size, chunk):
+        return self.parent.write_stream(key, fp, size, chunk)
+
+    def link(self, canonical, key):
+        return self.parent.link(canonical, key)
+
+    def read_meta(self, name):
+        return None
+
+    def write_meta(self, name, payload):
+        self.parent.write("{}/{}".format(self.prefix, name), payload)
+
+    def sub(self, name):
+        return _PrefixSink(self.parent, "{}/{}".format(self.prefix, name))
+
+    def close(self):
+        pass
+
+
+def _open_sink(sink, imgSavePath, xlsx_path=None, sink_path=None, reclaim_empty=False):
+    """
+    sink_path 为空时，归档写到 imgSavePath/<工作簿文件名>.zip / .tar
+    reclaim_empty: 目录输出时接管上次崩溃留下的 0 字节占位（续跑，见 NameRegistry）
+    """
+    sink = str(sink or "dir").strip().lower()
+    if sink not in SINKS:
+        xlog("sink 不支持: {}，改用 dir".format(sink), "warn")
+        sink = "dir"
+    if sink == "dir":
+        return _DirSink(imgSavePath, reclaim_empty)
+    if not sink_path:
+        stem = os.path.splitext(os.path.basename(xlsx_path or "images"))[0]
+        sink_path = os.path.join(imgSavePath, "{}.{}".format(_safe_filename(stem, default="images"), sink))
+    if sink == "zip":
+        return _ZipSink(sink_path)
+    return _TarSink(sink_path)
+
+
+
+# =========================
+# 图片格式：按文件头识别（不解码）+ 可选转码
+# passthrough=1：原始字节原样写出，扩展名由文件头判断（默认，最快且无损）
+# convert_format：显式要求转码时才用 PIL 解码，如 "png" / "jpg"
+# =========================
+def _sniff_image_ext(data):
+    head = bytes(data[:16])
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[:2] == b"BM":
+        return "bmp"
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return "tiff"
+    if head[:4] == b"\x01\x00\x00\x00":
+        return "emf"
+    if head[:4] == b"\xd7\xcd\xc6\x9a":
+        return "wmf"
+    return None
+
+
+def _pil_format(fmt):
+    fmt = str(fmt).strip().upper().lstrip(".")
+    if fmt in ("JPG", "JPE"):
+        return "JPEG"
+    if fmt == "TIF":
+        return "TIFF"
+    return fmt
+
+
+def _ext_of_pil_format(fmt):
+    fmt = (fmt or "PNG").upper()
+    return "jpg" if fmt == "JPEG" else fmt.lower()
+
+
+def _prepare_image(data, passthrough=1, convert_format=None, fallback_ext="png"):
+    """
+    返回 (要写出的 bytes, 扩展名)
+    convert_format 为 _new_transform 返回的 dict 时走缩放 / 转码后处理
+    """
+    if isinstance(convert_format, dict):
+        return _transform_image(data, convert_format, fallback_ext)
+
+    if convert_format:
+        from PIL import Image as PILImage
+        pil = PILImage.open(io.BytesIO(data))
+        fmt = _pil_format(convert_format)
+        if fmt == "JPEG" and pil.mode not in ("RGB", "L"):
+            pil = pil.convert("RGB")
+        out = io.BytesIO()
+        pil.save(out, format=fmt)
+        return out.getvalue(), _ext_of_pil_format(fmt)
+
+    if int(passthrough) == 1:
+        return data, _sniff_image_ext(data) or fallback_ext
+
+    # passthrough=0：旧行为，解码后按原格式重新编码
+    from PIL import Image as PILImage
+    pil = PILImage.open(io.BytesIO(data))
+    fmt = (pil.format or "PNG").upper()
+    out = io.BytesIO()
+    pil.save(out, format=fmt)
+    return out.getvalue(), _ext_of_pil_format(fmt)
+
+
+# =========================
+# 可选后处理：缩放 / 转码（在写出线程里执行，workers>1 时并行）
+# max_dim:            最长边上限（像素），超过才等比缩小
+# convert_format:     目标格式；只给 max_dim 等选项时保持原格式
+# jpeg_quality:       JPEG / WebP 质量（1-95）
+# png_compress_level: PNG 压缩级别（0-9）
+# strip_metadata:     1 = 去掉 EXIF / ICC（先按 EXIF 方向旋正）；0 = 保留
+# - JPEG 需要缩小时先用 draft 模式按 1/2、1/4、1/8 解码，大图不再整幅解码
+# - 没有任何后处理选项时不解码（passthrough）；图片已经满足要求时原始字节直接写出
+# =========================
+def _new_transform(convert_format=None, max_dim=None, jpeg_quality=None, png_compress_level=None,
+                   strip_metadata=0):
+    """
+    没有缩放 / 质量 / 元数据选项时原样返回 convert_format（旧行为）
+    否则返回 dict，替代 convert_format 传给各引擎
+    """
+    if not max_dim and jpeg_quality is None and png_compress_level is None and not int(strip_metadata or 0):
+        return convert_format
+    return {
+        "format": convert_format or None,
+        "max_dim": int(max_dim) if max_dim else None,
+        "quality": int(jpeg_quality) if jpeg_quality is not None else None,
+        "compress_level": int(png_compress_level) if png_compress_level is not None else None,
+        "strip": int(strip_metadata or 0),
+    }
+
+
+def _transform_image(data, t, fallback_ext="png"):
+    """
+    按 _new_transform 的选项处理一张图片：返回 (bytes, 扩展名)
+    """
+    src_ext = _sniff_image_ext(data) or fallback_ext
+    fmt = _pil_format(t["format"]) if t["format"] else None
+    if fmt is None and src_ext in ("emf", "wmf"):
+        return data, src_ext  # 矢量图不转码
+
+    from PIL import Image as PILImage
+    pil = PILImage.open(io.BytesIO(data))
+    src_fmt = (pil.format or "PNG").upper()
+    if fmt is None and getattr(pil, "is_animated", False):
+        return data, src_ext  # 动图只缩第一帧会丢动画，不指定格式时原样写出
+    fmt = fmt or src_fmt
+    max_dim = t["max_dim"]
+    shrink = bool(max_dim) and max(pil.size) > max_dim
+
+    # 不需要缩小、格式不变、也没有编码 / 元数据选项：原样写出，不解码
+    if not shrink and fmt == src_fmt and t["quality"] is None and t["compress_level"] is None and not t["strip"]:
+        return data, src_ext
+
+    if shrink:
+        w, h = pil.size
+        scale = float(max_dim) / max(w, h)
+        size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+        if src_fmt == "JPEG":
+            pil.draft(None, size)  # 只对 JPEG 有效：DCT 缩放解码
+    if t["strip"]:
+        from PIL import ImageOps
+        pil = ImageOps.exif_transpose(pil)
+    if shrink:
+        pil.thumbnail((max_dim, max_dim), PILImage.LANCZOS)
+
+    if fmt == "JPEG" and pil.mode not in ("RGB", "L"):
+        pil = pil.convert("RGB")
+
+    kw = {}
+    if fmt in ("JPEG", "WEBP") and t["quality"] is not None:
+        kw["quality"] = t["quality"]
+    if fmt == "PNG" and t["compress_level"] is not None:
+        kw["compress_level"] = t["compress_level"]
+    if t["strip"]:
+        pil.info.pop("icc_profile", None)
+        pil.info.pop("exif", None)
+    else:
+        for k in ("exif", "icc_profile"):
+            if pil.info.get(k):
+                kw[k] = pil.info[k]
+
+    out = io.BytesIO()
+    pil.save(out, format=fmt, **kw)
+    return out.getvalue(), _ext_of_pil_format(fmt)
+
+
+# =========================
+# 相同图片去重（同一 media 部件 / 相同内容只读取、写入一次）
+# dedup:
+#   - "hardlink": 重复图片以硬链接落盘（默认；不支持硬链接时退回写副本）
+#   - "manifest": 重复图片不落盘，只记录到 imgSavePath/dedup_manifest.json
+#   - "off":      每张都写独立副本（旧行为）
+# 去重判定都在主线程完成（按原始字节 sha1），写出线程只负责落盘
+# =========================
+DEDUP_MANIFEST = "dedup_manifest.json"
+
+
+def _new_dedup(mode):
+    mode = str(mode or "off").strip().lower()
+    if mode not in ("hardlink", "manifest"):
+        mode = "off"
+    # by_part: media 部件 -> (首个落盘路径, 扩展名)；by_hash: 原始字节 sha1 -> 首个落盘路径
+    # sig_media: 低内存模式的 CRC32+大小 指纹 -> 首个部件（见 _stream_signature）
+    # pending: 首次出现、尚未写完的路径 -> (指纹, 部件)；写出成功后才登记到 by_part / by_hash（见 _dedup_commit）
+    # inflight: 指纹 -> 尚未写完的首个路径（workers>1 时在途的重复图片等它写完再链接）
+    # same_as: 重复图片路径 -> 源路径；manifest 模式在确认未落盘后才写入 manifest
+    return {"mode": mode, "by_part": {}, "by_hash": {}, "sig_media": {}, "manifest": [], "pending": {},
+            "inflight": {}, "same_as": {}}
+
+
+def _dedup_lookup_part(dedup, media_part, sink):
+    """
+    原生引擎：同一 media 部件已写过则直接返回 (路径, 扩展名)，无需再读取
+    输出端不支持链接（zip）时 hardlink 模式要写副本，需要原始字节，不走这条捷径
+    """
+    if dedup["mode"] == "off" or not media_part:
+        return None
+    if dedup["mode"] == "hardlink" and not sink.can_link:
+        return None
+    return dedup["by_part"].get(media_part)
+
+
+def _stream_signature(dedup, zf, media):
+    """
+    低内存模式的去重指纹（不读取字节）：zip 目录中的 CRC32 + 大小
+    与先登记的部件指纹相同时分块比对内容，不同则返回 None（按新图片处理）
+    """
+    if dedup["mode"] == "off":
+        return None
+    sig = "zip:" + xlsx_native.media_signature(zf, media)
+    first = dedup["sig_media"].setdefault(sig, media)
+    if first != media and not xlsx_native.same_media(zf, first, media):
+        return None
+    return sig
+
+
+def _dedup_plan(dedup, save_path, data=None, media_part=None, canonical=None, signature=None):
+    """
+    决定 save_path 是否为重复图片：返回首个落盘路径（重复）或 None（首次出现）
+    首次出现的路径先记为待定，写出成功后才成为后续重复图片的源（_dedup_commit）；
+    在途的源只按内容指纹命中（调用方有字节 / 可从部件重读），源写出失败时重复图片改为直接写出
+    signature: 不读取字节时代替 sha1 的内容指纹（低内存模式，调用方已核对内容）
+    """
+    if dedup["mode"] == "off":
+        return None
+
+    digest = None
+    if canonical is None and (data is not None or signature is not None):
+        digest = hashlib.sha1(data).hexdigest() if data is not None else signature
+        canonical = dedup["by_hash"].get(digest) or dedup["inflight"].get(digest)
+
+    if canonical is None:
+        if digest is not None:
+            dedup["inflight"][digest] = save_path
+        if digest is not None or media_part:
+            dedup["pending"][save_path] = (digest, media_part)
+        return None
+
+    dedup["same_as"][save_path] = canonical
+    return canonical
+
+
+def _dedup_commit(dedup, save_path, action):
+    """
+    写出线程完成后（主线程，按提交顺序，见 _new_tally）：
+    首次出现的图片写出成功才登记为源，失败则丢弃；重复图片确实没有落盘（"manifest"）才记入 manifest
+    action 为 None 表示写出失败
+    """
+    if dedup is None:
+        return
+    canonical = dedup["same_as"].pop(save_path, None)
+    if canonical is not None and action == "manifest":
+        dedup["manifest"].append({"name": os.path.basename(save_path), "same_as": os.path.basename(canonical)})
+    pending = dedup["pending"].pop(save_path, None)
+    if pending is None:
+        return
+    digest, media_part = pending
+    if digest is not None and dedup["inflight"].get(digest) == save_path:
+        del dedup["inflight"][digest]
+    if action != "write":
+        return
+    if digest is not None:
+        dedup["by_hash"].setdefault(digest, save_path)
+    if media_part:
+        dedup["by_part"].setdefault(media_part, (save_path, os.path.splitext(save_path)[1].lstrip(".")))
+
+
+def _finish_dedup(dedup, sink):
+    """
+    追加到 dedup_manifest.json：目录输出时加锁读-改-写（export_batch 多进程共用一个输出目录时不互相覆盖），
+    并去掉文件已不存在的旧记录
+    """
+    if dedup["mode"] != "manifest" or not dedup["manifest"]:
+        return
+    with _file_lock(os.path.join(sink.dir_path, DEDUP_MANIFEST)) if sink.kind == "dir" else _no_lock():
+        entries = []
+        try:
+            old = sink.read_meta(DEDUP_MANIFEST)
+            if old:
+                entries = list(json.loads(old.decode("utf-8")))
+        except Exception:
+            entries = []
+        if sink.kind == "dir":
+            entries = [e for e in entries
+                       if os.path.exists(os.path.join(sink.dir_path, e.get("name", "")))
+                       and os.path.exists(os.path.join(sink.dir_path, e.get("same_as", "")))]
+        entries.extend(dedup["manifest"])
+        sink.write_meta(DEDUP_MANIFEST, json.dumps(entries, ensure_ascii=False, indent=1).encode("utf-8"))
+
+
+# =========================
+# 导出报告：各引擎导出图片数、行数、读写字节数、各阶段耗时（秒）
+# - export_images_by_row(..., return_result=1) 时返回该 dict（可直接 json.dumps），否则仍返回 bool
+# - decode / write 是各写出线程耗时之和，workers>1 时可能大于 total
+# =========================
+REPORT_STAGES = ("open", "parse", "names", "decode", "write", "com", "total")
+
+
+def _new_report(engine=None):
+    return {
+        "ok": False,
+        "engine": engine,
+        "images": {},  # 引擎 -> 导出图片数
+        "rows": {"exported": 0, "skipped": 0, "failed": 0},
+        "bytes": {"read": 0, "written": 0},
+        "timings": dict((k, 0.0) for k in REPORT_STAGES),
+    }
+
+
+def _report_time(report, stage, t0):
+    """把 t0 到现在的耗时累加到 stage，返回当前时间（方便连续计时）"""
+    t1 = time.perf_counter()
+    report["timings"][stage] += t1 - t0
+    return t1
+
+
+def _report_rows(report, tag, exported, exported_rows, failed_rows):
+    report["images"][tag] = report["images"].get(tag, 0) + exported
+    report["rows"]["exported"] += len(exported_rows)
+    report["rows"]["failed"] += len(set(failed_rows) - set(exported_rows))
+
+
+# =========================
+# 写出阶段：workers>1 时用有界线程池并行转码/落盘
+# - 文件名在主线程按顺序分配（_NameRegistry 占位），命名与串行完全一致
+# - 在途任务数上限 workers*2：读取快于写出时主线程阻塞等待（背压），内存有界
+# - 有内存预算（_Budget）时，在途任务占用的字节数（cost）之和也不超过预算
+# - 结果按提交顺序回收，导出数量 / 已导出行集合与串行一致
+# =========================
+class _Writer(object):
+    def __init__(self, workers, on_done, budget=None):
+        self.workers = max(1, int(workers or 1))
+        self.on_done = on_done  # on_done(ctx, result, error)
+        self.limit = budget.limit if budget is not None else None
+        self.in_flight = 0
+        self.pool = None
+        if self.workers > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        self.pending = deque()
+        self.futures = {}
+
+    def _full(self, cost):
+        if len(self.pending) >= self.workers * 2:
+            return True
+        # 单个任务超过预算时，等前面的任务都写完再单独执行
+        return self.limit is not None and self.in_flight + cost > self.limit
+
+    def submit(self, ctx, save_path, fn, *args, cost=0):
+        if self.pool is None:
+            try:
+                res = fn(*args)
+            except Exception as e:
+                self.on_done(ctx, None, e)
+            else:
+                self.on_done(ctx, res, None)
+            return
+
+        while self.pending and self._full(cost):
+            self._reap_one()
+        fut = self.pool.submit(fn, *args)
+        self.futures[save_path] = fut
+        self.pending.append((ctx, save_path, fut, cost))
+        self.in_flight += cost
+
+    def wait_for(self, save_path):
+        """等 save_path 的写出完成；写出失败返回 False"""
+        fut = self.futures.get(save_path)
+        if fut is not None:
+            try:
+                fut.result()
+            except Exception:
+                return False
+        return True
+
+    def _reap_one(self):
+        ctx, save_path, fut, cost = self.pending.popleft()
+        self.in_flight -= cost
+        try:
+            res = fut.result()
+        except Exception as e:
+            self.on_done(ctx, None, e)
+        else:
+            self.on_done(ctx, res, None)
+
+    def close(self):
+        try:
+            while self.pending:
+                self._reap_one()
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown(wait=True)
+                self.pool = None
+
+
+# =========================
+# 低内存模式：memory_budget_mb 为在途图片字节的预算（MB），0 / None = 不限制（默认）
+# - 原样写出（passthrough=1 且不转码）时 media 部件按 chunk 分块从 zip 流式写入 sink，
+#   图片字节不整体读入内存；扩展名只读文件头判断，去重指纹用 zip 目录中的 CRC32 + 大小
+#   （指纹相同再分块比对内容确认）
+# - 需要转码 / 缩放时仍整张读入，按压缩后大小计入预算
+# - 写出线程的在途字节数之和不超过预算（_Writer 背压）；chunk = 预算 / (2 * workers + 1)，上限 STREAM_CHUNK
+# - XML 本来就是流式解析并清理元素（xlsx_native._stream），峰值内存与图片数量基本无关
+# - openpyxl 会整本载入图片，预算对其无效：auto 模式下原生解析异常时不再退回 openpyxl
+# =========================
+STREAM_CHUNK = 1024 * 1024
+STREAM_CHUNK_MIN = 64 * 1024
+
+
+class _Budget(object):
+    def __init__(self, limit, workers):
+        self.limit = int(limit)
+        per_task = self.limit // (2 * max(1, int(workers or 1)) + 1)
+        self.chunk = max(STREAM_CHUNK_MIN, min(STREAM_CHUNK, per_task))
+
+
+def _new_budget(memory_budget_mb, workers=1):
+    try:
+        mb = float(memory_budget_mb or 0)
+    except (TypeError, ValueError):
+        xlog("memory_budget_mb 不是数字: {}，不限制内存".format(memory_budget_mb), "warn")
+        return None
+    if mb <= 0:
+        return None
+    return _Budget(mb * 1024 * 1024, workers)
+
+
+def _target_ext(data, passthrough, convert_format, fallback_ext="png"):
+    """
+    不解码，提前确定输出扩展名（用于主线程分配文件名）
+    """
+    if isinstance(convert_format, dict):
+        convert_format = convert_format["format"]
+    if convert_format:
+        return _ext_of_pil_format(_pil_format(convert_format))
+    return _sniff_image_ext(data) or fallback_ext
+
+
+def _emit_image(writer, sink, save_path, data, passthrough, convert_format, fallback_ext, mode, canonical):
+    """
+    写出线程：转码 + 写入 sink
+    返回 (action, 写出字节数, 解码耗时, 落盘耗时)，action 为实际动作 "write" / "link" / "manifest"
+    源写出失败时（只可能是按内容命中的在途源，data 不为 None）直接写出
+    """
+    if canonical is not None and not writer.wait_for(canonical):
+        canonical = None
+    if canonical is not None and mode == "manifest":
+        return "manifest", 0, 0.0, 0.0
+
+    if canonical is not None:
+        if mode == "hardlink":
+            try:
+                if sink.link(canonical, save_path):
+                    return "link", 0, 0.0, 0.0
+            except Exception:
+                pass
+        if data is None:
+            # 部件命中时没有读取原始字节：直接复制首个输出
+            t0 = time.perf_counter()
+            payload = sink.read(canonical)
+            sink.write(save_path, payload)
+            return "write", len(payload), 0.0, time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    payload, _ = _prepare_image(data, passthrough, convert_format, fallback_ext=fallback_ext)
+    t1 = time.perf_counter()
+    sink.write(save_path, payload)
+    return "write", len(payload), t1 - t0, time.perf_counter() - t1
+
+
+def _emit_stream(writer, sink, save_path, zf, media, chunk, mode, canonical):
+    """
+    写出线程（低内存模式）：media 部件边解压边分块写入 sink，不把整张图片读进内存
+    返回值同 _emit_image；源写出失败时同样从部件直接写出
+    """
+    if canonical is not None and not writer.wait_for(canonical):
+        canonical = None
+    if canonical is not None and mode == "manifest":
+        return "manifest", 0, 0.0, 0.0
+
+    if canonical is not None:
+        if mode == "hardlink":
+            try:
+                if sink.link(canonical, save_path):
+                    return "link", 0, 0.0, 0.0
+            except Exception:
+                pass
+
+    # 不能链接时重新从包内部件流式复制（与首个输出内容相同）
+    t0 = time.perf_counter()
+    with xlsx_native.open_media(zf, media) as fp:
+        written = sink.write_stream(save_path, fp, xlsx_native.media_size(zf, media), chunk)
+    return "write", written, 0.0, time.perf_counter() - t0
+
+
+def _new_tally(tag, sink, report, dedup=None):
+    """
+    返回 (stats, on_done)：on_done 交给 _Writer，按提交顺序统计导出数量 / 行并打印日志
+    失败的文件名 / manifest 去重不落盘的文件名，在这里清理命名占位；写出成功的首次出现图片在这里登记为去重源
+    on_done 总在主线程执行，写出字节数 / 解码 / 落盘耗时在这里累加到 report
+    """
+    # files: row -> [实际落盘的文件名]（增量清单使用；manifest 去重的条目不落盘，不记录）
+    # failed: 有图片导出失败的行
+    # done: 已处理（成功 + 失败）的图片数，用于进度汇总
+    stats = {"exported": 0, "rows": set(), "files": defaultdict(list), "failed": set(), "done": 0}
+
+    def on_done(ctx, res, err):
+        r, save_path = ctx
+        stats["done"] += 1
+        _LOG.progress(tag, stats["done"])
+        if err is not None:
+            xlog("{} ERR: row={}, err={}".format(tag, r, repr(err)), "warn")
+            _dedup_commit(dedup, save_path, None)
+            sink.release(save_path)
+            stats["failed"].add(r)
+            return
+        action, written, t_decode, t_write = res
+        _dedup_commit(dedup, save_path, action)
+        report["bytes"]["written"] += written
+        report["timings"]["decode"] += t_decode
+        report["timings"]["write"] += t_write
+        stats["exported"] += 1
+        stats["rows"].add(r)
+        if action == "manifest":
+            # 清单里仍引用该文件名，删除占位但保留名称
+            sink.release(save_path, forget=False)
+        else:
+            stats["files"][r].append(os.path.basename(save_path))
+        xlog("{} OK: {}{}".format(tag, save_path, "" if action == "write" else " ({})".format(action)), "debug")
+
+    return stats, on_done
+
+
 # =========================
-# 文件名清洗 + 防覆盖路径
+# 工作簿句柄：同一个工作簿只打开一次，多个工作表 / 引擎共用
+# - zip():      原生解析用的 ZipFile（workbook rels / rich value / WPS 索引 / 共享字符串按 zf 缓存，见 xlsx_native._cached）
+# - openpyxl(): load_workbook 结果
+# - com():      Excel COM 的 Workbook（DispatchEx 只启动一次；启动失败记住异常，后续工作表不再重试）
+# 均在第一次使用时才打开；close() 统一关闭
+# 引擎未传入 book 时自己打开一个并在结束时关闭（单工作表行为不变）
 # =========================
-def _safe_filename(name, default="image"):
-    if name is None:
-        name = default
-    name = str(name).strip()
-    if not name:
-        name = default
-    return re.sub(r'[\\/:*?"<>|]+', "_", name)
+class _Book(object):
+    def __init__(self, xlsx_path):
+        self.xlsx_path = xlsx_path
+        self._zf = None
+        self._wb = None
+        self._excel = None
+        self._xl_wb = None
+        self._com_error = None
+
+    def zip(self):
+        if self._zf is None:
+            self._zf = xlsx_native.open_xlsx(self.xlsx_path)
+        return self._zf
+
+    def openpyxl(self):
+        if self._wb is None:
+            self._wb = load_workbook(self.xlsx_path)
+        return self._wb
+
+    def com(self):
+        if self._com_error is not None:
+            raise self._com_error
+        if self._xl_wb is None:
+            try:
+                self._excel = excel_com.dispatch_excel()
+                self._excel.DisplayAlerts = False
+                self._excel.ScreenUpdating = False
+                self._xl_wb = self._excel.Workbooks.Open(self.xlsx_path)
+            except Exception as e:
+                self._com_error = e
+                raise
+        return self._xl_wb
+
+    def excel(self):
+        self.com()
+        return self._excel
+
+    def sheet_names(self):
+        ext = os.path.splitext(self.xlsx_path)[1].lower()
+        if ext in [".xlsx", ".xlsm"]:
+            return [n for n, _ in xlsx_native.sheet_parts(self.zip())]
+        xl_wb = self.com()
+        return [xl_wb.Worksheets(i).Name for i in range(1, xl_wb.Worksheets.Count + 1)]
+
+    def close(self):
+        try:
+            if self._xl_wb is not None:
+                self._xl_wb.Close(False)
+        except Exception:
+            pass
+        try:
+            if self._excel is not None:
+                self._excel.Quit()
+        except Exception:
+            pass
+        try:
+            if self._zf is not None:
+                self._zf.close()
+        except Exception:
+            pass
+        self._zf = self._wb = self._excel = self._xl_wb = None
 
-def _unique_path(dir_path, filename):
-    base, ext = os.path.splitext(filename)
-    p = os.path.join(dir_path, filename)
-    if not os.path.exists(p):
-        return p
-    for n in range(2, 9999):
-        p2 = os.path.join(dir_path, "{}_{}{}".format(base, n, ext))
-        if not os.path.exists(p2):
-            return p2
-    return p
+
+@contextmanager
+def _use_book(book, xlsx_path):
+    """传入的 book 直接使用（由调用方关闭）；否则临时打开一个，用完关闭"""
+    if book is not None:
+        yield book
+        return
+    book = _Book(xlsx_path)
+    try:
+        yield book
+    finally:
+        book.close()
 
 
 # =========================
@@ -87,17 +951,85 @@ def _get_img_row_col_openpyxl(img):
     return None, None, anch
 
 
+def _geometry_openpyxl(ws):
+    """
+    openpyxl 工作表 -> xlsx_native.SheetGeometry（行高 / 列宽，用于按重叠面积分配图片）
+    """
+    fmt = ws.sheet_format
+    default_col_px = None
+    if fmt.defaultColWidth:
+        default_col_px = xlsx_native.col_width_to_px(fmt.defaultColWidth)
+    elif fmt.baseColWidth:
+        default_col_px = ((int(fmt.baseColWidth) * 7 + 5 + 7) // 8) * 8
+
+    row_pts = {}
+    for r, rd in ws.row_dimensions.items():
+        if rd.hidden:
+            row_pts[r] = 0
+        elif rd.ht is not None:
+            row_pts[r] = rd.ht
+
+    col_widths = []
+    for cd in ws.column_dimensions.values():
+        if not cd.min or not cd.max:
+            continue
+        if cd.hidden:
+            col_widths.append((cd.min, cd.max, 0))
+        elif cd.width:
+            col_widths.append((cd.min, cd.max, cd.width))
+
+    return xlsx_native.SheetGeometry(fmt.defaultRowHeight, row_pts, default_col_px, col_widths)
+
+
+def _marker_openpyxl(m):
+    return {"col": m.col, "colOff": m.colOff or 0, "row": m.row, "rowOff": m.rowOff or 0}
+
+
+def _img_extent_openpyxl(geom, anch):
+    """
+    图片完整范围 (x0, y0, x1, y1)，EMU；无法计算（如 "A1" 字符串锚点）时返回 None
+    """
+    fr = getattr(anch, "_from", None)
+    if fr is None:
+        return None
+    try:
+        to = getattr(anch, "to", None)
+        ext = getattr(anch, "ext", None)
+        if to is not None:
+            return geom.extent(_marker_openpyxl(fr), to=_marker_openpyxl(to))
+        if ext is not None:
+            return geom.extent(_marker_openpyxl(fr), ext={"cx": ext.cx, "cy": ext.cy})
+    except Exception:
+        pass
+    return None
+
+
 # =========================
 # openpyxl 导出（适用于传统浮动图片 / drawing 图片）
 # 返回: (exported_count, exported_rows_set)
 # =========================
-def _export_by_openpyxl(xlsx_path, imgSavePath, sheetName, nameCol, imgCol, startRow, colTolerance, debug):
+def _export_by_openpyxl(xlsx_path, imgSavePath, sheetName, nameCol, imgCol, startRow, colTolerance, debug,
+                        passthrough=1, convert_format=None, dedup="hardlink", workers=1, incremental=0,
+                        anchor_match="overlap", report=None, sink=None, book=None, memory_budget=None,
+                        naming="row"):
+    if report is None:
+        report = _new_report("openpyxl")
+    if sink is None:
+        sink = _DirSink(imgSavePath)
+    if int(incremental) == 1:
+        xlog("openpyxl: 不支持增量导出，将全量导出（增量请用 native / zip 引擎）")
+    if memory_budget is not None:
+        xlog("openpyxl: 会整本载入图片，memory_budget_mb 对其无效（低内存请用 native / zip 引擎）", "warn")
+
     ext = os.path.splitext(xlsx_path)[1].lower()
     if ext not in [".xlsx", ".xlsm"]:
         xlog("openpyxl: 仅支持 .xlsx/.xlsm，当前: {}".format(xlsx_path))
         return 0, set()
 
-    wb = load_workbook(xlsx_path)
+    t0 = time.perf_counter()
+    with _use_book(book, xlsx_path) as bk:
+        wb = bk.openpyxl()
+    t0 = _report_time(report, "open", t0)
     if sheetName not in wb.sheetnames:
         xlog("openpyxl: 找不到工作表 {}，实际: {}".format(sheetName, wb.sheetnames))
         return 0, set()
@@ -120,95 +1052,516 @@ def _export_by_openpyxl(xlsx_path, imgSavePath, sheetName, nameCol, imgCol, star
     row2imgs = defaultdict(list)
     max_img_row = 0
 
+    # anchor_match="overlap"：按图片完整范围批量算出重叠最多的 (row, col)
+    overlap_rc = {}
+    if anchor_match == "overlap":
+        geom = _geometry_openpyxl(ws)
+        pairs = []
+        for i, img in enumerate(imgs, start=1):
+            e = _img_extent_openpyxl(geom, getattr(img, "anchor", None))
+            if e is not None:
+                pairs.append((i, e))
+        overlap_rc = dict(zip([i for i, _ in pairs], geom.assign([e for _, e in pairs])))
+
     for idx, img in enumerate(imgs, start=1):
         r, c, anch = _get_img_row_col_openpyxl(img)
         if r is None:
             if int(debug) == 1:
-                xlog("openpyxl IMG#{} anchor无法解析".format(idx))
+                xlog("openpyxl IMG#{} anchor无法解析".format(idx), "debug")
             continue
 
+        tl = (r, c)
+        if idx in overlap_rc:
+            r, c = overlap_rc[idx]
+
         if r > max_img_row:
             max_img_row = r
 
         if int(debug) == 1:
-            xlog("openpyxl IMG#{} row={} col={} anchType={}".format(idx, r, c, type(anch).__name__))
+            xlog("openpyxl IMG#{} row={} col={} anchType={}{}".format(
+                idx, r, c, type(anch).__name__, "" if tl == (r, c) else " (左上角 row={} col={})".format(*tl)), "debug")
 
         if r < int(startRow):
             continue
 
         if target_col is None:
-            row2imgs[r].append(img)
+            row2imgs[r].append((c, img))
         else:
             try:
                 if abs(int(c) - int(target_col)) <= int(colTolerance):
-                    row2imgs[r].append(img)
+                    row2imgs[r].append((c, img))
             except Exception:
-                row2imgs[r].append(img)
+                row2imgs[r].append((c, img))
 
     # max_row 取更大者
     max_row = ws.max_row
     if max_img_row > max_row:
         max_row = max_img_row
+    _report_time(report, "parse", t0)
 
-    exported = 0
-    exported_rows = set()
-
-    for r in range(int(startRow), int(max_row) + 1):
-        base_name = _safe_filename(ws["{}{}".format(nameCol, r)].value, default="row_{}".format(r))
-        imgs_in_row = row2imgs.get(r, [])
+    dedup = _new_dedup(dedup)
+    stats, on_done = _new_tally("openpyxl", sink, report, dedup)
+    writer = _Writer(workers, on_done)
+    _LOG.progress_start("openpyxl", sum(len(v) for v in row2imgs.values()))
 
-        if not imgs_in_row:
-            continue
+    merged_names = None
+    if naming == "merged" and row2imgs:
+        t0 = time.perf_counter()
+        last_img_row = max(row2imgs)
+        values = _openpyxl_merged_values(ws, column_index_from_string(str(nameCol).strip()), startRow, last_img_row)
+        merged_names = _carry_names(values, startRow, last_img_row)
+        _report_time(report, "names", t0)
 
-        for k, img in enumerate(imgs_in_row, start=1):
-            try:
-                data = img._data()
-                from PIL import Image as PILImage
-                pil = PILImage.open(io.BytesIO(data))
+    try:
+        for r in range(int(startRow), int(max_row) + 1):
+            imgs_in_row = row2imgs.get(r, [])
 
-                fmt = (pil.format or "PNG").upper()
-                ext2 = "jpg" if fmt == "JPEG" else fmt.lower()
+            if not imgs_in_row:
+                continue
 
-                filename = "{}_{}.{}".format(base_name, k, ext2)
-                save_path = _unique_path(imgSavePath, filename)
+            if merged_names is not None:
+                base_name = merged_names[r]
+            else:
+                t0 = time.perf_counter()
+                base_name = _safe_filename(ws["{}{}".format(nameCol, r)].value, default="row_{}".format(r))
+                _report_time(report, "names", t0)
 
-                pil.save(save_path)
-                exported += 1
-                exported_rows.add(r)
-                xlog("openpyxl OK: {}".format(save_path))
-            except Exception as e:
-                xlog("openpyxl ERR: row={}, err={}".format(r, repr(e)))
+            for k, (c, img) in enumerate(imgs_in_row, start=1):
+                save_path = None
+                try:
+                    data = img._data()
+                    report["bytes"]["read"] += len(data)
+                    fallback_ext = _ext_of_pil_format(getattr(img, "format", None))
+                    ext2 = _target_ext(data, passthrough, convert_format, fallback_ext)
+
+                    filename = _image_filename(naming, base_name, k, r, c, ext2)
+                    save_path = sink.allocate(filename)
+                    canonical = _dedup_plan(dedup, save_path, data=data)
+
+                    writer.submit((r, save_path), save_path, _emit_image, writer, sink, save_path, data,
+                                  passthrough, convert_format, fallback_ext, dedup["mode"], canonical)
+                except Exception as e:
+                    xlog("openpyxl ERR: row={}, err={}".format(r, repr(e)), "warn")
+                    stats["failed"].add(r)
+                    stats["done"] += 1
+                    if save_path is not None:
+                        _dedup_commit(dedup, save_path, None)
+                        sink.release(save_path)
+    finally:
+        writer.close()
 
+    exported, exported_rows = stats["exported"], stats["rows"]
+    _finish_dedup(dedup, sink)
+    _report_rows(report, "openpyxl", exported, exported_rows, stats["failed"])
     xlog("openpyxl 导出数量: {}".format(exported))
     return exported, exported_rows
 
 
 # =========================
-# Excel COM：把剪贴板图片粘到临时 Chart 再 Export
+# 增量导出清单：imgSavePath/export_manifest.json
+# 每个 (工作簿, 工作表) 记录：路径 / 工作表名、大小 / mtime / sha1、导出参数，以及每行的 名称 + 媒体指纹 + 输出文件
+# （键为 "路径|工作表名"；工作表名可能含 "|"，清理时读条目里的 path，不从键里拆）
+# 再次运行时：
+#   - 工作簿未变化（mtime+大小一致，或 sha1 一致）且文件都在 -> 整本跳过
+#   - 否则逐行比较：未变化的行跳过；变化的行删除旧文件后原名重写；已不存在的行删除旧文件
+# 保存时加锁（export_manifest.json.lock）重新读取磁盘上的清单，只替换本次的 (工作簿, 工作表)，
+# 再经唯一临时文件原子替换：export_batch 多进程共用一个输出目录时不互相覆盖
+# 清理每次运行只做一次（_run_engines 开始时；export_batch 按输出目录各做一次，子任务不再做，见 manifest_prune）：
+# 工作簿已不存在的条目删除；输出文件已被删的行删除（该工作簿下次不再整本跳过，缺的行重新导出）
+# auto 模式 COM 补齐的行同样记入该条目（媒体指纹记为 ["com"]）：工作簿变化后原生阶段先删旧文件，COM 原名重写
 # =========================
-def _chart_export_from_clipboard(xl_ws, width, height, save_path):
-    co = xl_ws.ChartObjects().Add(0, 0, max(10, int(width)), max(10, int(height)))
-    chart = co.Chart
-    chart.Paste()
-    chart.Export(save_path)
-    co.Delete()
+EXPORT_MANIFEST = "export_manifest.json"
+MANIFEST_LOCK_TIMEOUT = 30.0
+
+
+@contextmanager
+def _file_lock(path, timeout=MANIFEST_LOCK_TIMEOUT):
+    """
+    跨进程文件锁：以 O_CREAT|O_EXCL 创建 path.lock，持有期间其它进程轮询等待（Windows / Linux 通用）
+    锁文件超过 timeout 秒未释放视为崩溃残留，强行接管
+    """
+    lock = path + ".lock"
+    deadline = time.time() + timeout
+    while True:
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+            os.close(fd)
+            break
+        except FileExistsError:
+            if time.time() >= deadline:
+                try:
+                    os.remove(lock)
+                except OSError:
+                    pass
+                deadline = time.time() + timeout
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(lock)
+        except OSError:
+            pass
+
+
+@contextmanager
+def _no_lock():
+    yield
+
+
+def _atomic_write(path, payload):
+    """写到同目录下的唯一临时文件再 os.replace：并发写出时不会共用同一个 .tmp"""
+    import tempfile
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".",
+                               suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+        os.replace(tmp, path)
+    except Exception:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _load_manifest(imgSavePath):
+    path = os.path.join(imgSavePath, EXPORT_MANIFEST)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict) and isinstance(data.get("workbooks"), dict):
+            return data
+    except Exception:
+        pass
+    return {"version": 1, "workbooks": {}}
+
+
+def _prune_manifest(imgSavePath, manifest):
+    """就地清理 manifest，返回是否有改动"""
+    changed = False
+    for key in list(manifest["workbooks"]):
+        entry = manifest["workbooks"][key]
+        if not os.path.isfile(entry.get("path") or key.split("|", 1)[0]):
+            del manifest["workbooks"][key]
+            changed = True
+            continue
+        rows = entry.get("rows", {})
+        gone = [r for r, info in rows.items() if not _manifest_files_exist(imgSavePath, {r: info})]
+        if gone:
+            for r in gone:
+                del rows[r]
+            # 缺了文件的工作簿不能再整本跳过：去掉身份信息，下次逐行比较并补导出
+            entry["size"] = entry["mtime"] = entry["sha1"] = None
+            changed = True
+    return changed
+
+
+def _prune_manifest_file(imgSavePath):
+    """加锁清理磁盘上的清单一次；没有清单 / 没有改动时不重写"""
+    path = os.path.join(imgSavePath, EXPORT_MANIFEST)
+    if not os.path.isfile(path):
+        return
+    with _file_lock(path):
+        manifest = _load_manifest(imgSavePath)
+        if _prune_manifest(imgSavePath, manifest):
+            _atomic_write(path, json.dumps(manifest, ensure_ascii=False).encode("utf-8"))
+
+
+def _manifest_key(xlsx_path, sheetName):
+    return "{}|{}".format(os.path.abspath(xlsx_path), sheetName)
+
+
+def _save_manifest(imgSavePath, key, entry):
+    path = os.path.join(imgSavePath, EXPORT_MANIFEST)
+    with _file_lock(path):
+        manifest = _load_manifest(imgSavePath)  # 期间其它进程可能已写入别的工作簿
+        manifest["workbooks"][key] = entry
+        _atomic_write(path, json.dumps(manifest, ensure_ascii=False).encode("utf-8"))
+
+
+def _manifest_add_rows(imgSavePath, key, rows):
+    """把 rows（str(行号) -> {name, media, files}）并入已有条目；条目不存在（原生阶段没有保存）时不记录"""
+    path = os.path.join(imgSavePath, EXPORT_MANIFEST)
+    with _file_lock(path):
+        manifest = _load_manifest(imgSavePath)
+        entry = manifest["workbooks"].get(key)
+        if entry is None:
+            return
+        entry.setdefault("rows", {}).update(rows)
+        _atomic_write(path, json.dumps(manifest, ensure_ascii=False).encode("utf-8"))
+
+
+def _file_sha1(path, chunk=1024 * 1024):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        while True:
+            buf = f.read(chunk)
+            if not buf:
+                break
+            h.update(buf)
+    return h.hexdigest()
+
+
+def _manifest_files_exist(imgSavePath, rows):
+    for info in rows.values():
+        for name in info.get("files", []):
+            if not os.path.exists(os.path.join(imgSavePath, name)):
+                return False
+    return True
+
+
+def _manifest_remove_row(imgSavePath, info):
+    for name in info.get("files", []):
+        try:
+            os.remove(os.path.join(imgSavePath, name))
+        except Exception:
+            pass
 
 
 # =========================
-# Excel COM 导出（适用于“嵌入单元格图片 / 单元格图片类型 / openpyxl拿不全”）
-# 支持：按 shapes 导出（多图/行） + fallback 单元格 CopyPicture
-# skip_rows: set(row) -> auto 模式下跳过 openpyxl 已导出的行，避免重复
-# 返回: exported_count
+# 原生导出（zip + XML 直读，不调用 load_workbook / Excel）
+# 图片来源 sources：
+#   - "drawing": 传统浮动图片（workbook -> sheet rels -> drawing -> drawing rels -> media）
+#   - "cell":    单元格内图片
+#                Excel「放置在单元格中」（vm -> metadata -> richData -> media）
+#                WPS =DISPIMG("ID_xxx",1)（ID -> xl/cellimages.xml -> media）
+# 命名列只对有图片的行做一次定向扫描，不构建整张单元格表
+# 返回: (exported_count, exported_rows_set)，行/列匹配规则与 openpyxl 引擎一致
+# =========================
+def _media_ext(media_part):
+    ext = os.path.splitext(media_part)[1].lower().lstrip(".")
+    if ext in ("jpeg", "jpe"):
+        return "jpg"
+    return ext or "png"
+
+
+def _col_matches(c, target_col, colTolerance):
+    if target_col is None:
+        return True
+    try:
+        return abs(int(c) - int(target_col)) <= int(colTolerance)
+    except Exception:
+        return True
+
+
+def _anchor_match(value):
+    v = str(value or "overlap").strip().lower()
+    if v not in ("overlap", "topleft"):
+        xlog("anchor_match 不支持: {}，改用 overlap".format(value))
+        v = "overlap"
+    return v
+
+
+# =========================
+# 命名方式 naming：
+#   - "row"（默认）: {名称列值}_{k}.{ext}，名称为空时为 row_{行号}
+#   - "merged": 与 export1.py 相同（A 列合并名称、B 列多张单元格图片的表）：
+#               名称列在合并区域内取左上角的值，仍为空时沿用上一行的名称；
+#               文件名 {名称}_{图片单元格}.{ext}，例如 水表规格与位置_B2.png
+#     原生 / zip 引擎从 <mergeCells> 建索引逐行 bisect 查找，不需要 Excel
+# =========================
+def _naming(value):
+    v = str(value or "row").strip().lower()
+    if v not in ("row", "merged"):
+        xlog("naming 不支持: {}，改用 row".format(value))
+        v = "row"
+    return v
+
+
+# =========================
+# COM 单元格截图 cell_fallback（行内没有图片 shape 时，对 imgCol 单元格 CopyPicture 导出）：
+#   - "planned"（默认）: COM 处理的行都截图；auto 模式下 COM 只处理覆盖规划出的行
+#   - "off" / 0: 不截图，只导出真正的图片（不会把纯文字行导出成图片）
+#   - "all" / 1: auto 模式不做覆盖规划，COM 扫描全部行，没有 shape 的行都截图
+#   allow_cell_fallback.py 的 allow_cell_fallback=0/1 即 "off" / "all"
+# =========================
+def _cell_fallback(value):
+    v = str(value if value is not None else "planned").strip().lower()
+    v = {"0": "off", "1": "all"}.get(v, v)
+    if v not in ("planned", "off", "all"):
+        xlog("cell_fallback 不支持: {}，改用 planned".format(value))
+        v = "planned"
+    return v
+
+
+# =========================
+# 单元格截图的抓取方式（即 export1.py 的做法，两个入口共用）：
+#   - 图片列有合并单元格时取 MergeArea 左上角整块截图
+#   - 每次尝试依次用 Appearance=1（屏幕）/ 2（打印）CopyPicture，最多 retries 轮
+#   - Chart.Export 写到复用的临时文件，读成 bytes 做空白检测（export_core.looks_like_blank），
+#     有图才分配正式文件名并换名落盘；空白 / 失败的格不占用文件名
+#   - blank_check: "off"（默认，不检测）/ "pixels" 像素统计 / "size" 仅按 min_kb
+#   - clip_timeout: CopyPicture 后剪贴板就绪轮询的最长等待（秒）
+# =========================
+BLANK_CHECKS = ("off", "pixels", "size")
+
+
+def _new_cell_capture(blank_check="off", min_kb=8, retries=1, clip_timeout=excel_com.CLIP_TIMEOUT):
+    v = str(blank_check or "off").strip().lower()
+    if v not in BLANK_CHECKS:
+        xlog("blank_check 不支持: {}，改用 off".format(blank_check))
+        v = "off"
+    return {"blank_check": v, "min_kb": int(min_kb), "retries": max(1, int(retries)),
+            "clip_timeout": float(clip_timeout)}
+
+
+def _carry_names(values, first_row, last_row):
+    """
+    values: {row: 名称列的值（合并区域已取左上角）} -> {row: 文件名前缀}
+    空值沿用上一行的名称（export1.py 原有的规则），都为空时为 img
+    """
+    out = {}
+    last = None
+    for r in range(int(first_row), int(last_row) + 1):
+        name = _safe_filename(values.get(r), default="img")
+        if name == "img" and last not in (None, "", "img"):
+            name = last
+        out[r] = name
+        last = name
+    return out
+
+
+def _row_names(values, rows, naming, startRow):
+    """rows 各行的文件名前缀 {row: base_name}；values 为名称列的值（merged 时须覆盖 startRow..max(rows)）"""
+    rows = list(rows)
+    if naming == "merged":
+        if not rows:
+            return {}
+        return _carry_names(values, startRow, max(rows))
+    return dict((r, _safe_filename(values.get(r), default="row_{}".format(r))) for r in rows)
+
+
+def _native_names(zf, sheet_part, name_col_idx, rows, naming, startRow):
+    """
+    原生解析读名称列：返回 (values, names)，values 为名称列的值（merged 时合并区域已取左上角），names 见 _row_names
+    """
+    rows = list(rows)
+    if naming == "merged" and rows:
+        values = xlsx_native.read_merged_column_values(zf, sheet_part, name_col_idx,
+                                                       range(int(startRow), max(rows) + 1))
+    else:
+        values = xlsx_native.read_column_values(zf, sheet_part, name_col_idx, rows)
+    return values, _row_names(values, rows, naming, startRow)
+
+
+def _image_filename(naming, base_name, k, r, c, ext):
+    if naming == "merged":
+        return "{}_{}{}.{}".format(base_name, get_column_letter(int(c)), r, ext)
+    return "{}_{}.{}".format(base_name, k, ext)
+
+
+def _openpyxl_merged_values(ws, col, first_row, last_row):
+    """openpyxl 工作表上的 read_merged_column：合并区域内的空单元格取左上角的值"""
+    merges = xlsx_native.MergeIndex(
+        (m.min_row, m.min_col, m.max_row, m.max_col) for m in ws.merged_cells.ranges)
+    out = {}
+    for r in range(int(first_row), int(last_row) + 1):
+        v = ws.cell(row=r, column=int(col)).value
+        if v is None or (isinstance(v, str) and not v.strip()):
+            tl = merges.top_left(r, col)
+            if tl is not None:
+                v = ws.cell(row=tl[0], column=tl[1]).value
+        out[r] = v
+    return out
+
+
+def _collect_native(zf, sheet_part, sources, target_col, startRow, colTolerance, debug, tag,
+                    anchor_match="overlap", inventory=None):
+    """
+    汇总各原生来源：返回 {row: [(col, media_part), ...]}
+    同一行内单元格图片按列排在前面，drawing 图片按 openpyxl 顺序排在后面
+    anchor_match="overlap" 时 drawing 图片按重叠面积分配行/列（单元格图片本来就属于所在单元格）
+    inventory: 同一次遍历顺带收集覆盖清单（见 xlsx_native.new_inventory）
+    """
+    row2media = defaultdict(list)
+
+    if "cell" in sources:
+        vm_index = xlsx_native.load_richvalue_index(zf)
+        wps_index = xlsx_native.load_wps_cellimage_index(zf)
+        if wps_index:
+            xlog("{} WPS cellimages 图片 ID 数量: {}".format(tag, len(wps_index)))
+        cells = []
+        for r, c, media in xlsx_native.iter_cell_images(zf, sheet_part, vm_index, wps_index, inventory):
+            if int(debug) == 1:
+                xlog("{} CELL row={} col={} media={}".format(tag, r, c, media), "debug")
+            if r >= int(startRow) and _col_matches(c, target_col, colTolerance):
+                cells.append((r, c, media))
+        xlog("{} 检测到单元格图片数量: {}".format(tag, len(cells)))
+        for r, c, media in sorted(cells):
+            row2media[r].append((c, media))
+
+    if "drawing" in sources:
+        total = 0
+        items = list(xlsx_native.iter_drawing_images(zf, sheet_part, inventory))
+        top_left = [(item["row"], item["col"]) for item in items]
+        if anchor_match == "overlap":
+            xlsx_native.assign_drawing_cells(zf, sheet_part, items)
+
+        for idx, item in enumerate(items, start=1):
+            total += 1
+            r, c = item["row"], item["col"]
+
+            if int(debug) == 1:
+                tl = top_left[idx - 1]
+                xlog("{} IMG#{} row={} col={} anchType={}{}".format(
+                    tag, idx, r, c, item["anchor"], "" if tl == (r, c) else " (左上角 row={} col={})".format(*tl)), "debug")
+
+            if r < int(startRow):
+                continue
+
+            if _col_matches(c, target_col, colTolerance):
+                row2media[r].append((c, item["media"]))
+        xlog("{} 检测到图片对象数量: {}".format(tag, total))
+
+    return row2media
+
+
 # =========================
-def _export_by_com(xlsx_path, imgSavePath, sheetName, nameCol, imgCol, startRow, colTolerance, debug, skip_rows=None):
+# 读取阶段：media 部件在单独的线程里按顺序预读（export_core.prefetch），
+# 主线程分配文件名 / 去重、写出线程解码落盘的同时，下一张图片已经在解压
+# - 预读深度 = 写出线程的在途上限（workers*2，至少 2），预读结果 + 在途任务的内存都有界
+# - 去重能直接命中的重复部件（同一 media 部件第二次出现）不预读
+# - 低内存模式不预读：流式写出不整体读入；转码时整张读入的字节要计入预算
+# =========================
+def _prefetch_media(zf, items, dedup, sink, workers, no_prefetch=False):
+    """items: [(row, k, col, media), ...] -> 按原顺序产出 (item, data, error)；data 为 None 时由调用方自行读取"""
+    if no_prefetch:
+        return ((item, None, None) for item in items)
+
+    shortcut = dedup["mode"] != "off" and (dedup["mode"] != "hardlink" or sink.can_link)
+    seen = set()
+
+    def load(item):
+        media = item[3]
+        if shortcut and media in seen:
+            return None
+        seen.add(media)
+        return xlsx_native.read_media(zf, media)
+
+    return export_core.prefetch(items, load, depth=max(2, int(workers or 1) * 2))
+
+
+def _export_by_native(xlsx_path, imgSavePath, sheetName, nameCol, imgCol, startRow, colTolerance, debug,
+                      sources=("cell", "drawing"), skip_rows=None, tag="native",
+                      passthrough=1, convert_format=None, dedup="hardlink", workers=1, incremental=0,
+                      anchor_match="overlap", report=None, sink=None, book=None, inventory=None,
+                      memory_budget=None, naming="row"):
     if skip_rows is None:
         skip_rows = set()
+    if report is None:
+        report = _new_report(tag)
+    if sink is None:
+        sink = _DirSink(imgSavePath)
+    if int(incremental) == 1 and sink.kind != "dir":
+        xlog("{}: 增量导出只支持目录输出（sink=dir），本次全量导出".format(tag), "warn")
+        incremental = 0
 
-    try:
-        import win32com.client  # type: ignore
-    except Exception as e:
-        xlog("COM: 缺少 pywin32，无法使用 Excel COM。err={}".format(repr(e)))
-        return 0
+    ext = os.path.splitext(xlsx_path)[1].lower()
+    if ext not in [".xlsx", ".xlsm"]:
+        xlog("{}: 仅支持 .xlsx/.xlsm，当前: {}".format(tag, xlsx_path))
+        return 0, set()
 
     target_col = None
     if imgCol is not None and str(imgCol).strip() != "":
@@ -219,171 +1572,1010 @@ def _export_by_com(xlsx_path, imgSavePath, sheetName, nameCol, imgCol, startRow,
 
     name_col_idx = column_index_from_string(str(nameCol).strip())
 
-    excel = None
-    wb = None
-    exported = 0
+    dedup = _new_dedup(dedup)
+    # 目录输出的名单在第一次分配时才扫描目录（增量模式先删除旧文件，再扫描）
+    stats, on_done = _new_tally(tag, sink, report, dedup)
+
+    # 增量：先用 mtime/大小/sha1 判断整本是否可以跳过
+    manifest = None
+    entry = {}
+    kept_rows = {}
+    if int(incremental) == 1:
+        manifest = _load_manifest(imgSavePath)
+        key = _manifest_key(xlsx_path, sheetName)
+        settings = [str(nameCol), str(imgCol), int(startRow), int(colTolerance), list(sources),
+                    int(passthrough), convert_format or "", anchor_match]
+        if naming != "row":
+            settings.append(naming)
+        st = os.stat(xlsx_path)
+        entry = manifest["workbooks"].get(key) or {}
+        if entry.get("settings") != settings:
+            entry = {}
+        book_sha1 = None
+        same = bool(entry) and entry.get("size") == st.st_size and entry.get("mtime") == st.st_mtime
+        if entry and not same:
+            book_sha1 = _file_sha1(xlsx_path)
+            same = (book_sha1 == entry.get("sha1"))
+        if same and _manifest_files_exist(imgSavePath, entry.get("rows", {})):
+            rows = set(int(r) for r in entry.get("rows", {}))
+            xlog("{}: 工作簿未变化，跳过（已导出行数 {}）".format(tag, len(rows)))
+            report["rows"]["skipped"] += len(rows)
+            if inventory is not None:
+                # 上次运行（含 COM 补齐的行）的输出都还在：视为原生已全部覆盖，auto 不再启动 Excel
+                inventory["complete"] = True
+                inventory["failed"] = set()
+                inventory["unchanged"] = True
+            return 0, rows
+        if book_sha1 is None:
+            book_sha1 = _file_sha1(xlsx_path)
+        old_rows = entry.get("rows", {})
+        entry = {"path": os.path.abspath(xlsx_path), "sheet": sheetName, "size": st.st_size, "mtime": st.st_mtime,
+                 "sha1": book_sha1, "settings": settings, "rows": {}}
+        manifest["workbooks"][key] = entry
+
+    t0 = time.perf_counter()
+    with _use_book(book, xlsx_path) as bk:
+        zf = bk.zip()
+        sheet_part = xlsx_native.resolve_sheet_part(zf, sheetName)
+        t0 = _report_time(report, "open", t0)
+        if sheet_part is None:
+            names = [n for n, _ in xlsx_native.sheet_parts(zf)]
+            xlog("{}: 找不到工作表 {}，实际: {}".format(tag, sheetName, names))
+            return 0, set()
+
+        row2media = _collect_native(zf, sheet_part, sources, target_col, startRow, colTolerance, debug, tag,
+                                    anchor_match, inventory)
+        if inventory is not None:
+            inventory["complete"] = True
+            inventory["failed"] = set()
+        for r in list(row2media):
+            if r in skip_rows:
+                del row2media[r]
+        t0 = _report_time(report, "parse", t0)
+        if not row2media and manifest is None:
+            return 0, set()
+
+        _, names = _native_names(zf, sheet_part, name_col_idx, row2media.keys(), naming, startRow)
+        t0 = _report_time(report, "names", t0)
+
+        # 增量：逐行比较 名称 + 媒体指纹，未变化的行直接跳过；变化 / 已删除的行先删旧文件
+        if manifest is not None:
+            row_sig = {}
+            for r in row2media:
+                row_sig[r] = [names[r], [xlsx_native.media_signature(zf, m) for _, m in row2media[r]]]
+            for sr, info in old_rows.items():
+                r = int(sr)
+                sig = row_sig.get(r)
+                if sig is not None and [info.get("name"), info.get("media")] == sig \
+                        and _manifest_files_exist(imgSavePath, {sr: info}):
+                    kept_rows[r] = info
+                else:
+                    _manifest_remove_row(imgSavePath, info)
+            for r in kept_rows:
+                del row2media[r]
+            report["rows"]["skipped"] += len(kept_rows)
+            _report_time(report, "parse", t0)
+            if kept_rows:
+                xlog("{}: 增量跳过未变化行数: {}".format(tag, len(kept_rows)))
+
+        # 低内存模式且原样写出：部件流式写入 sink，不整体读入
+        stream = memory_budget is not None and int(passthrough) == 1 and not convert_format
+        writer = _Writer(workers, on_done, memory_budget)
+        items = [(r, k, c, media) for r in sorted(row2media)
+                 for k, (c, media) in enumerate(row2media[r], start=1)]
+        _LOG.progress_start(tag, len(items))
+        try:
+            for (r, k, c, media), data, read_err in _prefetch_media(zf, items, dedup, sink, workers,
+                                                                    stream or memory_budget is not None):
+                base_name = names[r]
+                save_path = None
+                try:
+                    if read_err is not None:
+                        raise read_err
+                    fallback_ext = _media_ext(media)
+                    hit = _dedup_lookup_part(dedup, media, sink)
+                    signature = None
+                    if hit is not None:
+                        canonical, ext2 = hit
+                        data = None
+                    elif stream:
+                        canonical = None
+                        data = None
+                        ext2 = _sniff_image_ext(xlsx_native.read_media_head(zf, media)) or fallback_ext
+                        signature = _stream_signature(dedup, zf, media)
+                    else:
+                        canonical = None
+                        if data is None:
+                            # 预读时跳过的重复部件，首次导出失败没有登记：在这里补读
+                            data = xlsx_native.read_media(zf, media)
+                        report["bytes"]["read"] += len(data)
+                        ext2 = _target_ext(data, passthrough, convert_format, fallback_ext)
+
+                    filename = _image_filename(naming, base_name, k, r, c, ext2)
+                    save_path = sink.allocate(filename)
+                    canonical = _dedup_plan(dedup, save_path, data=data, media_part=media, canonical=canonical,
+                                            signature=signature)
+
+                    if stream:
+                        if canonical is None:
+                            report["bytes"]["read"] += xlsx_native.media_size(zf, media)
+                        writer.submit((r, save_path), save_path, _emit_stream, writer, sink, save_path, zf, media,
+                                      memory_budget.chunk, dedup["mode"], canonical, cost=memory_budget.chunk)
+                        continue
+                    writer.submit((r, save_path), save_path, _emit_image, writer, sink, save_path, data,
+                                  passthrough, convert_format, fallback_ext, dedup["mode"], canonical,
+                                  cost=len(data) if data is not None else 0)
+                except Exception as e:
+                    xlog("{} ERR: row={}, err={}".format(tag, r, repr(e)), "warn")
+                    stats["failed"].add(r)
+                    stats["done"] += 1
+                    if save_path is not None:
+                        _dedup_commit(dedup, save_path, None)
+                        sink.release(save_path)
+        finally:
+            writer.close()
+
+    exported, exported_rows = stats["exported"], stats["rows"]
+    _finish_dedup(dedup, sink)
+    _report_rows(report, tag, exported, exported_rows, stats["failed"])
+    if inventory is not None:
+        inventory["failed"] = set(stats["failed"]) - set(exported_rows)
+
+    if manifest is not None:
+        for r, info in kept_rows.items():
+            entry["rows"][str(r)] = info
+        for r in exported_rows:
+            entry["rows"][str(r)] = {"name": row_sig[r][0], "media": row_sig[r][1], "files": stats["files"].get(r, [])}
+        _save_manifest(imgSavePath, key, entry)
+        exported_rows = exported_rows | set(kept_rows)
+
+    xlog("{} 导出数量: {}".format(tag, exported))
+    return exported, exported_rows
 
-    try:
-        excel = win32com.client.DispatchEx("Excel.Application")
-        excel.DisplayAlerts = False
-        excel.ScreenUpdating = False
 
-        wb = excel.Workbooks.Open(xlsx_path)
-        xl_ws = wb.Worksheets(sheetName)
+def _export_by_zip(xlsx_path, imgSavePath, sheetName, nameCol, imgCol, startRow, colTolerance, debug, **opts):
+    return _export_by_native(xlsx_path, imgSavePath, sheetName, nameCol, imgCol, startRow, colTolerance, debug,
+                             sources=("drawing",), tag="zip", **opts)
 
-        # 找 last_row（用 nameCol）
-        # -4162 = xlUp
-        last_row = xl_ws.Cells(xl_ws.Rows.Count, name_col_idx).End(-4162).Row
 
-        # 1) 先按 Shapes 建立 row -> shapes（图片类型）
-        pic_types = set([11, 13])  # msoLinkedPicture=11, msoPicture=13
-        row2shapes = defaultdict(list)
+# =========================
+# Excel COM：把剪贴板图片粘到临时 Chart 再 Export（见 export_core.chart_export）
+# =========================
+def _com_export_to_sink(xl_ws, width, height, sink, key):
+    """
+    Chart.Export 只能写文件：目录输出直接写到 key；归档输出先导出到临时文件再写入归档
+    返回写出字节数
+    """
+    if sink.kind == "dir":
+        export_core.chart_export(xl_ws, width, height, key, min_side=10)
+        return os.path.getsize(key)
+
+    import tempfile
+    fd, tmp = tempfile.mkstemp(suffix=".png")
+    os.close(fd)
+    try:
+        export_core.chart_export(xl_ws, width, height, tmp, min_side=10)
+        with open(tmp, "rb") as f:
+            payload = f.read()
+        sink.write(key, payload)
+        return len(payload)
+    finally:
+        try:
+            os.remove(tmp)
+        except Exception:
+            pass
+
 
-        shapes = xl_ws.Shapes
-        count_shapes = shapes.Count
-        xlog("COM Shapes.Count: {}".format(count_shapes))
+def _com_cell_picture(xl_app, xl_ws, rng, scratch_path, capture, merged=True, debug=0):
+    """
+    对单元格截图导出到 scratch_path，返回导出的 bytes；没有图片（空白 / 都失败）返回 None（见 _new_cell_capture）
+    merged=False：已知整列没有合并单元格，跳过逐格的 MergeCells 检查
+    """
+    if merged:
+        try:
+            if bool(rng.MergeCells):
+                rng = rng.MergeArea.Cells(1, 1)
+        except Exception:
+            pass
 
-        for i in range(1, count_shapes + 1):
-            shp = shapes.Item(i)
+    try:
+        w = rng.Width
+        h = rng.Height
+    except Exception:
+        w, h = 300, 300
 
+    for attempt in range(1, capture["retries"] + 1):
+        for ap in (1, 2):  # xlScreen, xlPrinter
             try:
-                stype = int(shp.Type)
+                xl_app.CutCopyMode = False
             except Exception:
-                continue
-
-            if stype not in pic_types:
-                continue
+                pass
 
             try:
-                tl = shp.TopLeftCell
-                r = int(tl.Row)
-                c = int(tl.Column)
-            except Exception:
+                # xlBitmap；剪贴板出现本次复制的图片才粘贴
+                if not export_core.copy_picture(rng, capture["clip_timeout"], sleep=xsleep, Appearance=ap, Format=2):
+                    if int(debug) == 1:
+                        xlog("COM CLIPBOARD timeout (attempt={}, appearance={}, cell={})".format(
+                            attempt, ap, getattr(rng, "Address", "?")), "debug")
+                    continue
+
+                export_core.chart_export(xl_ws, w, h, scratch_path, min_side=10, select_area=True)
+                with open(scratch_path, "rb") as f:
+                    data = f.read()
+                if capture["blank_check"] != "off" and \
+                        export_core.looks_like_blank(data, capture["min_kb"], capture["blank_check"]):
+                    if int(debug) == 1:
+                        xlog("COM EMPTY -> retry (attempt={}, appearance={}, cell={})".format(
+                            attempt, ap, getattr(rng, "Address", "?")), "debug")
+                    continue
+                return data
+
+            except Exception as e:
+                if int(debug) == 1:
+                    xlog("COM Copy/Export failed (attempt={}, appearance={}, cell={}): {}".format(
+                        attempt, ap, getattr(rng, "Address", "?"), repr(e)), "debug")
                 continue
+    return None
+
+
+def _com_scratch_to_sink(scratch_path, data, sink, key):
+    """单元格截图确认有图后落盘：目录输出直接把临时文件换名为 key，否则写入 bytes；返回写出字节数"""
+    if sink.kind == "dir":
+        try:
+            os.replace(scratch_path, key)
+            return len(data)
+        except Exception:
+            pass  # 换名失败（如被占用）：直接写入已在内存中的 bytes
+    sink.write(key, data)
+    return len(data)
+
+
+# =========================
+# Excel COM 导出（适用于“嵌入单元格图片 / 单元格图片类型 / openpyxl拿不全”）
+# 支持：按 shapes 导出（多图/行） + fallback 单元格 CopyPicture
+# skip_rows: set(row) -> auto 模式下跳过 openpyxl 已导出的行，避免重复
+# rows: 只处理这些行（auto 模式的覆盖规划结果，见 _plan_com_rows）；None = 扫描 startRow..名称列最后一行
+# anchor_match: "overlap" 按重叠面积取行/列；"topleft" 只看 TopLeftCell
+# 返回: exported_count
+# =========================
+def _plan_com_rows(inventory, native_rows, startRow, target_col, colTolerance, name_col_idx, naming="row"):
+    """
+    auto 模式的覆盖规划：原生解析之后，只有原生看到了图片却没导出的行才交给 COM
+    - 残余行 = 覆盖清单中解析不出字节的图片（外链 / 缺失部件 / WMF/EMF / 对不上索引的单元格图片）所在行
+             + 原生导出失败的行，限定在 imgCol 范围、startRow..名称列最后一行内，去掉原生已导出的行
+    - 返回 COM 要处理的行号列表（空列表 = 原生已覆盖全部行，不启动 Excel）；
+      覆盖清单不完整（原生解析异常 / 不是 xlsx）返回 None，COM 照旧扫描全部行
+    - 增量导出整本未变化（inventory["unchanged"]）：上次的输出都还在，返回空列表
+    - naming="merged"：名称沿用上一行，名称列最后一行之后的图片行同样要补齐，不按名称列截断
+    """
+    if inventory is None or not inventory.get("complete"):
+        return None
+    if inventory.get("unchanged"):
+        return []
+    last_row = inventory["last_row"].get(name_col_idx, 0)
+    if naming == "merged":
+        last_row = float("inf")
+    rows = set(inventory.get("failed", ()))
+    for r0, r1, c0, c1, _ in inventory["unresolved"]:
+        if any(_col_matches(c, target_col, colTolerance) for c in range(c0, c1 + 1)):
+            rows.update(range(r0, r1 + 1))
+    return sorted(r for r in rows if int(startRow) <= r <= last_row and r not in native_rows)
+
+
+def _com_manifest_row(manifest_rows, r, base_name, save_path):
+    if manifest_rows is None:
+        return
+    info = manifest_rows.setdefault(str(r), {"name": base_name, "media": ["com"], "files": []})
+    info["files"].append(os.path.basename(save_path))
+
+
+def _export_by_com(xlsx_path, imgSavePath, sheetName, nameCol, imgCol, startRow, colTolerance, debug, skip_rows=None,
+                   anchor_match="overlap", report=None, sink=None, book=None, rows=None, resume=0, naming="row",
+                   cell_fallback="planned", cell_capture=None, manifest_rows=None):
+    """
+    resume=1：输出目录下的 export_journal_<sha1>.jsonl 记录已完成的 (工作表, 行, 第几张)，续跑时直接跳过（只支持 sink=dir）
+    cell_fallback="off"：没有 shape 的行不做单元格截图（见 _cell_fallback）；截图方式见 _new_cell_capture
+    naming="merged" 且扫描全部行时，最后一行取 UsedRange（名称列最后几行在合并区域内为空）
+    manifest_rows: dict 时按增量清单的格式记录本次导出的行（str(行号) -> {name, media: ["com"], files}）
+    返回本次导出数 + 续跑跳过数
+    """
+    if skip_rows is None:
+        skip_rows = set()
+    if cell_capture is None:
+        cell_capture = _new_cell_capture()
+    if report is None:
+        report = _new_report("com")
+    if sink is None:
+        sink = _DirSink(imgSavePath)
+
+    if not excel_com.available():
+        xlog("COM: 缺少 pywin32，无法使用 Excel COM")
+        return 0
 
+    target_col = None
+    if imgCol is not None and str(imgCol).strip() != "":
+        try:
+            target_col = column_index_from_string(str(imgCol).strip())
+        except Exception:
+            target_col = None
+
+    name_col_idx = column_index_from_string(str(nameCol).strip())
+
+    own_book = book is None
+    if own_book:
+        book = _Book(xlsx_path)
+    exported = 0
+    resumed = 0
+    exported_rows = set()
+    resumed_rows = set()
+    failed_rows = set()
+    t0 = time.perf_counter()
+    jr = None
+    scratch_path = None
+
+    try:
+        if int(resume) == 1:
+            if sink.kind == "dir":
+                # 须在分配任何文件名之前打开：清理上次中途崩溃留下的文件，并把这些文件名还给分配器
+                jr = journal.Journal(sink.dir_path, xlsx_path)
+                for p in jr.cleaned:
+                    sink.release(p)
+                xlog("COM 续跑：日志中已完成 {} 张，清理未完成文件 {} 个".format(jr.resumed, len(jr.cleaned)))
+            else:
+                xlog("COM: 续跑日志只支持 sink=dir，本次不记录", "warn")
+
+        xl_ws = book.com().Worksheets(sheetName)
+        t0 = _report_time(report, "open", t0)
+
+        scan_all = rows is None
+        if scan_all:
+            # 找 last_row（用 nameCol，End(xlUp)）
+            last_row = excel_com.last_row_up(xl_ws, name_col_idx)
+            if naming == "merged":
+                last_row = max(int(last_row), excel_com.last_row_used(xl_ws, name_col_idx))
+            rows = range(int(startRow), int(last_row) + 1)
+        else:
+            rows = sorted(set(int(r) for r in rows))
+
+        # 1) 一次遍历 Shapes 收集图片 shape 的行/列/尺寸，建立 row -> shapes
+        row2shapes = defaultdict(list)
+        pics = excel_com.collect_shapes(xl_ws, anchor_match)
+        xlog("COM 图片 shape 数量: {}".format(len(pics)))
+
+        for info in pics:
+            r, c = info["row"], info["col"]
             if r < int(startRow):
                 continue
 
             if int(debug) == 1:
-                xlog("COM SHP#{} row={} col={} w={} h={}".format(i, r, c, int(shp.Width), int(shp.Height)))
-
-            if target_col is None:
-                row2shapes[r].append(shp)
+                xlog("COM SHP#{} row={} col={} w={} h={}".format(
+                    info["index"], r, c, int(info["width"]), int(info["height"])), "debug")
+
+            if _col_matches(c, target_col, colTolerance):
+                row2shapes[r].append(info)
+        if scan_all and naming == "merged" and row2shapes:
+            # 合并名称的表：名称列最后几行在合并区域内为空，按图片所在的最后一行补齐
+            rows = range(int(startRow), max(int(last_row), max(row2shapes)) + 1)
+        t0 = _report_time(report, "parse", t0)
+
+        # 名称列整列一次读出（Range.Value），不再逐行 Cells().Value
+        # naming="merged"：合并区域按区域跳读，空名称沿用上一行，须从 startRow 读起
+        names = {}
+        if len(rows) > 0:
+            if naming == "merged":
+                values = excel_com.read_merged_column(xl_ws, name_col_idx, min(int(startRow), rows[0]), rows[-1])
             else:
-                try:
-                    if abs(int(c) - int(target_col)) <= int(colTolerance):
-                        row2shapes[r].append(shp)
-                except Exception:
-                    row2shapes[r].append(shp)
+                values = excel_com.read_column(xl_ws, name_col_idx, rows[0], rows[-1])
+            names = _row_names(values, rows, naming, min(int(startRow), rows[0]))
+        t0 = _report_time(report, "names", t0)
+
+        # 单元格截图的准备：图片列是否有合并单元格（整列查一次）、Chart.Export 复用的临时文件
+        col_idx = target_col if target_col is not None else 1
+        img_merged = True
+        if cell_fallback != "off" and len(rows) > 0:
+            import tempfile
+            img_merged = excel_com.column_has_merges(xl_ws, col_idx, rows[0], rows[-1])
+            scratch_dir = sink.dir_path if sink.kind == "dir" else None
+            fd, scratch_path = tempfile.mkstemp(prefix=".~export_", suffix=".png", dir=scratch_dir)
+            os.close(fd)
 
         # 2) 逐行导出：优先 shapes；否则 fallback 单元格截图
-        for r in range(int(startRow), int(last_row) + 1):
+        _LOG.progress_start("COM", len(rows))
+        for i, r in enumerate(rows, start=1):
+            _LOG.progress("COM", i)
             if r in skip_rows:
                 continue
 
-            raw_name = xl_ws.Cells(r, name_col_idx).Value
-            base_name = _safe_filename(raw_name, default="row_{}".format(r))
+            base_name = names[r]
 
             shapes_in_row = row2shapes.get(r, [])
 
             # 2.1 行内多图：逐 shape 导出
             if shapes_in_row:
-                for k, shp in enumerate(shapes_in_row, start=1):
+                for k, info in enumerate(shapes_in_row, start=1):
+                    if jr is not None and jr.is_done(sheetName, r, k):
+                        resumed += 1
+                        resumed_rows.add(r)
+                        continue
+                    save_path = None
+                    started = False
                     try:
-                        # CopyPicture(Format=2 => xlBitmap)
-                        shp.CopyPicture(Format=2)
-                        filename = "{}_{}.png".format(base_name, k)
-                        save_path = _unique_path(imgSavePath, filename)
-                        _chart_export_from_clipboard(xl_ws, shp.Width, shp.Height, save_path)
+                        # CopyPicture(Format=2 => xlBitmap)，等剪贴板就绪再粘贴
+                        export_core.copy_picture(info["shape"], sleep=xsleep, Format=2)
+                        filename = _image_filename(naming, base_name, k, r, info["col"], "png")
+                        save_path = sink.allocate(filename)
+                        if jr is not None:
+                            jr.start(sheetName, r, k, save_path)
+                            started = True
+                        report["bytes"]["written"] += _com_export_to_sink(xl_ws, info["width"], info["height"],
+                                                                          sink, save_path)
+                        if jr is not None:
+                            jr.finish(sheetName, r, k, save_path)
                         exported += 1
-                        xlog("COM OK(shape): {}".format(save_path))
+                        exported_rows.add(r)
+                        _com_manifest_row(manifest_rows, r, base_name, save_path)
+                        xlog("COM OK(shape): {}".format(save_path), "debug")
                     except Exception as e:
-                        xlog("COM ERR(shape): row={}, err={}".format(r, repr(e)))
+                        xlog("COM ERR(shape): row={}, err={}".format(r, repr(e)), "warn")
+                        failed_rows.add(r)
+                        if started:
+                            jr.abort(sheetName, r, k, save_path)
+                        if save_path is not None:
+                            sink.release(save_path)
                 continue
 
             # 2.2 fallback：导出该行 imgCol 单元格的“可视内容”
+            if cell_fallback == "off":
+                continue
+            if jr is not None and jr.is_done(sheetName, r, 1):
+                resumed += 1
+                resumed_rows.add(r)
+                continue
+            data = None
             try:
-                col_idx = target_col if target_col is not None else 1
                 rng = xl_ws.Cells(r, col_idx)
-                # CopyPicture(Appearance=1: xlScreen, Format=2: xlBitmap)
-                rng.CopyPicture(Appearance=1, Format=2)
-
-                filename = "{}_1.png".format(base_name)
-                save_path = _unique_path(imgSavePath, filename)
-
-                _chart_export_from_clipboard(xl_ws, rng.Width, rng.Height, save_path)
-                exported += 1
-                xlog("COM OK(cell): {}".format(save_path))
+                data = _com_cell_picture(book.excel(), xl_ws, rng, scratch_path, cell_capture, img_merged, debug)
             except Exception as e:
                 if int(debug) == 1:
-                    xlog("COM NOIMG row={} name={} err={}".format(r, base_name, repr(e)))
+                    xlog("COM NOIMG row={} name={} err={}".format(r, base_name, repr(e)), "debug")
+            if data is None:
+                # 没有图片：不分配文件名（名称留给后续行）；续跑时同样跳过
+                if int(debug) == 1:
+                    xlog("COM SKIP(no picture): row={} name={}".format(r, base_name), "debug")
+                if jr is not None:
+                    jr.finish(sheetName, r, 1)
+                continue
 
-        xlog("COM 导出数量: {}".format(exported))
-        return exported
+            save_path = sink.allocate(_image_filename(naming, base_name, 1, r, col_idx, "png"))
+            if jr is not None:
+                jr.start(sheetName, r, 1, save_path)
+            try:
+                report["bytes"]["written"] += _com_scratch_to_sink(scratch_path, data, sink, save_path)
+            except Exception as e:
+                xlog("COM ERR(cell): row={}, err={}".format(r, repr(e)), "warn")
+                failed_rows.add(r)
+                if jr is not None:
+                    jr.abort(sheetName, r, 1, save_path)
+                sink.release(save_path)
+                continue
+            if jr is not None:
+                jr.finish(sheetName, r, 1, save_path)
+            exported += 1
+            exported_rows.add(r)
+            _com_manifest_row(manifest_rows, r, base_name, save_path)
+            xlog("COM OK(cell): {}".format(save_path), "debug")
+
+        if jr is not None:
+            xlog("COM 导出数量: {}（续跑跳过 {}）".format(exported, resumed))
+        else:
+            xlog("COM 导出数量: {}".format(exported))
+        return exported + resumed
 
     except Exception as e:
-        xlog("COM 总异常: {}".format(repr(e)))
-        return exported
+        xlog("COM 总异常: {}".format(repr(e)), "error")
+        return exported + resumed
 
     finally:
-        try:
-            if wb is not None:
-                wb.Close(False)
-        except Exception:
-            pass
-        try:
-            if excel is not None:
-                excel.Quit()
-        except Exception:
-            pass
+        if jr is not None:
+            jr.close()
+        if scratch_path is not None:
+            try:
+                os.remove(scratch_path)
+            except OSError:
+                pass
+        _report_time(report, "com", t0)
+        _report_rows(report, "com", exported, exported_rows, failed_rows)
+        # 续跑跳过的行（本次没有新导出的）计入 skipped，与增量导出一致
+        report["rows"]["skipped"] += len(resumed_rows - exported_rows)
+        if own_book:
+            book.close()
 
 
 # =========================
 # 对外入口（做法一）
+# sheetName: 工作表名；"*" / 列表 / dict 时多工作表一次导出，各写入 imgSavePath/<工作表名>（见 _sheet_specs）
 # engine:
-#   - "auto": openpyxl 先导出 -> COM 只补齐 openpyxl 未导出的行
+#   - "auto": 原生解析先导出（单元格图片 + drawing 图片）-> COM 只补齐原生未导出的行
+#             原生解析异常时退回 openpyxl
 #   - "openpyxl": 只走 openpyxl
 #   - "com": 只走 COM
+#   - "zip": 只走 zip 直读（drawing 图片，不加载整个工作簿，适合大表）
+#   - "native": 只走原生解析（单元格图片 + drawing 图片，不需要 Excel，Linux 可用）
+# passthrough / convert_format:
+#   - passthrough=1: 原始图片字节直接写出（默认）；0: 解码后按原格式重新编码（旧行为）
+#   - convert_format="png"/"jpg"...: 显式转码（仅此时才解码）
+# dedup: "hardlink"（默认）/ "manifest" / "off"，重复图片的落盘方式
+# workers: 写出/转码线程数（1 = 串行；>1 = 有界线程池并行，命名与导出结果不变）
+# incremental: 1 = 按 imgSavePath/export_manifest.json 增量导出（native / zip 引擎；auto 的原生阶段）
+#              未变化的工作簿 / 行直接跳过，变化的行原名重写
+# anchor_match: "overlap"（默认）= 按图片与各行/列的重叠面积分配行（锚点落在上一行也能归到正确的行）
+#               "topleft" = 只看左上角锚点（旧行为）
+# return_result: 0 = 返回 bool（默认）；1 = 返回导出报告 dict（见 _new_report，可 JSON 序列化）
+# sink: "dir"（默认，逐个文件写入 imgSavePath）/ "zip" / "tar"，见 _open_sink
+# sink_path: 归档路径；为空时写到 imgSavePath/<工作簿文件名>.zip|.tar；tar 可用 "-" 写到 stdout
+# max_dim / jpeg_quality / png_compress_level / strip_metadata: 可选缩放 / 转码后处理（见 _new_transform），
+#   都不指定时原始字节直接写出；COM 导出的截图不做后处理
+# memory_budget_mb: 低内存模式的内存预算（MB，见 _Budget）；0 = 不限制（默认）
+# resume: 1 = COM 阶段按 imgSavePath/export_journal_<sha1>.jsonl 断点续跑（见 journal.py，只支持 sink=dir）；
+#         原生阶段的重跑请用 incremental=1
+# naming: "row"（默认）= {名称}_{k}.{ext}；"merged" = export1.py 的命名：合并名称 + 沿用上一行，{名称}_{B2}.{ext}（见 _naming）
+# cell_fallback: COM 没有 shape 的行是否做单元格截图："planned"（默认）/ "off" / "all"（见 _cell_fallback）
+# blank_check / min_kb / retries / clip_timeout: 单元格截图的空白检测与重试（见 _new_cell_capture），
+#   默认不做空白检测、只试一轮；export1.py 为 "pixels" / 8 / 3 / 2 秒
+# manifest_prune: incremental=1 时开始前清理一次 export_manifest.json（默认 1）；
+#   export_batch 已按输出目录清理过，传给子任务的是 0
 # =========================
 def export_images_by_row(xlsx_path, imgSavePath, sheetName="Sheet2",
                          nameCol="B", imgCol="A", startRow=1,
-                         colTolerance=2, debug=0, engine="auto"):
+                         colTolerance=2, debug=0, engine="auto",
+                         passthrough=1, convert_format=None, dedup="hardlink", workers=1,
+                         incremental=0, anchor_match="overlap", return_result=0, sink="dir", sink_path=None,
+                         max_dim=None, jpeg_quality=None, png_compress_level=None, strip_metadata=0,
+                         memory_budget_mb=0, resume=0, naming="row", cell_fallback="planned",
+                         blank_check="off", min_kb=8, retries=1, clip_timeout=excel_com.CLIP_TIMEOUT,
+                         manifest_prune=1):
+    _LOG.configure(debug)
+    report = _new_report(engine)
+    convert_format = _new_transform(convert_format, max_dim, jpeg_quality, png_compress_level, strip_metadata)
+    memory_budget = _new_budget(memory_budget_mb, workers)
+    cell_capture = _new_cell_capture(blank_check, min_kb, retries, clip_timeout)
+    t0 = time.perf_counter()
+    try:
+        ok = _export_images_by_row(report, xlsx_path, imgSavePath, sheetName, nameCol, imgCol, startRow,
+                                   colTolerance, debug, engine, passthrough, convert_format, dedup, workers,
+                                   incremental, anchor_match, sink, sink_path, memory_budget, resume, naming,
+                                   cell_fallback, cell_capture, manifest_prune)
+    finally:
+        _LOG.flush()
+    _report_time(report, "total", t0)
+    report["ok"] = bool(ok)
+    for k, v in report["timings"].items():
+        report["timings"][k] = round(v, 4)
+
+    if int(debug) == 1:
+        xlog("REPORT: {}".format(json.dumps(report, ensure_ascii=False)))
+        _LOG.flush()
+    if int(return_result) == 1:
+        return report
+    return ok
+
+
+def _export_images_by_row(report, xlsx_path, imgSavePath, sheetName, nameCol, imgCol, startRow,
+                          colTolerance, debug, engine, passthrough, convert_format, dedup, workers,
+                          incremental, anchor_match, sink, sink_path, memory_budget=None, resume=0, naming="row",
+                          cell_fallback="planned", cell_capture=None, manifest_prune=1):
     if not os.path.isfile(xlsx_path):
         xlog("xlsx_path 不存在: {}".format(xlsx_path))
         return False
 
-    if not os.path.isdir(imgSavePath):
+    # 归档输出且指定了 sink_path 时，不要求 imgSavePath
+    archive_only = str(sink or "dir").strip().lower() != "dir" and sink_path
+    if not archive_only and not os.path.isdir(imgSavePath or ""):
         xlog("imgSavePath 目录不存在: {}".format(imgSavePath))
         return False
 
+    try:
+        sink = _open_sink(sink, imgSavePath, xlsx_path, sink_path, reclaim_empty=int(resume) == 1)
+    except Exception as e:
+        xlog("输出端打开失败: {}".format(repr(e)), "error")
+        return False
+    if sink.kind != "dir" and (int(incremental) == 1 or int(resume) == 1):
+        # 归档每次重新生成（覆盖已有归档），跳过的行不会出现在新归档里：增量 / 续跑一律关闭
+        xlog("sink={}: 归档每次重新写出，incremental / resume 不生效，本次全量导出".format(sink.kind), "warn")
+        incremental = 0
+        resume = 0
+
+    book = _Book(xlsx_path)
+    try:
+        specs = _sheet_specs(book, sheetName, nameCol, imgCol, startRow, colTolerance)
+        if specs is None:
+            return _run_engines(report, sink, book, xlsx_path, imgSavePath, sheetName, nameCol, imgCol, startRow,
+                                colTolerance, debug, engine, passthrough, convert_format, dedup, workers,
+                                incremental, anchor_match, memory_budget, resume, naming, cell_fallback,
+                                cell_capture, manifest_prune)
+        return _run_sheets(report, sink, book, specs, xlsx_path, imgSavePath, debug, engine, passthrough,
+                           convert_format, dedup, workers, incremental, anchor_match, memory_budget, resume, naming,
+                           cell_fallback, cell_capture, manifest_prune)
+    finally:
+        book.close()
+        sink.close()
+
+
+# =========================
+# 多工作表：sheetName 传 "*" / 列表 / dict 时，工作簿只打开一次，各工作表依次导出到各自子目录
+# - "*": 全部工作表（按工作簿中的顺序）
+# - 列表：元素为工作表名，或 dict {"sheetName": ..., "nameCol" / "imgCol" / "startRow" / "colTolerance": 覆盖值}
+# - dict：{工作表名: {"nameCol": ..., "imgCol": ...}, ...}
+# 子目录名为清洗后的工作表名（归档输出时为归档内的目录前缀），没有导出任何文件的子目录会被删除
+# 原生解析的工作簿级索引、openpyxl 工作簿、Excel 进程都在工作表之间共用（见 _Book）
+# =========================
+_SHEET_SPEC_KEYS = ("nameCol", "imgCol", "startRow", "colTolerance")
+
+
+def _sheet_specs(book, sheetName, nameCol, imgCol, startRow, colTolerance):
+    """
+    单个工作表名返回 None（旧行为：直接写入 imgSavePath）
+    否则返回 [{"sheetName", "nameCol", "imgCol", "startRow", "colTolerance"}, ...]
+    """
+    if isinstance(sheetName, str):
+        if sheetName.strip() != "*":
+            return None
+        items = book.sheet_names()
+    elif isinstance(sheetName, dict):
+        items = [dict(v or {}, sheetName=k) for k, v in sheetName.items()]
+    else:
+        items = list(sheetName or [])
+
+    specs = []
+    seen = set()
+    for item in items:
+        spec = {"sheetName": item, "nameCol": nameCol, "imgCol": imgCol, "startRow": startRow,
+                "colTolerance": colTolerance}
+        if isinstance(item, dict):
+            spec["sheetName"] = item.get("sheetName")
+            for k in _SHEET_SPEC_KEYS:
+                if k in item:
+                    spec[k] = item[k]
+        name = spec["sheetName"]
+        if not name or name in seen:
+            continue
+        seen.add(name)
+        specs.append(spec)
+    return specs
+
+
+def _run_sheets(report, sink, book, specs, xlsx_path, imgSavePath, debug, engine, passthrough,
+                convert_format, dedup, workers, incremental, anchor_match, memory_budget=None, resume=0,
+                naming="row", cell_fallback="planned", cell_capture=None, manifest_prune=1):
+    report["sheets"] = {}
+    xlog("多工作表导出：{} 个工作表".format(len(specs)))
+    used = set()
+    ok_any = False
+    for spec in specs:
+        name = spec["sheetName"]
+        base = _safe_filename(name, default="sheet")
+        sub, n = base, 2
+        while os.path.normcase(sub) in used:
+            sub = "{}_{}".format(base, n)
+            n += 1
+        used.add(os.path.normcase(sub))
+
+        before = sum(report["images"].values())
+        ok = False
+        sheet_sink = None
+        try:
+            sheet_sink = sink.sub(sub)
+            sheet_dir = getattr(sheet_sink, "dir_path", imgSavePath)
+            xlog("SHEET: {} -> {}".format(name, sub))
+            ok = _run_engines(report, sheet_sink, book, xlsx_path, sheet_dir, name, spec["nameCol"], spec["imgCol"],
+                              spec["startRow"], spec["colTolerance"], debug, engine, passthrough, convert_format,
+                              dedup, workers, incremental, anchor_match, memory_budget, resume, naming,
+                              cell_fallback, cell_capture, manifest_prune)
+        except Exception as e:
+            xlog("SHEET {} 异常: {}".format(name, repr(e)), "warn")
+        finally:
+            if sheet_sink is not None:
+                sheet_sink.close()
+            if sheet_sink is not None and sheet_sink.kind == "dir":
+                try:
+                    os.rmdir(sheet_sink.dir_path)  # 只删除空目录
+                except OSError:
+                    pass
+        report["sheets"][name] = {"ok": bool(ok), "images": sum(report["images"].values()) - before, "dir": sub}
+        ok_any = ok_any or bool(ok)
+    return ok_any
+
+
+def _run_engines(report, sink, book, xlsx_path, imgSavePath, sheetName, nameCol, imgCol, startRow,
+                 colTolerance, debug, engine, passthrough, convert_format, dedup, workers,
+                 incremental, anchor_match, memory_budget=None, resume=0, naming="row", cell_fallback="planned",
+                 cell_capture=None, manifest_prune=1):
+    # 增量清单每次运行清理一次（不在每次保存时清理）
+    if int(incremental) == 1 and int(manifest_prune) == 1 and sink.kind == "dir":
+        _prune_manifest_file(imgSavePath)
+
+    # 原生 / openpyxl 引擎共用的写出选项
+    anchor_match = _anchor_match(anchor_match)
+    naming = _naming(naming)
+    cell_fallback = _cell_fallback(cell_fallback)
+    opts = dict(passthrough=passthrough, convert_format=convert_format, dedup=dedup, workers=workers,
+                incremental=incremental, anchor_match=anchor_match, report=report, sink=sink, book=book,
+                memory_budget=memory_budget, naming=naming)
+
     if engine == "openpyxl":
         try:
-            c1, _ = _export_by_openpyxl(xlsx_path, imgSavePath, sheetName, nameCol, imgCol, startRow, colTolerance, debug)
+            c1, _ = _export_by_openpyxl(xlsx_path, imgSavePath, sheetName, nameCol, imgCol, startRow, colTolerance, debug, **opts)
             return c1 > 0
         except Exception as e:
-            xlog("openpyxl 模式异常: {}".format(repr(e)))
+            xlog("openpyxl 模式异常: {}".format(repr(e)), "warn")
+            return False
+
+    if engine == "zip":
+        try:
+            c1, rows1 = _export_by_zip(xlsx_path, imgSavePath, sheetName, nameCol, imgCol, startRow, colTolerance, debug, **opts)
+            return c1 > 0 or len(rows1) > 0
+        except Exception as e:
+            xlog("zip 模式异常: {}".format(repr(e)), "warn")
+            return False
+
+    if engine == "native":
+        try:
+            c1, rows1 = _export_by_native(xlsx_path, imgSavePath, sheetName, nameCol, imgCol, startRow, colTolerance, debug, **opts)
+            return c1 > 0 or len(rows1) > 0
+        except Exception as e:
+            xlog("native 模式异常: {}".format(repr(e)), "warn")
             return False
 
     if engine == "com":
-        c2 = _export_by_com(xlsx_path, imgSavePath, sheetName, nameCol, imgCol, startRow, colTolerance, debug, skip_rows=set())
+        c2 = _export_by_com(xlsx_path, imgSavePath, sheetName, nameCol, imgCol, startRow, colTolerance, debug, skip_rows=set(),
+                            anchor_match=anchor_match, report=report, sink=sink, book=book, resume=resume,
+                            naming=naming, cell_fallback=cell_fallback, cell_capture=cell_capture)
         return c2 > 0
 
-    # auto：两种都跑，但 COM 只补齐 openpyxl 未导出的行
+    # auto：原生解析优先，按覆盖清单规划 COM 只补齐原生解析不了的行
+    # （cell_fallback="all" 要截图纯文字行，不做规划，COM 照旧扫描全部行）
     c1 = 0
     rows1 = set()
+    name_col_idx = column_index_from_string(str(nameCol).strip())
+    inventory = xlsx_native.new_inventory([name_col_idx]) if cell_fallback != "all" else None
     try:
-        c1, rows1 = _export_by_openpyxl(xlsx_path, imgSavePath, sheetName, nameCol, imgCol, startRow, colTolerance, debug)
+        c1, rows1 = _export_by_native(xlsx_path, imgSavePath, sheetName, nameCol, imgCol, startRow, colTolerance, debug,
+                                      inventory=inventory, **opts)
     except Exception as e:
-        xlog("AUTO: openpyxl 异常: {}".format(repr(e)))
+        if memory_budget is not None:
+            # openpyxl 会整本载入图片，低内存模式下不退回
+            xlog("AUTO: 原生解析异常（低内存模式，不退回 openpyxl）: {}".format(repr(e)), "warn")
+        else:
+            xlog("AUTO: 原生解析异常，改用 openpyxl: {}".format(repr(e)), "warn")
+            try:
+                c1, rows1 = _export_by_openpyxl(xlsx_path, imgSavePath, sheetName, nameCol, imgCol, startRow, colTolerance, debug, **opts)
+            except Exception as e2:
+                xlog("AUTO: openpyxl 异常: {}".format(repr(e2)), "warn")
+
+    target_col = None
+    if imgCol is not None and str(imgCol).strip() != "":
+        try:
+            target_col = column_index_from_string(str(imgCol).strip())
+        except Exception:
+            target_col = None
+    com_rows = _plan_com_rows(inventory, rows1, startRow, target_col, colTolerance, name_col_idx, naming)
+    if com_rows is not None:
+        # 多工作表时各表累加
+        last_row = inventory["last_row"].get(name_col_idx, 0)
+        plan = report.setdefault("plan", {"last_row": 0, "native_rows": 0, "com_rows": 0})
+        plan["last_row"] = max(plan["last_row"], last_row)
+        plan["native_rows"] += len(rows1)
+        plan["com_rows"] += len(com_rows)
+        xlog("AUTO: 覆盖规划 名称列最后一行={}，原生已导出 {} 行，COM 补齐 {} 行".format(
+            last_row, len(rows1), len(com_rows)))
 
     c2 = 0
+    # 增量：COM 补齐的行并入原生阶段保存的清单条目，工作簿变化后由原生阶段删除旧文件
+    com_manifest = {} if int(incremental) == 1 and sink.kind == "dir" else None
+    if com_rows is not None and not com_rows:
+        xlog("AUTO: 原生解析已覆盖全部图片行，不启动 Excel")
+    else:
+        try:
+            c2 = _export_by_com(xlsx_path, imgSavePath, sheetName, nameCol, imgCol, startRow, colTolerance, debug,
+                                skip_rows=rows1, anchor_match=anchor_match, report=report, sink=sink, book=book,
+                                rows=com_rows, resume=resume, naming=naming, cell_fallback=cell_fallback,
+                                cell_capture=cell_capture, manifest_rows=com_manifest)
+        except Exception as e:
+            xlog("AUTO: COM 异常: {}".format(repr(e)), "warn")
+    if com_manifest:
+        try:
+            _manifest_add_rows(imgSavePath, _manifest_key(xlsx_path, sheetName), com_manifest)
+        except Exception as e:
+            xlog("AUTO: 记录 COM 行到增量清单失败: {}".format(repr(e)), "warn")
+
+    xlog("AUTO: 完成（native={}, com={}）".format(c1, c2))
+    return (c1 + c2) > 0 or len(rows1) > 0
+
+
+# =========================
+# 内存流式读取：不写文件，按行顺序逐张产出图片（native / zip 引擎）
+# 产出 dict：
+#   row / col: 图片所在行 / 列（1-based）
+#   index:     行内序号（从 1 开始，同导出文件名里的 _k）
+#   name:      名称列原始值（naming="merged" 时合并区域取左上角的值）
+#   filename:  与导出时一致的文件名（不含同名后缀 _2/_3），命名方式 naming 同 export_images_by_row
+#   format:    扩展名（png / jpg / ...）
+#   data:      图片字节（passthrough=1 为原始字节；convert_format / max_dim 等后处理 / passthrough=0 时为处理后字节）
+#   media:     包内部件路径
+# - 先只收集锚点和部件路径（很小），图片字节在迭代到时才读取，同一时刻只持有一张图片
+# - 生成器关闭 / 迭代结束时自动关闭 xlsx
+# =========================
+def iter_images(xlsx_path, sheetName="Sheet2", nameCol="B", imgCol="A", startRow=1,
+                colTolerance=2, debug=0, engine="native", passthrough=1, convert_format=None,
+                anchor_match="overlap", max_dim=None, jpeg_quality=None, png_compress_level=None, strip_metadata=0,
+                naming="row"):
+    _LOG.configure(debug)
+    if engine == "native":
+        sources = ("cell", "drawing")
+    elif engine == "zip":
+        sources = ("drawing",)
+    else:
+        raise ValueError("iter_images 仅支持 native / zip 引擎: {}".format(engine))
+
+    target_col = None
+    if imgCol is not None and str(imgCol).strip() != "":
+        try:
+            target_col = column_index_from_string(str(imgCol).strip())
+        except Exception:
+            target_col = None
+    name_col_idx = column_index_from_string(str(nameCol).strip())
+    anchor_match = _anchor_match(anchor_match)
+    naming = _naming(naming)
+    convert_format = _new_transform(convert_format, max_dim, jpeg_quality, png_compress_level, strip_metadata)
+
     try:
-        c2 = _export_by_com(xlsx_path, imgSavePath, sheetName, nameCol, imgCol, startRow, colTolerance, debug, skip_rows=rows1)
+        with xlsx_native.open_xlsx(xlsx_path) as zf:
+            sheet_part = xlsx_native.resolve_sheet_part(zf, sheetName)
+            if sheet_part is None:
+                names = [n for n, _ in xlsx_native.sheet_parts(zf)]
+                raise KeyError("找不到工作表 {}，实际: {}".format(sheetName, names))
+
+            row2media = _collect_native(zf, sheet_part, sources, target_col, startRow, colTolerance, debug, engine,
+                                        anchor_match)
+            values, names = _native_names(zf, sheet_part, name_col_idx, row2media.keys(), naming, startRow)
+
+            for r in sorted(row2media):
+                base_name = names[r]
+                for k, (c, media) in enumerate(row2media[r], start=1):
+                    data, ext2 = _prepare_image(xlsx_native.read_media(zf, media), passthrough, convert_format,
+                                                fallback_ext=_media_ext(media))
+                    yield {
+                        "row": r,
+                        "col": c,
+                        "index": k,
+                        "name": values.get(r),
+                        "filename": _image_filename(naming, base_name, k, r, c, ext2),
+                        "format": ext2,
+                        "data": data,
+                        "media": media,
+                    }
+    finally:
+        _LOG.flush()
+
+
+# =========================
+# 批量导出：多个工作簿按进程池并行（适合 native / zip / openpyxl 引擎）
+# jobs:
+#   - glob 字符串，如 r"D:\in\**\*.xlsx"
+#   - 路径 / glob 列表
+#   - dict 列表：{"xlsx_path": ..., "sheetName": ..., "nameCol": ..., ...}，单个文件的参数覆盖公共参数
+# imgSavePath: 公共导出目录；per_file_dir=1 时每个工作簿写入 imgSavePath/<文件名> 子目录
+# processes: 进程数，默认 CPU 核数；<=1 时在当前进程串行执行
+# 返回: [{"xlsx_path", "imgSavePath", "ok", "error", "seconds"}, ...]，顺序与输入一致
+#       公共参数 / 单个任务带 return_result=1 时，另有 "result": 该工作簿的导出报告
+# 单个文件失败（含子进程崩溃）只记录在该文件的结果里，不影响其它文件
+# =========================
+_GLOB_CHARS = set("*?[")
+
+
+def _batch_expand(jobs):
+    if isinstance(jobs, (str, dict)):
+        jobs = [jobs]
+
+    out = []
+    for job in jobs or []:
+        if isinstance(job, dict):
+            out.append(dict(job))
+            continue
+        job = str(job)
+        if _GLOB_CHARS & set(job):
+            for path in sorted(glob.glob(job, recursive=True)):
+                out.append({"xlsx_path": path})
+        else:
+            out.append({"xlsx_path": job})
+    return out
+
+
+def _batch_worker(job):
+    t0 = time.time()
+    res = {"xlsx_path": job.get("xlsx_path"), "imgSavePath": job.get("imgSavePath"), "ok": False, "error": None}
+    try:
+        out = export_images_by_row(**job)
+        if isinstance(out, dict):
+            res["ok"] = out["ok"]
+            res["result"] = out
+        else:
+            res["ok"] = bool(out)
     except Exception as e:
-        xlog("AUTO: COM 异常: {}".format(repr(e)))
+        res["error"] = repr(e)
+    res["seconds"] = round(time.time() - t0, 3)
+    return res
+
+
+def export_batch(jobs, imgSavePath=None, processes=None, per_file_dir=1, **defaults):
+    tasks = []
+    for job in _batch_expand(jobs):
+        task = dict(defaults)
+        task.update(job)
+        if not task.get("imgSavePath"):
+            task["imgSavePath"] = imgSavePath
+        if int(per_file_dir) == 1 and "imgSavePath" not in job and task.get("imgSavePath"):
+            stem = os.path.splitext(os.path.basename(task["xlsx_path"]))[0]
+            task["imgSavePath"] = os.path.join(task["imgSavePath"], _safe_filename(stem, default="book"))
+        tasks.append(task)
+
+    xlog("BATCH: 工作簿数量: {}".format(len(tasks)))
+
+    # 先确认输入存在再建输出目录：路径写错的任务不留下空目录（错误由任务自己报告）
+    for task in tasks:
+        if not os.path.isfile(task.get("xlsx_path") or ""):
+            continue
+        if task.get("imgSavePath") and not os.path.isdir(task["imgSavePath"]):
+            try:
+                os.makedirs(task["imgSavePath"])
+            except Exception:
+                pass
+
+    # 增量清单按输出目录只清理一次；子任务共用目录时不再各自清理
+    # （多工作表任务的清单在各工作表子目录里，仍由任务自己清理）
+    pruned = set()
+    for task in tasks:
+        if int(task.get("incremental", 0)) != 1 or not task.get("imgSavePath"):
+            continue
+        sheets = task.get("sheetName", "Sheet2")
+        if not isinstance(sheets, str) or sheets.strip() == "*":
+            continue
+        if int(task.get("manifest_prune", 1)) == 1:
+            d = os.path.normcase(os.path.abspath(task["imgSavePath"]))
+            if d not in pruned and str(task.get("sink") or "dir").strip().lower() == "dir":
+                pruned.add(d)
+                try:
+                    _prune_manifest_file(task["imgSavePath"])
+                except Exception as e:
+                    xlog("BATCH: 清理增量清单失败: {}".format(repr(e)), "warn")
+        task["manifest_prune"] = 0
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = max(1, min(int(processes), len(tasks) or 1))
+
+    results = [None] * len(tasks)
+    if processes <= 1:
+        for i, task in enumerate(tasks):
+            results[i] = _batch_worker(task)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            futures = [pool.submit(_batch_worker, task) for task in tasks]
+            for i, fut in enumerate(futures):
+                try:
+                    results[i] = fut.result()
+                except Exception as e:
+                    results[i] = {"xlsx_path": tasks[i].get("xlsx_path"), "imgSavePath": tasks[i].get("imgSavePath"),
+                                  "ok": False, "error": repr(e), "seconds": None}
 
-    xlog("AUTO: 完成（openpyxl={}, com={}）".format(c1, c2))
-    return (c1 + c2) > 0
+    ok = sum(1 for r in results if r["ok"])
+    failed = [r for r in results if r["error"]]
+    xlog("BATCH: 完成（成功={}, 未导出={}, 异常={}）".format(ok, len(results) - ok - len(failed), len(failed)))
+    for r in failed:
+        xlog("BATCH ERR: {} -> {}".format(r["xlsx_path"], r["error"]), "warn")
+    _LOG.flush()
+    return results
 
 
 # =========================
@@ -391,15 +2583,46 @@ def export_images_by_row(xlsx_path, imgSavePath, sheetName="Sheet2",
 # =========================
 def main(args):
     try:
+        # 批量模式：args["batch"] = glob 字符串 / 路径列表 / dict 列表
+        if args.get("batch"):
+            opts = dict((k, v) for k, v in args.items() if k not in ("batch", "processes", "per_file_dir"))
+            return export_batch(
+                args.get("batch"),
+                processes=args.get("processes", None),
+                per_file_dir=args.get("per_file_dir", 1),
+                **opts
+            )
+
         xlsx_path = args.get("xlsx_path", "")
         imgSavePath = args.get("imgSavePath", "")
-        sheetName = args.get("sheetName", "Sheet2")
+        sheetName = args.get("sheetName", "Sheet2")  # 也可为 "*" / 列表：多工作表导出
         nameCol = args.get("nameCol", "B")
         imgCol = args.get("imgCol", "A")
         startRow = args.get("startRow", 1)
         colTolerance = args.get("colTolerance", 2)
         debug = args.get("debug", 0)
-        engine = args.get("engine", "auto")  # ✅ 新增：auto/openpyxl/com
+        engine = args.get("engine", "auto")  # ✅ 新增：auto/openpyxl/com/zip/native
+        passthrough = args.get("passthrough", 1)
+        convert_format = args.get("convert_format", None)
+        dedup = args.get("dedup", "hardlink")
+        workers = args.get("workers", 1)
+        incremental = args.get("incremental", 0)
+        anchor_match = args.get("anchor_match", "overlap")
+        return_result = args.get("return_result", 0)  # 1 = 返回导出报告 dict
+        sink = args.get("sink", "dir")  # dir / zip / tar
+        sink_path = args.get("sink_path", None)
+        max_dim = args.get("max_dim", None)  # 最长边上限（像素），超过才缩小
+        jpeg_quality = args.get("jpeg_quality", None)
+        png_compress_level = args.get("png_compress_level", None)
+        strip_metadata = args.get("strip_metadata", 0)
+        memory_budget_mb = args.get("memory_budget_mb", 0)  # >0 = 低内存模式：图片分块流式写出
+        resume = args.get("resume", 0)  # 1 = COM 阶段断点续跑
+        naming = args.get("naming", "row")  # "merged" = export1.py 的合并名称命名
+        cell_fallback = args.get("cell_fallback", "planned")  # COM 单元格截图：planned / off / all
+        blank_check = args.get("blank_check", "off")  # 单元格截图空白检测：off / pixels / size
+        min_kb = args.get("min_kb", 8)
+        retries = args.get("retries", 1)
+        clip_timeout = args.get("clip_timeout", excel_com.CLIP_TIMEOUT)  # 剪贴板就绪轮询的最长等待（秒）
 
         return export_images_by_row(
             xlsx_path=xlsx_path,
@@ -410,8 +2633,31 @@ def main(args):
             startRow=startRow,
             colTolerance=colTolerance,
             debug=debug,
-            engine=engine
+            engine=engine,
+            passthrough=passthrough,
+            convert_format=convert_format,
+            dedup=dedup,
+            workers=workers,
+            incremental=incremental,
+            anchor_match=anchor_match,
+            return_result=return_result,
+            sink=sink,
+            sink_path=sink_path,
+            max_dim=max_dim,
+            jpeg_quality=jpeg_quality,
+            png_compress_level=png_compress_level,
+            strip_metadata=strip_metadata,
+            memory_budget_mb=memory_budget_mb,
+            resume=resume,
+            naming=naming,
+            cell_fallback=cell_fallback,
+            blank_check=blank_check,
+            min_kb=min_kb,
+            retries=retries,
+            clip_timeout=clip_timeout
         )
     except Exception as e:
-        xlog("main 执行异常: {}".format(repr(e)))
+        xlog("main 执行异常: {}".format(repr(e)), "error")
         return False
+    finally:
+        _LOG.flush()
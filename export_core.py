@@ -0,0 +1,359 @@
+# =========================
+# 三个导出模块（export.py / allow_cell_fallback.py / export1.py）共用的核心
+# - 日志：分级 + 缓冲 + 进度汇总（Log，输出函数由各模块注入，本模块不依赖 xbot）
+# - 命名：文件名清洗（safe_filename）+ 防覆盖分配（NameRegistry）
+# - COM 截图：CopyPicture -> 剪贴板就绪轮询 -> Chart.Paste -> Export
+# - 空白检测：单元格截图的结果在内存中判定是否为空白（looks_like_blank）
+# - 流水线：prefetch 有界预读，读取下一张图片与解码 / 写出上一张重叠
+# 各模块里原来各自的一份（_safe_filename / _NameRegistry / _chart_export_from_clipboard / _Log）
+# 都改为引用这里，任何一处的优化三个入口同时生效
+# =========================
+
+import io
+import os
+import re
+import threading
+import time
+
+try:
+    from . import excel_com  # Xbot 应用内以包方式加载
+except ImportError:
+    import excel_com
+
+
+# =========================
+# 日志：分级 + 缓冲（永远只传 1 个字符串参数给输出函数）
+# - xbot.print 每次都是一次 UI/IPC 往返，逐图打印在上万张图片的表上占比明显
+# - 消息先进缓冲区，攒满 LOG_BUFFER 条或距上次输出超过 LOG_INTERVAL 秒才合并成一次输出；error 立即输出
+# - 逐图 OK / 锚点明细为 debug 级别，默认只输出进度汇总（N/total, 张/秒），debug=1 时才逐条输出
+# - stream 不为 None 时直接写该输出流（如 tar 写到 stdout 时日志改走 stderr）
+# =========================
+LOG_LEVELS = {"debug": 10, "info": 20, "warn": 30, "error": 40}
+LOG_BUFFER = 200
+LOG_INTERVAL = 2.0
+
+
+class Log(object):
+    def __init__(self, printer):
+        self.printer = printer  # printer(text)
+        self.level = LOG_LEVELS["info"]
+        self.buf = []
+        self.last = time.time()
+        self.prog = {}  # tag -> [开始时间, 上次汇总时间, total]
+        self.stream = None
+        self.lock = threading.Lock()
+
+    def configure(self, debug=0):
+        self.level = LOG_LEVELS["debug"] if int(debug) == 1 else LOG_LEVELS["info"]
+
+    def emit(self, msg, level="info"):
+        lv = LOG_LEVELS.get(level, LOG_LEVELS["info"])
+        if lv < self.level:
+            return
+        with self.lock:
+            self.buf.append(str(msg))
+            now = time.time()
+            if lv >= LOG_LEVELS["error"] or len(self.buf) >= LOG_BUFFER or now - self.last >= LOG_INTERVAL:
+                self._flush_locked(now)
+
+    def _write(self, text):
+        if self.stream is not None:
+            try:
+                self.stream.write(text + "\n")
+                self.stream.flush()
+            except Exception:
+                pass
+            return
+        self.printer(text)
+
+    def _flush_locked(self, now=None):
+        if self.buf:
+            text = "\n".join(self.buf)
+            self.buf = []
+            self._write(text)
+        self.last = now or time.time()
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+    def progress_start(self, tag, total):
+        now = time.time()
+        self.prog[tag] = [now, now, int(total)]
+
+    def progress(self, tag, done):
+        """每 LOG_INTERVAL 秒（以及完成时）输出一行进度汇总：已处理/总数（图片或行）、每秒处理数"""
+        p = self.prog.get(tag)
+        if p is None:
+            return
+        now = time.time()
+        if done < p[2] and now - p[1] < LOG_INTERVAL:
+            return
+        p[1] = now
+        rate = done / max(now - p[0], 1e-6)
+        self.emit("{} 进度: {}/{}（{:.1f}/秒）".format(tag, done, p[2], rate))
+
+
+# =========================
+# 文件名清洗 + 防覆盖命名
+# =========================
+def safe_filename(name, default="image"):
+    if name is None:
+        name = default
+    name = str(name).strip()
+    if not name:
+        name = default
+    return re.sub(r'[\\/:*?"<>|]+', "_", name)
+
+
+class NameRegistry(object):
+    """
+    输出文件名分配器（替代逐个 os.path.exists 探测的 _unique_path）
+    - 首次分配时 os.listdir 扫描一次目标目录，之后只查内存集合
+    - 每个文件名记住下一个可用后缀，重名再多也是 O(1) 分配：name.png -> name_2.png -> name_3.png ...
+    - 分配即以 O_CREAT|O_EXCL 创建空占位文件，多线程 / 多进程写同一目录也不会互相覆盖
+    - 后缀不设上限，不会再出现“探测用尽后返回已存在路径”导致覆盖
+    - dir_path=None：只在内存中分配（归档输出用），返回文件名本身，不创建占位
+    - cleanup()：删除本次创建、最终没有写入内容的占位（输出端关闭时调用，中途异常退出也不留空文件）
+    - reclaim_empty=True（续跑）：目录里已有的 0 字节文件视为上次崩溃留下的占位，名称照常分配，后缀不会因此后移
+    """
+
+    def __init__(self, dir_path, reclaim_empty=False):
+        self.dir_path = dir_path
+        self.reclaim_empty = reclaim_empty
+        self.taken = None
+        self.next_n = {}
+        self.placeholders = set()
+        self.lock = threading.Lock()
+
+    def _is_empty(self, name):
+        try:
+            return os.path.getsize(os.path.join(self.dir_path, name)) == 0
+        except OSError:
+            return False
+
+    def _try_take(self, name):
+        key = os.path.normcase(name)
+        if key in self.taken:
+            return None
+        if self.dir_path is None:
+            self.taken.add(key)
+            return name
+        p = os.path.join(self.dir_path, name)
+        try:
+            fd = os.open(p, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)  # 与 open(p, "wb") 一致，受 umask 约束
+        except FileExistsError:
+            self.taken.add(key)
+            if self.reclaim_empty and self._is_empty(name):
+                self.placeholders.add(p)  # 上次留下的空占位：直接接管
+                return p
+            return None
+        os.close(fd)
+        self.taken.add(key)
+        self.placeholders.add(p)
+        return p
+
+    def allocate(self, filename):
+        with self.lock:
+            if self.taken is None:
+                try:
+                    self.taken = set(os.path.normcase(n) for n in os.listdir(self.dir_path)
+                                     if not (self.reclaim_empty and self._is_empty(n)))
+                except Exception:
+                    self.taken = set()  # 含 dir_path=None
+
+            p = self._try_take(filename)
+            if p is not None:
+                return p
+
+            base, ext = os.path.splitext(filename)
+            n = self.next_n.get(filename, 2)
+            while True:
+                p = self._try_take("{}_{}{}".format(base, n, ext))
+                n += 1
+                if p is not None:
+                    self.next_n[filename] = n
+                    return p
+
+    def release(self, path, forget=True):
+        """
+        导出失败 / 不落盘时删除空占位文件；forget=True 时该文件名可被再次分配
+        """
+        if self.dir_path is not None:
+            try:
+                if os.path.getsize(path) == 0:
+                    os.remove(path)
+            except Exception:
+                pass
+        with self.lock:
+            self.placeholders.discard(path)
+            if forget and self.taken is not None:
+                self.taken.discard(os.path.normcase(os.path.basename(path)))
+
+    def cleanup(self):
+        """删除仍为 0 字节的占位（分配后没有写出：中途异常 / 被中断）"""
+        with self.lock:
+            placeholders, self.placeholders = self.placeholders, set()
+        for p in placeholders:
+            try:
+                if os.path.getsize(p) == 0:
+                    os.remove(p)
+            except OSError:
+                pass
+
+
+# =========================
+# COM 截图：剪贴板 -> 临时 Chart -> Export
+# - CopyPicture 之后轮询剪贴板序号与图片格式（指数退避，最多 clip_timeout 秒，见 excel_com.wait_until），
+#   不再固定 sleep，也不会在剪贴板未就绪时粘贴；Paste 之后直接 Export，不再轮询 Chart
+# - 超时照常继续：空白图由调用方的空白检测 / 导出结果处理
+# - select_area=True 时 Paste 前先选中 ChartArea（单元格截图沿用 export1 原来的做法），shape 导出不选，省两次往返
+# - sleep 可注入（xbot.sleep）
+# =========================
+def copy_picture(obj, clip_timeout=excel_com.CLIP_TIMEOUT, sleep=None, **kwargs):
+    """obj.CopyPicture(**kwargs) 并等剪贴板就绪；返回是否在 clip_timeout 内就绪"""
+    seq = excel_com.clipboard_sequence()
+    obj.CopyPicture(**kwargs)
+    return excel_com.wait_clipboard(seq, clip_timeout, sleep=sleep)
+
+
+def chart_export(xl_ws, width, height, save_path, min_side=20, select_area=False):
+    co = xl_ws.ChartObjects().Add(0, 0, max(min_side, int(width)), max(min_side, int(height)))
+    try:
+        chart = co.Chart
+        if select_area:
+            try:
+                chart.ChartArea.Select()
+            except Exception:
+                pass
+        chart.Paste()
+        chart.Export(save_path)
+    finally:
+        try:
+            co.Delete()
+        except Exception:
+            pass
+
+
+# =========================
+# 空白检测：单元格截图读成 bytes 在内存中判定，不再“写盘 -> 看大小 -> 删掉 -> 重试”
+# - "pixels"：去掉四周边距（Chart 边框 / 单元格边框）后缩小到 BLANK_SIDE 见方的灰度图，
+#   按直方图统计与主色差异超过 BLANK_TOL 的像素，占比不超过 BLANK_RATIO 视为空白（透明区域按白色计）；
+#   小而真实的图片不会再因为文件小被当成空白
+# - 没有 PIL / 解码失败时退回 min_kb 文件大小判定；"size" 始终只按 min_kb 判定
+# =========================
+BLANK_MARGIN = 0.05
+BLANK_SIDE = 64
+BLANK_TOL = 12
+BLANK_RATIO = 0.001
+
+
+def _blank_by_size(data, min_kb):
+    return len(data or b"") < int(min_kb) * 1024
+
+
+def _blank_by_pixels(data):
+    """
+    True / False；无法判定（没有 PIL、不是图片）返回 None
+    """
+    try:
+        from PIL import Image as PILImage
+        pil = PILImage.open(io.BytesIO(data))
+        pil.draft("L", (BLANK_SIDE * 4, BLANK_SIDE * 4))  # 仅对 JPEG 生效：解码时就缩小
+        pil.load()
+    except Exception:
+        return None
+
+    try:
+        if pil.mode in ("RGBA", "LA", "PA") or "transparency" in pil.info:
+            rgba = pil.convert("RGBA")
+            pil = PILImage.new("RGBA", rgba.size, (255, 255, 255, 255))
+            pil.alpha_composite(rgba)
+        gray = pil.convert("L")
+
+        w, h = gray.size
+        mx, my = int(w * BLANK_MARGIN), int(h * BLANK_MARGIN)
+        if w - 2 * mx >= 1 and h - 2 * my >= 1:
+            gray = gray.crop((mx, my, w - mx, h - my))
+        gray.thumbnail((BLANK_SIDE, BLANK_SIDE), PILImage.BOX)
+
+        hist = gray.histogram()
+        total = sum(hist)
+        if total <= 0:
+            return True
+        mode = max(range(256), key=hist.__getitem__)
+        off = sum(n for v, n in enumerate(hist) if abs(v - mode) > BLANK_TOL)
+        return off <= BLANK_RATIO * total
+    except Exception:
+        return None
+
+
+def looks_like_blank(data, min_kb, blank_check="pixels"):
+    if not data:
+        return True
+    if blank_check != "size":
+        verdict = _blank_by_pixels(data)
+        if verdict is not None:
+            return verdict
+    return _blank_by_size(data, min_kb)
+
+
+# =========================
+# 流水线：有界预读
+# - 读取线程按顺序对 items 调用 load(item)，结果放入容量为 depth 的队列；消费方按原顺序取出
+# - 队列满时读取线程阻塞（背压），在途的预读结果最多 depth 个，内存有界
+# - 产出 (item, value, error)：load 抛异常时 value 为 None、error 为异常，由消费方按原有方式处理
+# - load 返回 None 表示该项无需预读（例如重复的 media 部件），照常按顺序产出
+# - 遍历 items 本身抛出的异常（不是 load 抛出的）转交消费方，在取到该位置时重新抛出，不会当作正常结束
+# - 消费方提前结束（break / 异常）时读取线程随之退出
+# =========================
+PREFETCH_DEPTH = 4
+
+
+def prefetch(items, load, depth=PREFETCH_DEPTH):
+    import queue
+
+    depth = max(1, int(depth or 1))
+    q = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+    failed = []  # 遍历 items 时的异常
+
+    def put(entry):
+        while not stop.is_set():
+            try:
+                q.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def reader():
+        try:
+            for item in items:
+                if stop.is_set():
+                    return
+                try:
+                    entry = (item, load(item), None)
+                except Exception as e:
+                    entry = (item, None, e)
+                if not put(entry):
+                    return
+        except BaseException as e:
+            failed.append(e)
+        finally:
+            put(done)
+
+    t = threading.Thread(target=reader, name="export-prefetch", daemon=True)
+    t.start()
+    try:
+        while True:
+            entry = q.get()
+            if entry is done:
+                if failed:
+                    raise failed[0]
+                return
+            yield entry
+    finally:
+        stop.set()
+        t.join()
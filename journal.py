@@ -0,0 +1,174 @@
+# =========================
+# 断点续跑日志：输出目录下的 export_journal_<工作簿路径 sha1 前 12 位>.jsonl（只追加）
+# - 每个工作簿一个日志文件：多个工作簿导出到同一目录时互不覆盖
+# - 每行一条 JSON：
+#     {"op": "book", "path", "size", "mtime"}                 文件头：工作簿身份（路径 + 大小 + mtime），变化后旧记录作废
+#     {"op": "start", "sheet", "row", "k", "path"}            已分配文件名、开始导出
+#     {"op": "done", "sheet", "row", "k", "path", "sha1"}     已完成；path 为 null 表示该格确认没有图片
+#     {"op": "abort", "sheet", "row", "k", "path"}            start 之后导出失败，文件名已释放（可能被后面的图片复用）
+# - 续跑时载入为 {(sheet, row, k): 记录}，每张图 O(1) 判断是否已完成（输出文件仍在才算完成）
+# - 只有 start 没有 done / abort 的条目（中途崩溃）：删除留下的占位 / 半截文件，文件名重新分配给同一张图
+#   该文件名若已被某条 done 记录引用（失败后复用给了别的图片），不删除
+# - 每条记录立即 write + flush（进程被杀也不丢）；fsync 按 SYNC_EVERY 条 / SYNC_INTERVAL 秒批量执行
+# - path 只记文件名（相对输出目录），目录整体移动后仍可续跑
+# - 本模块不依赖 xbot
+# =========================
+
+import hashlib
+import json
+import os
+import time
+
+
+JOURNAL_PREFIX = "export_journal"
+SYNC_EVERY = 64
+SYNC_INTERVAL = 2.0
+
+
+def _book_identity(xlsx_path):
+    st = os.stat(xlsx_path)
+    return {"path": os.path.abspath(xlsx_path), "size": st.st_size, "mtime": st.st_mtime}
+
+
+def journal_name(xlsx_path):
+    """工作簿对应的日志文件名（按绝对路径区分）"""
+    key = hashlib.sha1(os.path.normcase(os.path.abspath(xlsx_path)).encode("utf-8")).hexdigest()[:12]
+    return "{}_{}.jsonl".format(JOURNAL_PREFIX, key)
+
+
+def _file_sha1(path, chunk=1024 * 1024):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        while True:
+            buf = f.read(chunk)
+            if not buf:
+                break
+            h.update(buf)
+    return h.hexdigest()
+
+
+class Journal(object):
+    """
+    dir_path: 输出目录；xlsx_path: 工作簿（身份不同则旧记录作废，重新开始）
+    打开时就清理上次中途崩溃留下的文件，须在分配任何文件名之前创建
+    """
+
+    def __init__(self, dir_path, xlsx_path, name=None, sync_every=SYNC_EVERY, sync_interval=SYNC_INTERVAL):
+        self.dir_path = dir_path
+        self.path = os.path.join(dir_path, name or journal_name(xlsx_path))
+        self.sync_every = max(1, int(sync_every))
+        self.sync_interval = float(sync_interval)
+        self.done = {}
+        self.started = {}
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+        book = _book_identity(xlsx_path)
+        fresh = not self._load(book)
+        if fresh:
+            self.done = {}
+            self.started = {}
+        self.resumed = len(self.done)
+        # 被清理的文件路径：调用方的文件名分配器若已扫描过目录，需要把这些名字释放出来
+        self.cleaned = self._clean_started()
+
+        self.fp = open(self.path, "w" if fresh else "a", encoding="utf-8")
+        if fresh:
+            self._append(dict(book, op="book"))
+
+    # ---------- 载入 ----------
+    def _load(self, book):
+        """旧日志可用返回 True；不存在 / 工作簿已变化返回 False"""
+        if not os.path.isfile(self.path):
+            return False
+        with open(self.path, "r", encoding="utf-8") as f:
+            for i, line in enumerate(f):
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # 崩溃时写了一半的最后一行
+                op = rec.get("op")
+                if i == 0:
+                    if op != "book" or any(rec.get(k) != book[k] for k in ("path", "size", "mtime")):
+                        return False
+                    continue
+                key = (rec.get("sheet"), rec.get("row"), rec.get("k"))
+                if op == "start":
+                    self.started[key] = rec.get("path")
+                elif op == "done":
+                    self.started.pop(key, None)
+                    self.done[key] = rec
+                elif op == "abort":
+                    self.started.pop(key, None)
+        return True
+
+    def _clean_started(self):
+        out = []
+        completed = set(rec.get("path") for rec in self.done.values())
+        for name in self.started.values():
+            if not name or name in completed:
+                continue
+            p = os.path.join(self.dir_path, name)
+            try:
+                os.remove(p)
+                out.append(p)
+            except OSError:
+                pass
+        self.started = {}
+        return out
+
+    # ---------- 查询 / 记录 ----------
+    def is_done(self, sheet, row, k=1):
+        rec = self.done.get((sheet, int(row), int(k)))
+        if rec is None:
+            return False
+        name = rec.get("path")
+        return name is None or os.path.exists(os.path.join(self.dir_path, name))
+
+    def start(self, sheet, row, k, path):
+        self._append({"op": "start", "sheet": sheet, "row": int(row), "k": int(k),
+                      "path": os.path.basename(path)})
+
+    def abort(self, sheet, row, k, path):
+        """start 之后导出失败：调用方会释放该文件名，续跑时不再当作半截文件清理"""
+        self._append({"op": "abort", "sheet": sheet, "row": int(row), "k": int(k),
+                      "path": os.path.basename(path)})
+
+    def finish(self, sheet, row, k, path=None):
+        """path=None：该格确认没有图片，续跑时同样跳过"""
+        rec = {"op": "done", "sheet": sheet, "row": int(row), "k": int(k), "path": None, "sha1": None}
+        if path:
+            rec["path"] = os.path.basename(path)
+            try:
+                rec["sha1"] = _file_sha1(path)
+            except OSError:
+                pass
+        self.done[(sheet, int(row), int(k))] = rec
+        self._append(rec)
+
+    def _append(self, rec):
+        self.fp.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self.fp.flush()
+        self.unsynced += 1
+        now = time.monotonic()
+        if self.unsynced >= self.sync_every or now - self.last_sync >= self.sync_interval:
+            self.sync(now)
+
+    def sync(self, now=None):
+        if self.unsynced:
+            try:
+                os.fsync(self.fp.fileno())
+            except OSError:
+                pass
+            self.unsynced = 0
+        self.last_sync = now if now is not None else time.monotonic()
+
+    def close(self):
+        if self.fp is None:
+            return
+        try:
+            self.fp.flush()
+            self.sync()
+        finally:
+            self.fp.close()
+            self.fp = None
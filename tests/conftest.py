@@ -0,0 +1,54 @@
+# =========================
+# 测试公共部分：仓库根目录加入 sys.path（模块是平铺的 Xbot 模块，不是安装包）
+# 测试用工作簿 / 假 Excel 都来自 bench.py（make_workbook / make_fake_excel），不需要 Excel / xbot
+# =========================
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import bench  # noqa: E402
+import excel_com  # noqa: E402
+import export  # noqa: E402
+
+
+def run_quiet(fn, *args, **kwargs):
+    return bench._run_quiet(fn, *args, **kwargs)
+
+
+@pytest.fixture
+def out_dir(tmp_path):
+    d = tmp_path / "out"
+    d.mkdir()
+    return str(d)
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    """workbook(name="book.xlsx", **make_workbook 参数) -> 路径"""
+    def make(name="book.xlsx", **kwargs):
+        path = str(tmp_path / name)
+        bench.make_workbook(path, **kwargs)
+        return path
+    return make
+
+
+@pytest.fixture
+def fake_excel():
+    """fake_excel(rows, ...) -> FakeExcel，并注册为 excel_com 的 Excel / 剪贴板；测试结束后还原"""
+    def make(rows, *args, **kwargs):
+        app = bench.make_fake_excel(rows, *args, **kwargs)
+        excel_com.set_excel_factory(lambda: app)
+        excel_com.set_clipboard(app.clipboard)
+        return app
+    yield make
+    excel_com.set_excel_factory(None)
+    excel_com.set_clipboard(None)
+
+
+def files_in(path):
+    return sorted(f for f in os.listdir(path) if not f.endswith(".json") and not f.endswith(".jsonl"))
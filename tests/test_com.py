@@ -0,0 +1,69 @@
+# =========================
+# COM 引擎（bench.py 的假 Excel，Linux 可跑）：往返次数、重叠判定、auto 规划、export1 包装
+# =========================
+import bench
+import excel_com
+import export
+import export1
+from conftest import files_in, run_quiet
+
+# 基线 export.py（逐行 Cells().Value、TopLeftCell.Row / Column）同一场景为 16.07 次 / 行
+BASELINE_ROUND_TRIPS_PER_ROW = 16.07
+
+
+def test_round_trips_per_row_not_above_baseline(workbook, out_dir, fake_excel):
+    rows = 200
+    app = fake_excel(rows)
+    counter = app.calls  # 只取一次：经假对象取属性本身也计入往返
+    run_quiet(export.export_images_by_row, workbook(rows=1), out_dir, sheetName="Sheet2", nameCol="B", imgCol="A",
+              engine="com")
+    assert len(files_in(out_dir)) == rows
+    assert counter.total / float(rows) <= BASELINE_ROUND_TRIPS_PER_ROW
+    by_name = dict(counter.top(100))
+    # 图片都在一个单元格内：不读 Top / Left / 行高；Paste 之后不轮询 Chart.Shapes.Count
+    assert "Top" not in by_name and "Left" not in by_name
+    assert by_name.get("Count", 0) <= 2
+    assert "ChartArea" not in by_name
+
+
+def test_overlap_picks_row_with_most_area(workbook, out_dir):
+    # 第 1 行底部 2 pt 起、高 12 pt 的图片：左上角在第 1 行，大部分面积在第 2 行
+    values = {(r, 2): "name{}".format(r) for r in range(1, 4)}
+    sheet = bench.FakeSheet("Sheet2", values, shapes=[(13, 13.0, 1.0, 10.0, 12.0)])
+    app = bench.FakeExcel([sheet])
+    excel_com.set_excel_factory(lambda: app)
+    excel_com.set_clipboard(app.clipboard)
+    try:
+        run_quiet(export.export_images_by_row, workbook(rows=1), out_dir, sheetName="Sheet2", nameCol="B",
+                  imgCol="A", engine="com", cell_fallback="off")
+    finally:
+        excel_com.set_excel_factory(None)
+        excel_com.set_clipboard(None)
+    assert files_in(out_dir) == ["name2_1.png"]
+
+
+def test_best_index_uses_boundaries_only():
+    tops = {1: 0.0, 2: 15.0, 3: 30.0, 4: 45.0}
+    reads = []
+
+    def start_of(i):
+        reads.append(i)
+        return tops[i]
+
+    assert excel_com.best_index(1, 3, 13.0, 40.0, start_of) == 2
+    assert sorted(reads) == [2, 3]
+    assert excel_com.best_index(1, 2, 5.0, 20.0, start_of) == 1  # 10 vs 5
+    assert excel_com.best_index(1, 2, 10.0, 20.0, start_of) == 1  # 并列取较小者
+
+
+def test_auto_incremental_unchanged_does_not_start_excel():
+    res = bench.check_auto_incremental()
+    assert res["ok"], res
+
+
+def test_export1_main_uses_module_clip_timeout(monkeypatch):
+    seen = {}
+    monkeypatch.setattr(export, "export_images_by_row", lambda *a, **kw: seen.update(kw) or True)
+    assert export1.main({"xlsx_path": "x.xlsx", "imgSavePath": "."}) is True
+    assert seen["clip_timeout"] == excel_com.CLIP_TIMEOUT
+    assert seen["naming"] == "merged" and seen["engine"] == "com"
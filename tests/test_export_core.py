@@ -0,0 +1,105 @@
+# =========================
+# export_core：NameRegistry 命名分配（同名后缀 / 占位清理 / 续跑接管）、MergeIndex
+# =========================
+import os
+import threading
+
+import export_core
+import xlsx_native
+
+
+def test_registry_suffixes_follow_existing_files(tmp_path):
+    (tmp_path / "a.png").write_bytes(b"x")
+    (tmp_path / "a_2.png").write_bytes(b"x")
+    reg = export_core.NameRegistry(str(tmp_path))
+    names = [os.path.basename(reg.allocate("a.png")) for _ in range(3)]
+    assert names == ["a_3.png", "a_4.png", "a_5.png"]
+    assert os.path.basename(reg.allocate("b.png")) == "b.png"
+
+
+def test_registry_same_name_twice(tmp_path):
+    reg = export_core.NameRegistry(str(tmp_path))
+    first = reg.allocate("Name.png")
+    second = reg.allocate("Name.png")
+    assert first != second and os.path.basename(second) == "Name_2.png"
+
+
+def test_registry_threads_never_share_a_name(tmp_path):
+    reg = export_core.NameRegistry(str(tmp_path))
+    got = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(50):
+            p = reg.allocate("x.png")
+            with lock:
+                got.append(p)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(got)) == 200
+
+
+def test_registry_release_returns_name(tmp_path):
+    reg = export_core.NameRegistry(str(tmp_path))
+    p = reg.allocate("a.png")
+    reg.release(p)
+    assert not os.path.exists(p)
+    assert reg.allocate("a.png") == p
+
+
+def test_registry_release_keeps_written_file(tmp_path):
+    reg = export_core.NameRegistry(str(tmp_path))
+    p = reg.allocate("a.png")
+    with open(p, "wb") as f:
+        f.write(b"data")
+    reg.release(p, forget=False)
+    assert os.path.exists(p)
+
+
+def test_registry_cleanup_removes_only_unfilled_placeholders(tmp_path):
+    reg = export_core.NameRegistry(str(tmp_path))
+    filled = reg.allocate("a.png")
+    with open(filled, "wb") as f:
+        f.write(b"data")
+    empty = reg.allocate("b.png")
+    reg.cleanup()
+    assert os.path.exists(filled)
+    assert not os.path.exists(empty)
+
+
+def test_registry_leftover_placeholders_advance_suffix_without_reclaim(tmp_path):
+    (tmp_path / "a.png").write_bytes(b"")
+    reg = export_core.NameRegistry(str(tmp_path))
+    assert os.path.basename(reg.allocate("a.png")) == "a_2.png"
+
+
+def test_registry_reclaims_empty_leftovers_on_resume(tmp_path):
+    (tmp_path / "a.png").write_bytes(b"")
+    (tmp_path / "b.png").write_bytes(b"real")
+    reg = export_core.NameRegistry(str(tmp_path), reclaim_empty=True)
+    assert os.path.basename(reg.allocate("a.png")) == "a.png"
+    assert os.path.basename(reg.allocate("a.png")) == "a_2.png"
+    assert os.path.basename(reg.allocate("b.png")) == "b_2.png"
+
+
+def test_registry_in_memory(tmp_path):
+    reg = export_core.NameRegistry(None)
+    assert [reg.allocate("a.png") for _ in range(3)] == ["a.png", "a_2.png", "a_3.png"]
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_merge_index_top_left():
+    idx = xlsx_native.MergeIndex([(2, 1, 4, 1), (6, 1, 6, 3), (10, 2, 12, 2)])
+    assert len(idx) == 3
+    assert idx.top_left(2, 1) == (2, 1)
+    assert idx.top_left(4, 1) == (2, 1)
+    assert idx.top_left(5, 1) is None
+    assert idx.top_left(6, 3) == (6, 1)
+    assert idx.top_left(6, 4) is None
+    assert idx.top_left(11, 2) == (10, 2)
+    assert idx.top_left(11, 1) is None
+    assert idx.top_left(1, 1) is None
@@ -0,0 +1,109 @@
+# =========================
+# journal：断点续跑日志（续跑跳过 / 崩溃清理 / abort 后文件名复用 / 工作簿变化作废）
+# =========================
+import json
+import os
+
+import journal
+
+
+def _touch(path, data=b"png"):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def test_resume_skips_done_entries(tmp_path, workbook):
+    xlsx = workbook(rows=3)
+    out = str(tmp_path)
+    jr = journal.Journal(out, xlsx)
+    p = os.path.join(out, "a_1.png")
+    jr.start("Sheet2", 1, 1, p)
+    _touch(p)
+    jr.finish("Sheet2", 1, 1, p)
+    jr.finish("Sheet2", 2, 1)  # 确认没有图片
+    jr.close()
+
+    jr = journal.Journal(out, xlsx)
+    assert jr.resumed == 2
+    assert jr.is_done("Sheet2", 1, 1)
+    assert jr.is_done("Sheet2", 2, 1)
+    assert not jr.is_done("Sheet2", 3, 1)
+    jr.close()
+
+
+def test_done_entry_with_missing_file_is_redone(tmp_path, workbook):
+    xlsx = workbook(rows=1)
+    out = str(tmp_path)
+    jr = journal.Journal(out, xlsx)
+    p = os.path.join(out, "a_1.png")
+    _touch(p)
+    jr.finish("Sheet2", 1, 1, p)
+    jr.close()
+    os.remove(p)
+    jr = journal.Journal(out, xlsx)
+    assert not jr.is_done("Sheet2", 1, 1)
+    jr.close()
+
+
+def test_crash_leftovers_are_cleaned(tmp_path, workbook):
+    xlsx = workbook(rows=1)
+    out = str(tmp_path)
+    jr = journal.Journal(out, xlsx)
+    p = os.path.join(out, "a_1.png")
+    jr.start("Sheet2", 1, 1, p)
+    _touch(p, b"half")
+    jr.fp.close()  # 模拟崩溃：没有 done / abort
+
+    jr = journal.Journal(out, xlsx)
+    assert jr.cleaned == [p]
+    assert not os.path.exists(p)
+    jr.close()
+
+
+def test_abort_then_reuse_keeps_the_completed_file(tmp_path, workbook):
+    xlsx = workbook(rows=2)
+    out = str(tmp_path)
+    jr = journal.Journal(out, xlsx)
+    p = os.path.join(out, "a_1.png")
+    jr.start("Sheet2", 1, 1, p)
+    jr.abort("Sheet2", 1, 1, p)  # 失败，文件名释放
+    jr.start("Sheet2", 2, 1, p)  # 同名分配给下一张
+    _touch(p)
+    jr.finish("Sheet2", 2, 1, p)
+    jr.close()
+
+    jr = journal.Journal(out, xlsx)
+    assert jr.cleaned == []
+    assert os.path.exists(p)
+    assert jr.is_done("Sheet2", 2, 1) and not jr.is_done("Sheet2", 1, 1)
+    jr.close()
+
+
+def test_changed_workbook_starts_fresh(tmp_path, workbook):
+    xlsx = workbook(rows=1)
+    out = str(tmp_path)
+    jr = journal.Journal(out, xlsx)
+    jr.finish("Sheet2", 1, 1)
+    jr.close()
+    st = os.stat(xlsx)
+    os.utime(xlsx, (st.st_atime, st.st_mtime + 10))
+    jr = journal.Journal(out, xlsx)
+    assert jr.resumed == 0 and not jr.is_done("Sheet2", 1, 1)
+    jr.close()
+    with open(jr.path, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert [rec["op"] for rec in lines] == ["book"]
+
+
+def test_two_workbooks_keep_separate_journals(tmp_path, workbook):
+    a, b = workbook("a.xlsx", rows=1), workbook("b.xlsx", rows=1)
+    out = str(tmp_path)
+    assert journal.journal_name(a) != journal.journal_name(b)
+    ja = journal.Journal(out, a)
+    ja.finish("Sheet2", 1, 1)
+    ja.close()
+    jb = journal.Journal(out, b)
+    jb.close()
+    ja = journal.Journal(out, a)
+    assert ja.is_done("Sheet2", 1, 1)
+    ja.close()
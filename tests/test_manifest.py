@@ -0,0 +1,134 @@
+# =========================
+# 增量清单 export_manifest.json：整本跳过 / 逐行重写 / 合并 / 清理 / COM 补齐的行
+# =========================
+import json
+import os
+import time
+import zipfile
+
+import export
+from conftest import files_in, run_quiet
+
+
+def _manifest(out_dir):
+    with open(os.path.join(out_dir, export.EXPORT_MANIFEST), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _bump_mtime(path, seconds=5):
+    t = time.time() + seconds
+    os.utime(path, (t, t))
+
+
+def _drop_media(path, index, comment=b""):
+    """删除第 index 个 xl/media 部件（原生解析不出字节，auto 交给 COM），可顺带改注释让工作簿内容变化"""
+    with zipfile.ZipFile(path) as z:
+        items = [(i, z.read(i.filename)) for i in z.infolist()]
+    media = sorted(i.filename for i, _ in items if i.filename.startswith("xl/media/"))
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        for info, data in items:
+            if info.filename != media[index]:
+                z.writestr(info, data)
+        z.comment = comment
+
+
+def test_unchanged_workbook_is_skipped(workbook, out_dir):
+    xlsx = workbook(rows=5)
+    run_quiet(export.export_images_by_row, xlsx, out_dir, engine="native", incremental=1)
+    first = files_in(out_dir)
+    rep = run_quiet(export.export_images_by_row, xlsx, out_dir, engine="native", incremental=1, return_result=1)
+    assert files_in(out_dir) == first
+    assert rep["images"].get("native", 0) == 0
+    assert rep["rows"]["skipped"] == 5
+
+
+def test_changed_workbook_rewrites_under_the_same_names(workbook, out_dir):
+    xlsx = workbook(rows=5)
+    run_quiet(export.export_images_by_row, xlsx, out_dir, engine="native", incremental=1)
+    first = files_in(out_dir)
+    workbook(rows=5, seed=7)  # 同一路径，图片内容全部变化
+    _bump_mtime(xlsx)
+    run_quiet(export.export_images_by_row, xlsx, out_dir, engine="native", incremental=1)
+    assert files_in(out_dir) == first
+
+
+def test_sheet_name_with_pipe(workbook, out_dir):
+    xlsx = workbook(rows=3, sheet_name="a|b")
+    for _ in range(2):
+        run_quiet(export.export_images_by_row, xlsx, out_dir, sheetName="a|b", engine="native", incremental=1)
+    assert files_in(out_dir) == ["item1_1.png", "item2_1.jpg", "item3_1.png"]
+    (entry,) = _manifest(out_dir)["workbooks"].values()
+    assert entry["path"] == os.path.abspath(xlsx) and entry["sheet"] == "a|b"
+    assert len(entry["rows"]) == 3
+
+
+def test_save_merges_entries_written_by_other_processes(workbook, out_dir):
+    a, b = workbook("a.xlsx", rows=2), workbook("b.xlsx", rows=2)
+    run_quiet(export.export_images_by_row, a, out_dir, engine="native", incremental=1)
+    run_quiet(export.export_images_by_row, b, out_dir, engine="native", incremental=1)
+    keys = sorted(_manifest(out_dir)["workbooks"])
+    assert keys == sorted(export._manifest_key(p, "Sheet2") for p in (a, b))
+
+
+def test_prune_drops_missing_workbooks_and_files(workbook, out_dir):
+    a, b = workbook("a.xlsx", rows=2), workbook("b.xlsx", rows=2)
+    run_quiet(export.export_images_by_row, a, out_dir, engine="native", incremental=1)
+    run_quiet(export.export_images_by_row, b, out_dir, engine="native", incremental=1)
+    os.remove(a)
+    entry_b = _manifest(out_dir)["workbooks"][export._manifest_key(b, "Sheet2")]
+    gone = entry_b["rows"]["1"]["files"][0]
+    os.remove(os.path.join(out_dir, gone))
+
+    export._prune_manifest_file(out_dir)
+    wbs = _manifest(out_dir)["workbooks"]
+    assert list(wbs) == [export._manifest_key(b, "Sheet2")]
+    entry_b = wbs[export._manifest_key(b, "Sheet2")]
+    assert list(entry_b["rows"]) == ["2"]
+    assert entry_b["sha1"] is None  # 缺文件的工作簿下次不整本跳过
+
+    # 下次运行按原名补回缺的行
+    before = len(files_in(out_dir))
+    run_quiet(export.export_images_by_row, b, out_dir, engine="native", incremental=1)
+    assert len(_manifest(out_dir)["workbooks"][export._manifest_key(b, "Sheet2")]["rows"]) == 2
+    assert os.path.exists(os.path.join(out_dir, gone))
+    assert len(files_in(out_dir)) == before + 1
+
+
+def test_batch_prunes_once_per_directory(workbook, out_dir, monkeypatch):
+    paths = [workbook("b{}.xlsx".format(i), rows=2, seed=i) for i in range(4)]
+    opts = dict(imgSavePath=out_dir, processes=1, per_file_dir=0, engine="native", incremental=1)
+    run_quiet(export.export_batch, paths, **opts)
+    calls = []
+    real = export._prune_manifest
+    monkeypatch.setattr(export, "_prune_manifest", lambda *a: calls.append(1) or real(*a))
+    run_quiet(export.export_batch, paths, **opts)
+    assert len(calls) == 1
+    assert len(_manifest(out_dir)["workbooks"]) == 4
+
+
+def test_save_does_not_prune(workbook, out_dir, monkeypatch):
+    xlsx = workbook(rows=2)
+    run_quiet(export.export_images_by_row, xlsx, out_dir, engine="native", incremental=1)
+    calls = []
+    monkeypatch.setattr(export, "_prune_manifest", lambda *a: calls.append(1) or False)
+    export._save_manifest(out_dir, "x|Sheet2", {"rows": {}})
+    assert calls == []
+
+
+def test_auto_records_com_rows_and_rewrites_them_cleanly(workbook, out_dir, fake_excel):
+    """auto + incremental：COM 补齐的行也记入清单，工作簿变化后不会产生 name10_1_2.png"""
+    xlsx = workbook(rows=20)
+    _drop_media(xlsx, 1, b"v1")
+    fake_excel(20)
+    call = dict(sheetName="Sheet2", nameCol="B", imgCol="A", engine="auto", incremental=1)
+    run_quiet(export.export_images_by_row, xlsx, out_dir, **call)
+    first = files_in(out_dir)
+    com_rows = [info for info in _manifest(out_dir)["workbooks"][export._manifest_key(xlsx, "Sheet2")]["rows"].values()
+                if info["media"] == ["com"]]
+    assert len(com_rows) == 1 and com_rows[0]["files"]
+
+    workbook(rows=20)
+    _drop_media(xlsx, 1, b"v2")
+    _bump_mtime(xlsx)
+    run_quiet(export.export_images_by_row, xlsx, out_dir, **call)
+    assert files_in(out_dir) == first
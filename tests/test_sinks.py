@@ -0,0 +1,132 @@
+# =========================
+# 输出端：zip / tar / 归档内前缀、归档与增量 / 续跑、去重源写出失败、占位清理、export_batch 输入校验
+# =========================
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+import export
+from conftest import files_in, run_quiet
+
+
+def test_zip_sink_matches_dir_names(workbook, out_dir, tmp_path):
+    xlsx = workbook(rows=6, dup_ratio=0.5, seed=2)
+    run_quiet(export.export_images_by_row, xlsx, out_dir, engine="native")
+    arc = str(tmp_path / "out.zip")
+    run_quiet(export.export_images_by_row, xlsx, out_dir, engine="native", sink="zip", sink_path=arc)
+    with zipfile.ZipFile(arc) as z:
+        assert sorted(z.namelist()) == files_in(out_dir)
+        for name in z.namelist():
+            with open(os.path.join(out_dir, name), "rb") as f:
+                assert z.read(name) == f.read()  # zip 不能链接：重复图片写副本
+
+
+def test_tar_sink_links_duplicates(workbook, tmp_path):
+    xlsx = workbook(rows=6, dup_ratio=0.9, seed=2)
+    arc = str(tmp_path / "out.tar")
+    run_quiet(export.export_images_by_row, xlsx, str(tmp_path), engine="native", sink="tar", sink_path=arc)
+    with tarfile.open(arc) as t:
+        members = t.getmembers()
+        assert len(members) == 6
+        links = [m for m in members if m.islnk()]
+        assert links
+        names = set(m.name for m in members)
+        assert all(m.linkname in names for m in links)
+        assert all(t.extractfile(m).read() for m in members if m.isfile())
+
+
+def test_prefix_sink_allocates_within_prefix(tmp_path):
+    arc = str(tmp_path / "x.zip")
+    sink = export._ZipSink(arc)
+    s1, s2 = sink.sub("s1"), sink.sub("s2")
+    keys = [s1.allocate("a.png"), s1.allocate("a.png"), s2.allocate("a.png"), s1.sub("d").allocate("a.png")]
+    assert keys == ["s1/a.png", "s1/a_2.png", "s2/a.png", "s1/d/a.png"]
+    for k in keys:
+        (s1 if k.startswith("s1/") else s2).write(k, b"data")
+    s1.write_meta("m.json", b"{}")
+    sink.close()
+    with zipfile.ZipFile(arc) as z:
+        assert sorted(z.namelist()) == sorted(keys + ["s1/m.json"])
+
+
+@pytest.mark.parametrize("kind", ["zip", "tar"])
+def test_archive_rerun_with_incremental_is_complete(workbook, tmp_path, kind):
+    """归档每次重新写出：incremental / resume 不得跳过行，否则新归档缺图"""
+    xlsx = workbook(rows=4)
+    out = str(tmp_path)
+    arc = os.path.join(out, "book.{}".format(kind))
+    for _ in range(2):
+        run_quiet(export.export_images_by_row, xlsx, out, engine="native", sink=kind, incremental=1, resume=1)
+        if kind == "zip":
+            with zipfile.ZipFile(arc) as z:
+                assert len(z.namelist()) == 4
+        else:
+            with tarfile.open(arc) as t:
+                assert len(t.getnames()) == 4
+    assert not os.path.exists(os.path.join(out, export.EXPORT_MANIFEST))
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+@pytest.mark.parametrize("mode", ["hardlink", "manifest"])
+def test_failed_dedup_source_does_not_break_duplicates(workbook, out_dir, monkeypatch, workers, mode):
+    xlsx = workbook(rows=30, dup_ratio=0.9, seed=3)
+    real = export._DirSink.write
+    state = {"n": 0}
+
+    def write(self, key, payload):
+        state["n"] += 1
+        if state["n"] == 1:
+            raise IOError("disk full")
+        return real(self, key, payload)
+
+    monkeypatch.setattr(export._DirSink, "write", write)
+    rep = run_quiet(export.export_images_by_row, xlsx, out_dir, engine="native", dedup=mode, workers=workers,
+                    return_result=1)
+    assert rep["images"]["native"] == 29
+    assert all(os.path.getsize(os.path.join(out_dir, f)) > 0 for f in files_in(out_dir))
+    if mode == "manifest":
+        import json
+        with open(os.path.join(out_dir, export.DEDUP_MANIFEST), encoding="utf-8") as f:
+            entries = json.load(f)
+        assert all(os.path.exists(os.path.join(out_dir, e["same_as"])) for e in entries)
+
+
+def test_link_keeps_placeholder_when_source_missing(tmp_path):
+    sink = export._DirSink(str(tmp_path))
+    key = sink.allocate("a.png")
+    assert sink.link(str(tmp_path / "missing.png"), key) is False
+    assert os.path.exists(key)
+
+
+def test_aborted_run_leaves_no_placeholders(workbook, out_dir, monkeypatch):
+    xlsx = workbook(rows=6)
+    real = export._DirSink.write
+    state = {"n": 0}
+
+    def write(self, key, payload):
+        state["n"] += 1
+        if state["n"] == 3:
+            raise KeyboardInterrupt
+        return real(self, key, payload)
+
+    monkeypatch.setattr(export._DirSink, "write", write)
+    with pytest.raises(KeyboardInterrupt):
+        run_quiet(export.export_images_by_row, xlsx, out_dir, engine="native", dedup="off")
+    assert files_in(out_dir) == ["item1_1.png", "item2_1.jpg"]
+
+
+def test_resume_reclaims_leftover_placeholders(workbook, out_dir):
+    xlsx = workbook(rows=3)
+    for name in ("item2_1.jpg", "item3_1.png"):
+        open(os.path.join(out_dir, name), "wb").close()
+    run_quiet(export.export_images_by_row, xlsx, out_dir, engine="native", resume=1)
+    assert files_in(out_dir) == ["item1_1.png", "item2_1.jpg", "item3_1.png"]
+
+
+def test_batch_does_not_create_dirs_for_missing_inputs(tmp_path):
+    res = run_quiet(export.export_batch, [str(tmp_path / "nope.xlsx")], imgSavePath=str(tmp_path / "out"),
+                    processes=1)
+    assert res[0]["ok"] is False
+    assert not os.path.exists(str(tmp_path / "out" / "nope"))
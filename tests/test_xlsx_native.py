@@ -0,0 +1,162 @@
+# =========================
+# xlsx_native：单元格图片（Excel rich value / WPS DISPIMG）、合并区域、流式行高 vs 全量行高
+# =========================
+import io
+import random
+import re
+import zipfile
+
+import pytest
+
+import export
+import xlsx_native
+from conftest import files_in, run_quiet
+
+SHEET = "xl/worksheets/sheet1.xml"
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+
+
+def _rewrite(path, edits):
+    """edits: {部件名: fn(text) -> text}，原地改写 zip 里的部件"""
+    with zipfile.ZipFile(path) as z:
+        items = [(i, z.read(i.filename)) for i in z.infolist()]
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        for info, data in items:
+            fn = edits.get(info.filename)
+            if fn is not None:
+                data = fn(data.decode("utf-8")).encode("utf-8")
+            z.writestr(info, data)
+
+
+@pytest.mark.parametrize("anchor", ["cell", "wps"])
+def test_cell_images_are_resolved(workbook, anchor):
+    xlsx = workbook(rows=6, images_per_row=1, anchor=anchor)
+    with xlsx_native.open_xlsx(xlsx) as zf:
+        part = xlsx_native.resolve_sheet_part(zf, "Sheet2")
+        vm = xlsx_native.load_richvalue_index(zf)
+        wps = xlsx_native.load_wps_cellimage_index(zf)
+        assert bool(vm) == (anchor == "cell")
+        assert bool(wps) == (anchor == "wps")
+        got = list(xlsx_native.iter_cell_images(zf, part, vm, wps))
+    assert [r for r, _, _ in got] == list(range(1, 7))
+    assert all(media.startswith("xl/media/") for _, _, media in got)
+    assert len(set(media for _, _, media in got)) == 6
+
+
+@pytest.mark.parametrize("anchor", ["cell", "wps"])
+def test_native_export_of_cell_images(workbook, out_dir, anchor):
+    xlsx = workbook(rows=4, images_per_row=2, anchor=anchor)
+    run_quiet(export.export_images_by_row, xlsx, out_dir, engine="native")
+    stems = [f.rsplit(".", 1)[0] for f in files_in(out_dir)]
+    assert stems == sorted("item{}_{}".format(r, k) for r in range(1, 5) for k in (1, 2))
+
+
+def test_unresolved_cell_image_goes_to_inventory(workbook):
+    xlsx = workbook(rows=3, anchor="wps")
+    _rewrite(xlsx, {SHEET: lambda t: t.replace('DISPIMG("ID_2",1)', 'DISPIMG("ID_404",1)')})
+    inv = xlsx_native.new_inventory([2])
+    with xlsx_native.open_xlsx(xlsx) as zf:
+        part = xlsx_native.resolve_sheet_part(zf, "Sheet2")
+        got = list(xlsx_native.iter_cell_images(zf, part, None, xlsx_native.load_wps_cellimage_index(zf), inv))
+    assert [r for r, _, _ in got] == [1, 3]
+    assert [u[:2] for u in inv["unresolved"]] == [(2, 2)]
+    assert inv["last_row"][2] == 3
+
+
+def test_merge_index_and_merged_names(workbook):
+    xlsx = workbook(rows=7, layout="merged", merge_span=3)
+    with xlsx_native.open_xlsx(xlsx) as zf:
+        part = xlsx_native.resolve_sheet_part(zf, "Sheet2")
+        idx = xlsx_native.read_merge_index(zf, part)
+        assert len(idx) == 2  # A1:A3, A4:A6；A7 单独一格
+        assert idx.top_left(3, 1) == (1, 1)
+        assert idx.top_left(5, 1) == (4, 1)
+        assert idx.top_left(7, 1) is None
+        values = xlsx_native.read_merged_column_values(zf, part, 1, range(1, 8), merges=idx)
+    assert [values.get(r) for r in range(1, 8)] == ["group1"] * 3 + ["group2"] * 3 + ["group3"]
+
+
+# =========================
+# 流式行高（max_row / spans 提前停止）必须与整表行高得到同样的分配
+# =========================
+def _sheet_zip(rows_xml):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        z.writestr(SHEET, '<worksheet xmlns="{}"><sheetFormatPr defaultRowHeight="15"/><sheetData>{}'
+                          '</sheetData></worksheet>'.format(MAIN_NS, rows_xml))
+    return zipfile.ZipFile(buf)
+
+
+def _random_rows(rnd, n=120):
+    out = []
+    for r in range(1, n):
+        x = rnd.random()
+        if x < 0.15:
+            out.append('<row r="{}" hidden="1"/>'.format(r))
+        elif x < 0.8:
+            out.append('<row r="{}" ht="{}" customHeight="1"/>'.format(r, rnd.choice([0, 3, 5, 15, 40])))
+    return "".join(out)
+
+
+def _assign_full(zf, items):
+    full = xlsx_native.read_sheet_geometry(zf, SHEET)
+    ext = [full.extent(it["from"], it.get("to"), it.get("ext")) for it in items]
+    return [r for r, _ in full.assign(ext)]
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_streamed_geometry_matches_full_two_cell(seed):
+    rnd = random.Random(seed)
+    zf = _sheet_zip(_random_rows(rnd))
+    items = []
+    for _ in range(6):
+        fr = rnd.randint(0, 60)
+        items.append({"from": {"row": fr, "col": 0, "rowOff": rnd.randint(0, 3000000), "colOff": 0},
+                      "to": {"row": fr + rnd.randint(0, 3), "col": 1, "rowOff": rnd.randint(0, 9000000),
+                             "colOff": 0},
+                      "ext": None})
+    got = [it["row"] for it in xlsx_native.assign_drawing_cells(zf, SHEET, [dict(it) for it in items])]
+    assert got == _assign_full(zf, items)
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_streamed_geometry_matches_full_one_cell(seed):
+    rnd = random.Random(1000 + seed)
+    zf = _sheet_zip(_random_rows(rnd))
+    items = []
+    for _ in range(6):
+        items.append({"from": {"row": rnd.randint(0, 60), "col": 0, "rowOff": rnd.randint(0, 3000000), "colOff": 0},
+                      "to": None, "ext": {"cx": 600000, "cy": rnd.randint(1, 8000000)}})
+    got = [it["row"] for it in xlsx_native.assign_drawing_cells(zf, SHEET, [dict(it) for it in items])]
+    assert got == _assign_full(zf, items)
+
+
+def test_two_cell_offset_past_row_height_matches_openpyxl(workbook, tmp_path):
+    """
+    rowOff 大于所在行行高：最后一张图片（第 57 行）从 57 行内 2 pt 开始、到 58 行起点之后 13 pt 结束，
+    每行 3 pt 时跨过 57..62 行，重叠最多的是 58 行；原生（流式行高，读到图片下边为止）须与 openpyxl（整表）一致
+    """
+    xlsx = workbook(rows=57, anchor="twoCell")
+
+    def sheet(text):
+        for r in range(1, 58):
+            text = text.replace('<row r="{}">'.format(r), '<row r="{}" ht="3" customHeight="1">'.format(r), 1)
+        extra = "".join('<row r="{}" ht="3" customHeight="1"/>'.format(r) for r in range(58, 70))
+        return text.replace("</sheetData>", extra + "</sheetData>")
+
+    def drawing(text):
+        text = text.replace("<xdr:row>56</xdr:row><xdr:rowOff>0</xdr:rowOff></xdr:from>",
+                            "<xdr:row>56</xdr:row><xdr:rowOff>{}</xdr:rowOff></xdr:from>".format(2 * 12700))
+        return text.replace("<xdr:row>57</xdr:row><xdr:rowOff>0</xdr:rowOff></xdr:to>",
+                            "<xdr:row>57</xdr:row><xdr:rowOff>{}</xdr:rowOff></xdr:to>".format(13 * 12700))
+
+    _rewrite(xlsx, {SHEET: sheet, "xl/drawings/drawing1.xml": drawing})
+    names = {}
+    for engine in ("native", "openpyxl"):
+        d = tmp_path / engine
+        d.mkdir()
+        run_quiet(export.export_images_by_row, xlsx, str(d), engine=engine)
+        names[engine] = files_in(str(d))
+    assert names["native"] == names["openpyxl"]
+    assert not any(f.startswith("item57_") for f in names["native"])
+    assert len(names["native"]) == 57
@@ -0,0 +1,1146 @@
+# =========================
+# xlsx 原生解析：直接按 zip + XML 读取，不经过 openpyxl.load_workbook
+# - 只解析定位图片所需的部件：workbook -> sheet rels -> drawing -> drawing rels -> media
+# - XML 全部流式解析（iterparse），处理完的元素立即清理，内存与表格行数无关
+# - 本模块不依赖 xbot，可单独在 Linux / Windows 上使用
+# =========================
+
+import posixpath
+import re
+import zipfile
+from bisect import bisect_right
+from collections import defaultdict
+import xml.etree.ElementTree as ET
+
+
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+NS_XDR = "http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing"
+NS_A = "http://schemas.openxmlformats.org/drawingml/2006/main"
+
+REL_OFFICE_DOC = "/officeDocument"
+REL_DRAWING = "/drawing"
+REL_IMAGE = "/image"
+
+
+def _q(ns, tag):
+    return "{%s}%s" % (ns, tag)
+
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+# openpyxl 会丢弃无法保存的 WMF/EMF 图片，这里保持一致
+_SKIP_MEDIA_EXT = set([".wmf", ".emf"])
+
+
+# =========================
+# 基础：打开包 / 流式解析 / 关系文件
+# =========================
+def open_xlsx(xlsx_path):
+    return zipfile.ZipFile(xlsx_path, "r")
+
+
+def _has_part(zf, part):
+    try:
+        zf.getinfo(part)
+        return True
+    except KeyError:
+        return False
+
+
+def _stream(zf, part, tags):
+    """
+    流式产出 part 中标签属于 tags 的元素：(elem, parent)
+    tags 可写完整 "{ns}tag"，也可只写本地名（命名空间随版本变化的部件用）
+    调用方处理完后元素即被清理并从父节点摘除，整棵树不会在内存中累积
+    """
+    if isinstance(tags, str):
+        tags = (tags,)
+    tags = set(tags)
+    stack = []
+    with zf.open(part) as fp:
+        for ev, el in ET.iterparse(fp, events=("start", "end")):
+            if ev == "start":
+                stack.append(el)
+                continue
+            stack.pop()
+            if el.tag not in tags and _local(el.tag) not in tags:
+                continue
+            parent = stack[-1] if stack else None
+            yield el, parent
+            el.clear()
+            if parent is not None:
+                try:
+                    parent.remove(el)
+                except ValueError:
+                    pass
+
+
+def _rels_path(part):
+    d, f = posixpath.split(part)
+    return posixpath.join(d, "_rels", f + ".rels")
+
+
+def _resolve_target(part, target):
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(posixpath.dirname(part), target))
+
+
+def read_rels(zf, part):
+    """
+    读取 part 对应的 .rels：返回 {rId: (type, 绝对部件路径)}
+    外部链接（TargetMode=External）忽略
+    """
+    rels = {}
+    rp = _rels_path(part)
+    if not _has_part(zf, rp):
+        return rels
+    for el, _ in _stream(zf, rp, _q(NS_PKG_REL, "Relationship")):
+        if el.get("TargetMode") == "External":
+            continue
+        rid = el.get("Id")
+        target = el.get("Target") or ""
+        if rid and target:
+            rels[rid] = (el.get("Type") or "", _resolve_target(part, target))
+    return rels
+
+
+def _rel_of_type(rels, suffix):
+    for rid, (rtype, target) in rels.items():
+        if rtype.endswith(suffix):
+            return rid, target
+    return None, None
+
+
+def _cached(zf, key, build):
+    """
+    工作簿级索引按 zf 缓存（workbook rels / 工作表列表 / rich value / WPS 索引 / 共享字符串）
+    多个工作表共用同一个已打开的 zf 时只解析一次；缓存随 zf 一起释放
+    返回的索引为共享对象，调用方不要修改
+    """
+    cache = getattr(zf, "_xlsx_native_cache", None)
+    if cache is None:
+        cache = {}
+        zf._xlsx_native_cache = cache
+    if key not in cache:
+        cache[key] = build()
+    return cache[key]
+
+
+# =========================
+# 工作簿 -> 工作表部件
+# =========================
+def workbook_part(zf):
+    def build():
+        _, target = _rel_of_type(read_rels(zf, ""), REL_OFFICE_DOC)
+        return target or "xl/workbook.xml"
+    return _cached(zf, "workbook_part", build)
+
+
+def workbook_rels(zf):
+    return _cached(zf, "workbook_rels", lambda: read_rels(zf, workbook_part(zf)))
+
+
+def sheet_parts(zf):
+    """
+    返回 [(sheetName, sheetPart), ...]，顺序与工作簿中一致
+    """
+    def build():
+        wb_part = workbook_part(zf)
+        rels = workbook_rels(zf)
+        out = []
+        for el, _ in _stream(zf, wb_part, _q(NS_MAIN, "sheet")):
+            rid = el.get(_q(NS_REL, "id"))
+            if rid in rels:
+                out.append((el.get("name"), rels[rid][1]))
+        return out
+    return list(_cached(zf, "sheet_parts", build))
+
+
+def resolve_sheet_part(zf, sheet_name):
+    for name, part in sheet_parts(zf):
+        if name == sheet_name:
+            return part
+    return None
+
+
+# =========================
+# 单元格坐标
+# =========================
+_CELL_REF_RE = re.compile(r"^\$?([A-Za-z]{1,3})\$?(\d+)$")
+
+
+def col_to_index(col):
+    n = 0
+    for ch in str(col).strip().upper():
+        n = n * 26 + (ord(ch) - 64)
+    return n
+
+
+def split_cell_ref(ref):
+    """
+    'B12' -> (12, 2)；无法解析返回 (None, None)
+    """
+    m = _CELL_REF_RE.match(ref or "")
+    if not m:
+        return None, None
+    return int(m.group(2)), col_to_index(m.group(1))
+
+
+# =========================
+# Drawing 图片锚点（与 openpyxl 的 ws._images 同序同义）
+# =========================
+def _anchor_marker(anchor, tag):
+    m = anchor.find(_q(NS_XDR, tag))
+    if m is None:
+        return None
+    try:
+        return {
+            "col": int(m.findtext(_q(NS_XDR, "col"))),
+            "colOff": int(m.findtext(_q(NS_XDR, "colOff")) or 0),
+            "row": int(m.findtext(_q(NS_XDR, "row"))),
+            "rowOff": int(m.findtext(_q(NS_XDR, "rowOff")) or 0),
+        }
+    except (TypeError, ValueError):
+        return None
+
+
+def _anchor_pic(anchor):
+    pic = anchor.find(_q(NS_XDR, "pic"))
+    if pic is None:
+        grp = anchor.find(_q(NS_XDR, "grpSp"))
+        if grp is not None:
+            pic = grp.find(_q(NS_XDR, "pic"))
+    return pic
+
+
+def _anchor_blip_rid(anchor):
+    pic = _anchor_pic(anchor)
+    if pic is None:
+        return None
+    blip = pic.find("{}/{}".format(_q(NS_XDR, "blipFill"), _q(NS_A, "blip")))
+    if blip is None:
+        return None
+    return blip.get(_q(NS_REL, "embed"))
+
+
+# =========================
+# 覆盖清单（auto 模式的 COM 补齐规划用）
+# - unresolved: 原生解析看到了图片、却解析不出图片字节的位置 [(r0, r1, c0, c1, kind), ...]（1-based，含两端）
+#   kind: "drawing"（外链图片 / 缺失部件 / WMF/EMF）、"cell"（vm 对不上富值索引、DISPIMG 找不到 ID）
+# - last_row: cols 中各列最后一个非空单元格的行号
+# =========================
+def new_inventory(cols=()):
+    return {"cols": set(int(c) for c in cols), "last_row": {}, "unresolved": []}
+
+
+def _inventory_anchor(inventory, anchor, kind="drawing"):
+    if inventory is None or _anchor_pic(anchor) is None:
+        return
+    fr = _anchor_marker(anchor, "from")
+    if fr is None:
+        return
+    to = _anchor_marker(anchor, "to") or fr
+    inventory["unresolved"].append((fr["row"] + 1, max(fr["row"], to["row"]) + 1,
+                                    fr["col"] + 1, max(fr["col"], to["col"]) + 1, kind))
+
+
+def drawing_parts(zf, sheet_part):
+    rels = read_rels(zf, sheet_part)
+    return [target for rtype, target in rels.values() if rtype.endswith(REL_DRAWING)]
+
+
+def iter_drawing_images(zf, sheet_part, inventory=None):
+    """
+    流式遍历工作表的 drawing 图片，产出 dict：
+      row/col: 左上角锚点（1-based，与 _get_img_row_col_openpyxl 一致）
+      media:   xl/media/* 部件路径
+      anchor:  "oneCell" / "twoCell"
+      from/to: 原始锚点（0-based + EMU 偏移），oneCell 时 to 为 None
+      ext:     oneCell 的图片尺寸 {"cx", "cy"}（EMU），twoCell 为 None
+    顺序与 openpyxl 一致：每个 drawing 内先 oneCellAnchor 再 twoCellAnchor
+    inventory（new_inventory 的结果）：解析不出图片字节的图片锚点记入 inventory["unresolved"]
+    """
+    one_tag = _q(NS_XDR, "oneCellAnchor")
+    two_tag = _q(NS_XDR, "twoCellAnchor")
+
+    for dpart in drawing_parts(zf, sheet_part):
+        if not _has_part(zf, dpart):
+            continue
+        rels = read_rels(zf, dpart)
+        one_cell = []
+        two_cell = []
+        for anchor, _ in _stream(zf, dpart, (one_tag, two_tag)):
+            rid = _anchor_blip_rid(anchor)
+            if not rid or rid not in rels:
+                _inventory_anchor(inventory, anchor)
+                continue
+            rtype, media = rels[rid]
+            if not rtype.endswith(REL_IMAGE) or not _has_part(zf, media):
+                _inventory_anchor(inventory, anchor)
+                continue
+            if posixpath.splitext(media)[1].lower() in _SKIP_MEDIA_EXT:
+                _inventory_anchor(inventory, anchor)
+                continue
+            fr = _anchor_marker(anchor, "from")
+            if fr is None:
+                continue
+            item = {
+                "row": fr["row"] + 1,
+                "col": fr["col"] + 1,
+                "media": media,
+                "from": fr,
+                "to": None,
+                "ext": None,
+            }
+            if anchor.tag == one_tag:
+                item["anchor"] = "oneCell"
+                ext = anchor.find(_q(NS_XDR, "ext"))
+                if ext is not None:
+                    try:
+                        item["ext"] = {"cx": int(ext.get("cx")), "cy": int(ext.get("cy"))}
+                    except (TypeError, ValueError):
+                        pass
+                one_cell.append(item)
+            else:
+                item["anchor"] = "twoCell"
+                item["to"] = _anchor_marker(anchor, "to")
+                two_cell.append(item)
+        for item in one_cell + two_cell:
+            yield item
+
+
+# =========================
+# 锚点几何：行高 / 列宽 -> EMU 坐标，按重叠面积把图片分配到行 / 列
+# - 只按左上角锚点取行时，图片锚点落在上一行（从上一行底部开始）就会错行
+# - 这里用 from/to（含 EMU 偏移）算出图片的完整范围，分配给重叠最多的行 / 列（并列取靠上 / 靠左）
+# - 非默认尺寸的行 / 列按区间有序存放，定位一个坐标所在的行 / 列是 O(log n)（bisect）
+# - 图片很多时（>= _NUMPY_MIN）用 NumPy 向量化批量分配；没装 NumPy 则逐个计算，结果一致
+# =========================
+EMU_PER_PT = 12700
+EMU_PER_PX = 9525
+DEFAULT_ROW_PT = 15.0
+DEFAULT_BASE_COL_WIDTH = 8
+
+_NUMPY_MIN = 1024
+
+
+def col_width_to_px(width):
+    """
+    <col width> 字符宽度 -> 像素（按默认字体最大数字宽 7px 计算，与 Excel 一致）
+    """
+    return int(((256 * float(width) + int(128 / 7)) / 256.0) * 7)
+
+
+class _Axis(object):
+    """
+    一条轴（行或列）：默认尺寸 + 若干非默认区间 [(lo, hi, size)]，下标 0-based，尺寸为 EMU
+    """
+
+    def __init__(self, default, runs):
+        self.default = int(default)
+        self.lo = []
+        self.hi = []
+        self.size = []
+        self.start = []  # 每个区间 lo 的起始坐标
+        pos = 0
+        prev_end = 0  # 上一个区间之后的第一个下标
+        for lo, hi, size in sorted(runs):
+            lo = max(int(lo), prev_end)
+            hi = int(hi)
+            if hi < lo:
+                continue
+            pos += (lo - prev_end) * self.default
+            self.lo.append(lo)
+            self.hi.append(hi)
+            self.size.append(max(0, int(size)))
+            self.start.append(pos)
+            pos += (hi - lo + 1) * self.size[-1]
+            prev_end = hi + 1
+
+    def _run_end(self, k):
+        return self.start[k] + (self.hi[k] - self.lo[k] + 1) * self.size[k]
+
+    def offset(self, i):
+        """下标 i 的起始坐标"""
+        k = bisect_right(self.lo, i) - 1
+        if k < 0:
+            return i * self.default
+        if i <= self.hi[k]:
+            return self.start[k] + (i - self.lo[k]) * self.size[k]
+        return self._run_end(k) + (i - self.hi[k] - 1) * self.default
+
+    def extent(self, i):
+        """下标 i 的尺寸"""
+        k = bisect_right(self.lo, i) - 1
+        if k >= 0 and i <= self.hi[k]:
+            return self.size[k]
+        return self.default
+
+    def locate(self, pos):
+        """坐标 pos 所在的下标（隐藏的零尺寸行 / 列不会被选中）"""
+        pos = max(0, int(pos))
+        k = bisect_right(self.start, pos) - 1
+        if k < 0:
+            return pos // self.default
+        end = self._run_end(k)
+        if pos < end:
+            return self.lo[k] + (pos - self.start[k]) // self.size[k]
+        return self.hi[k] + 1 + (pos - end) // self.default
+
+    def best(self, a, b):
+        """区间 [a, b) 重叠最多的下标，并列取较小者"""
+        first = self.locate(a)
+        if b <= a:
+            return first
+        last = self.locate(b - 1)
+        best_i, best_ov = first, -1
+        for i in range(first, last + 1):
+            s = self.offset(i)
+            ov = min(b, s + self.extent(i)) - max(a, s)
+            if ov > best_ov:
+                best_i, best_ov = i, ov
+        return best_i
+
+    def best_many(self, a, b):
+        """
+        best() 的 NumPy 批量版本：a/b 为同长度序列，返回下标列表
+        首 / 末行按部分重叠计算，中间的行整行被覆盖，取其中最大的尺寸
+        """
+        import numpy as np
+
+        a = np.asarray(a, dtype=np.int64)
+        b = np.maximum(np.asarray(b, dtype=np.int64), a + 1)
+        n = int(self.locate(int(b.max()))) + 2
+        sizes = np.full(n, self.default, dtype=np.int64)
+        for lo, hi, size in zip(self.lo, self.hi, self.size):
+            if lo < n:
+                sizes[lo:min(hi, n - 1) + 1] = size
+        starts = np.concatenate(([0], np.cumsum(sizes)))
+
+        first = np.searchsorted(starts, a, side="right") - 1
+        last = np.searchsorted(starts, b - 1, side="right") - 1
+        ov_first = np.minimum(b, starts[first + 1]) - a
+        ov_last = b - starts[last]
+        out = np.where((last > first) & (ov_last > ov_first), last, first)
+
+        # 跨 3 行 / 列以上的（少见）：中间整行覆盖，逐个比较
+        for j in np.nonzero(last - first >= 2)[0]:
+            f, l = int(first[j]), int(last[j])
+            best_i, best_ov = f, int(ov_first[j])
+            mid = sizes[f + 1:l]
+            m = int(mid.argmax())
+            if int(mid[m]) > best_ov:
+                best_i, best_ov = f + 1 + m, int(mid[m])
+            if int(ov_last[j]) > best_ov:
+                best_i = l
+            out[j] = best_i
+        return [int(x) for x in out]
+
+
+class SheetGeometry(object):
+    """
+    工作表的行高 / 列宽（EMU）
+    row_pts:    {row(1-based): 行高 pt}，隐藏行传 0
+    col_widths: [(min, max, 字符宽度)]（1-based，同 <col>），隐藏列宽度传 0
+    """
+
+    def __init__(self, default_row_pt=None, row_pts=None, default_col_px=None, col_widths=None):
+        row_h = int(round(float(default_row_pt or DEFAULT_ROW_PT) * EMU_PER_PT))
+        if not default_col_px:
+            # 未给 defaultColWidth：baseColWidth * 7 + 5px，向上取整到 8 的倍数（= 64px）
+            default_col_px = ((DEFAULT_BASE_COL_WIDTH * 7 + 5 + 7) // 8) * 8
+        col_w = int(default_col_px) * EMU_PER_PX
+
+        self.rows = _Axis(row_h, [(r - 1, r - 1, int(round(float(pt) * EMU_PER_PT)))
+                                  for r, pt in (row_pts or {}).items()])
+        self.cols = _Axis(col_w, [(int(lo) - 1, int(hi) - 1, col_width_to_px(w) * EMU_PER_PX)
+                                  for lo, hi, w in (col_widths or ())])
+
+    def extent(self, fr, to=None, ext=None):
+        """
+        锚点 -> 图片范围 (x0, y0, x1, y1)，EMU；from 为 0-based marker
+        twoCell 用 to，oneCell 用 ext；都没有时返回 None
+        """
+        x0 = self.cols.offset(fr["col"]) + fr.get("colOff", 0)
+        y0 = self.rows.offset(fr["row"]) + fr.get("rowOff", 0)
+        if to is not None:
+            x1 = self.cols.offset(to["col"]) + to.get("colOff", 0)
+            y1 = self.rows.offset(to["row"]) + to.get("rowOff", 0)
+        elif ext is not None:
+            x1 = x0 + int(ext["cx"])
+            y1 = y0 + int(ext["cy"])
+        else:
+            return None
+        return x0, y0, x1, y1
+
+    def assign(self, extents):
+        """
+        批量分配：extents 为 (x0, y0, x1, y1) 列表，返回 [(row, col)]（1-based）
+        """
+        if not extents:
+            return []
+        xs0, ys0, xs1, ys1 = zip(*extents)
+        if len(extents) >= _NUMPY_MIN:
+            try:
+                rows = self.rows.best_many(ys0, ys1)
+                cols = self.cols.best_many(xs0, xs1)
+                return [(r + 1, c + 1) for r, c in zip(rows, cols)]
+            except ImportError:
+                pass
+        return [(self.rows.best(y0, y1) + 1, self.cols.best(x0, x1) + 1)
+                for x0, y0, x1, y1 in extents]
+
+
+def read_sheet_geometry(zf, sheet_part, max_row=None, spans=None):
+    """
+    流式读取 <sheetFormatPr> / <cols> / <row ht>，返回 SheetGeometry
+    max_row: 只需要到这一行（1-based）的行高，读到后立即停止
+    spans:   [(起点行（0-based）, 纵向长度 EMU)]（oneCell：rowOff + cy；twoCell：from / to 的 rowOff），沿行轴累加行高，
+             直到坐标超过每一项的 from 行起点 + 长度才停止；隐藏 / 零高度行不占长度，不会截断范围
+    """
+    tag_fmt = _q(NS_MAIN, "sheetFormatPr")
+    tag_col = _q(NS_MAIN, "col")
+    tag_row = _q(NS_MAIN, "row")
+
+    default_row_pt = None
+    default_col_px = None
+    col_widths = []
+    row_pts = {}
+    r_cur = 0
+    pending = sorted(spans or ())  # 起点坐标还未走到的 span
+    need = 0      # 已确定的 span 终点坐标（EMU）的最大值
+    row_h = None  # 默认行高（EMU），<sheetFormatPr> 在 <sheetData> 之前
+    r_prev = 0    # 上一个 <row> 的行号（1-based）
+    y = 0         # r_prev 之后一行的起点坐标
+    for el, _ in _stream(zf, sheet_part, (tag_fmt, tag_col, tag_row)):
+        if el.tag == tag_fmt:
+            try:
+                default_row_pt = float(el.get("defaultRowHeight"))
+            except (TypeError, ValueError):
+                pass
+            if el.get("defaultColWidth"):
+                try:
+                    default_col_px = col_width_to_px(el.get("defaultColWidth"))
+                except ValueError:
+                    pass
+            elif el.get("baseColWidth"):
+                try:
+                    default_col_px = ((int(el.get("baseColWidth")) * 7 + 5 + 7) // 8) * 8
+                except ValueError:
+                    pass
+        elif el.tag == tag_col:
+            try:
+                lo, hi = int(el.get("min")), int(el.get("max"))
+            except (TypeError, ValueError):
+                continue
+            if el.get("hidden") in ("1", "true"):
+                col_widths.append((lo, hi, 0))
+            elif el.get("width"):
+                col_widths.append((lo, hi, float(el.get("width"))))
+        else:
+            try:
+                r_cur = int(el.get("r"))
+            except (TypeError, ValueError):
+                r_cur += 1
+            if row_h is None:
+                row_h = int(round(float(default_row_pt or DEFAULT_ROW_PT) * EMU_PER_PT))
+            y_cur = y + max(0, r_cur - 1 - r_prev) * row_h  # 本行起点：中间没写出的行为默认行高
+            while pending and pending[0][0] + 1 <= r_cur:
+                fr, length = pending.pop(0)
+                y_fr = y + max(0, fr - r_prev) * row_h if fr + 1 < r_cur else y_cur
+                need = max(need, y_fr + int(length))
+            if max_row is not None and r_cur > int(max_row) and not pending and y_cur >= need:
+                break
+            if el.get("hidden") in ("1", "true"):
+                row_pts[r_cur] = 0
+            elif el.get("ht"):
+                try:
+                    row_pts[r_cur] = float(el.get("ht"))
+                except ValueError:
+                    pass
+            y = y_cur + (int(round(row_pts[r_cur] * EMU_PER_PT)) if r_cur in row_pts else row_h)
+            r_prev = r_cur
+
+    return SheetGeometry(default_row_pt, row_pts, default_col_px, col_widths)
+
+
+def assign_drawing_cells(zf, sheet_part, items):
+    """
+    把 iter_drawing_images 的结果按重叠面积重新分配 row/col（1-based，原地修改并返回 items）
+    行高只读到图片可能覆盖的最大行：沿行轴累加行高直到超过图片下边（见 read_sheet_geometry）
+    - twoCell：from / to 的 rowOff 都按 span 处理（rowOff 可以大于该行行高，落到后面的行）
+    - oneCell：rowOff + cy
+    """
+    items = list(items)
+    if not items:
+        return items
+    max_row = 0
+    spans = []
+    for it in items:
+        if it.get("to") is not None:
+            last = it["to"]["row"] + 1
+            spans.append((it["from"]["row"], it["from"].get("rowOff", 0)))
+            spans.append((it["to"]["row"], it["to"].get("rowOff", 0)))
+        else:
+            last = it["from"]["row"] + 1
+            if it.get("ext") is not None:
+                spans.append((it["from"]["row"], it["from"].get("rowOff", 0) + int(it["ext"]["cy"])))
+        max_row = max(max_row, last)
+
+    geom = read_sheet_geometry(zf, sheet_part, max_row=max_row, spans=spans)
+    idx = []
+    extents = []
+    for i, it in enumerate(items):
+        e = geom.extent(it["from"], it.get("to"), it.get("ext"))
+        if e is not None:
+            idx.append(i)
+            extents.append(e)
+    for i, (r, c) in zip(idx, geom.assign(extents)):
+        items[i]["row"] = r
+        items[i]["col"] = c
+    return items
+
+
+# =========================
+# 单元格取值：只扫描指定列、指定行
+# =========================
+def _cell_text(c, tag_v, tag_is, tag_t):
+    t = c.get("t")
+    if t == "inlineStr":
+        is_ = c.find(tag_is)
+        if is_ is None:
+            return None
+        return "".join(x.text or "" for x in is_.iter(tag_t))
+    v = c.findtext(tag_v)
+    return v
+
+
+def _convert_number(v):
+    try:
+        f = float(v)
+    except (TypeError, ValueError):
+        return v
+    if f.is_integer() and "e" not in v.lower():
+        return int(f)
+    return f
+
+
+def _read_shared_strings(zf, wanted):
+    """
+    只取出需要的共享字符串下标，避免把整张 sharedStrings 放进内存
+    已取出的下标按 zf 缓存，多个工作表共用时只扫描缺少的部分
+    """
+    out = {}
+    if not wanted:
+        return out
+    cache = _cached(zf, "shared_strings", dict)
+    missing = set(i for i in wanted if i not in cache)
+    if not missing:
+        return dict((i, cache[i]) for i in wanted)
+    _, sst_part = _rel_of_type(workbook_rels(zf), "/sharedStrings")
+    if not sst_part or not _has_part(zf, sst_part):
+        return out
+
+    tag_si = _q(NS_MAIN, "si")
+    tag_t = _q(NS_MAIN, "t")
+    tag_rph = _q(NS_MAIN, "rPh")
+    last = max(missing)
+    idx = -1
+    for si, _ in _stream(zf, sst_part, tag_si):
+        idx += 1
+        if idx in missing:
+            # 跳过拼音注音 rPh 里的 t
+            for rph in si.findall(tag_rph):
+                si.remove(rph)
+            cache[idx] = "".join(x.text or "" for x in si.iter(tag_t))
+        if idx >= last:
+            break
+    for i in wanted:
+        if i in cache:
+            out[i] = cache[i]
+    return out
+
+
+def read_column_values(zf, sheet_part, col_idx, rows):
+    """
+    针对性扫描工作表 XML：只返回 col_idx 列、rows 中各行的值 {row: value}
+    - 字符串/共享字符串返回 str，数字返回 int/float，布尔返回 bool
+    - 公式单元格取缓存值
+    - 超过 rows 的最大行后立即停止解析
+    """
+    rows = set(int(r) for r in rows)
+    if not rows:
+        return {}
+    last = max(rows)
+    col_idx = int(col_idx)
+
+    tag_row = _q(NS_MAIN, "row")
+    tag_c = _q(NS_MAIN, "c")
+    tag_v = _q(NS_MAIN, "v")
+    tag_is = _q(NS_MAIN, "is")
+    tag_t = _q(NS_MAIN, "t")
+
+    raw = {}
+    shared = {}
+    r_cur = 0
+    for row_el, _ in _stream(zf, sheet_part, tag_row):
+        try:
+            r_cur = int(row_el.get("r"))
+        except (TypeError, ValueError):
+            r_cur += 1
+        if r_cur > last:
+            break
+        if r_cur not in rows:
+            continue
+        c_cur = 0
+        for c in row_el.iter(tag_c):
+            rr, cc = split_cell_ref(c.get("r"))
+            c_cur = cc if cc is not None else c_cur + 1
+            if c_cur != col_idx:
+                continue
+            t = c.get("t")
+            v = _cell_text(c, tag_v, tag_is, tag_t)
+            if v is None:
+                break
+            if t == "s":
+                try:
+                    shared[r_cur] = int(v)
+                except ValueError:
+                    pass
+            elif t == "b":
+                raw[r_cur] = (v == "1")
+            elif t in ("str", "inlineStr", "e"):
+                raw[r_cur] = v
+            else:
+                raw[r_cur] = _convert_number(v)
+            break
+
+    if shared:
+        sst = _read_shared_strings(zf, set(shared.values()))
+        for r, i in shared.items():
+            if i in sst:
+                raw[r] = sst[i]
+    return raw
+
+
+# =========================
+# 合并单元格：<mergeCells> 一次解析为索引，逐行用 bisect 查所在合并区域
+# - 合并区域互不重叠：某列上的区域按起始行排序后，行 r 只可能落在起始行 <= r 的最后一个区域里
+# - 代替 COM 的逐行 MergeCells / MergeArea 查询，Linux 上也可用
+# =========================
+def _split_range_ref(ref):
+    """
+    'A2:A5' -> (2, 1, 5, 1)；单个单元格 'B3' -> (3, 2, 3, 2)；无法解析返回 None
+    """
+    parts = str(ref or "").split(":")
+    r0, c0 = split_cell_ref(parts[0])
+    r1, c1 = split_cell_ref(parts[-1])
+    if None in (r0, c0, r1, c1):
+        return None
+    return min(r0, r1), min(c0, c1), max(r0, r1), max(c0, c1)
+
+
+class MergeIndex(object):
+    """
+    ranges: [(r0, c0, r1, c1), ...]；按列懒建 (起始行列表, 区域列表)，查询 O(log n)
+    """
+
+    def __init__(self, ranges=()):
+        self.ranges = list(ranges)
+        self._cols = {}
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def _column(self, col):
+        idx = self._cols.get(col)
+        if idx is None:
+            spans = sorted((r0, r1, c0) for r0, c0, r1, c1 in self.ranges if c0 <= col <= c1)
+            idx = self._cols[col] = ([s[0] for s in spans], spans)
+        return idx
+
+    def top_left(self, row, col):
+        """(row, col) 所在合并区域的左上角 (r0, c0)；不在合并区域内返回 None"""
+        row, col = int(row), int(col)
+        starts, spans = self._column(col)
+        i = bisect_right(starts, row) - 1
+        if i < 0:
+            return None
+        r0, r1, c0 = spans[i]
+        if row > r1:
+            return None
+        return r0, c0
+
+
+def read_merge_index(zf, sheet_part):
+    """
+    解析工作表的 <mergeCells>，返回 MergeIndex
+    <mergeCells> 位于 <sheetData> 之后，需要扫完整个工作表；<row> 同时流式清理，内存不随行数增长
+    """
+    tag_row = _q(NS_MAIN, "row")
+    tag_merge = _q(NS_MAIN, "mergeCell")
+    ranges = []
+    for el, _ in _stream(zf, sheet_part, (tag_row, tag_merge)):
+        if el.tag != tag_merge:
+            continue
+        rng = _split_range_ref(el.get("ref"))
+        if rng is not None and rng[:2] != rng[2:]:
+            ranges.append(rng)
+    return MergeIndex(ranges)
+
+
+def read_merged_column_values(zf, sheet_part, col_idx, rows, merges=None):
+    """
+    同 read_column_values，但合并区域内的空单元格取区域左上角的值（与 excel_com.read_merged_column 一致）
+    merges: 已解析的 MergeIndex（None 时解析一次）
+    """
+    rows = set(int(r) for r in rows)
+    col_idx = int(col_idx)
+    if merges is None:
+        merges = read_merge_index(zf, sheet_part)
+
+    # 左上角可能在 rows 之外，也可能在别的列（跨列合并）：按列汇总要读的单元格
+    owner = {}
+    wanted = defaultdict(set)
+    wanted[col_idx].update(rows)
+    for r in rows:
+        tl = merges.top_left(r, col_idx)
+        if tl is not None and tl != (r, col_idx):
+            owner[r] = tl
+            wanted[tl[1]].add(tl[0])
+
+    values = {}
+    for c, rs in wanted.items():
+        for r, v in read_column_values(zf, sheet_part, c, rs).items():
+            values[(r, c)] = v
+
+    out = {}
+    for r in rows:
+        v = values.get((r, col_idx))
+        if (v is None or (isinstance(v, str) and not v.strip())) and r in owner:
+            v = values.get(owner[r])
+        if v is not None:
+            out[r] = v
+    return out
+
+
+# =========================
+# Excel「放置在单元格中」图片（rich value）
+# 单元格 vm -> metadata.xml valueMetadata -> futureMetadata(XLRICHVALUE) rvb
+#          -> richData/rdrichvalue.xml rv -> richValueRel.xml rel -> media
+# =========================
+REL_METADATA = "/sheetMetadata"
+REL_RD_RICH_VALUE = "/rdRichValue"
+REL_RD_RICH_VALUE_STRUCTURE = "/rdRichValueStructure"
+REL_RICH_VALUE_REL = "/richValueRel"
+
+_LOCAL_IMAGE_KEY = "_rvRel:LocalImageIdentifier"
+
+
+def _workbook_part_of(zf, wb_rels, suffix, default):
+    _, target = _rel_of_type(wb_rels, suffix)
+    if target and _has_part(zf, target):
+        return target
+    if _has_part(zf, default):
+        return default
+    return None
+
+
+def _read_metadata_vm(zf, part):
+    """
+    返回 [rich value 下标 或 None, ...]，下标 = vm - 1
+    """
+    type_names = []
+    future = {}
+    value_meta = []
+    cur_future = None
+    in_value_meta = False
+    bk_rcs = []
+    with zf.open(part) as fp:
+        for ev, el in ET.iterparse(fp, events=("start", "end")):
+            name = _local(el.tag)
+            if ev == "start":
+                if name == "futureMetadata":
+                    cur_future = future.setdefault(el.get("name"), [])
+                elif name == "valueMetadata":
+                    in_value_meta = True
+                continue
+            if name == "metadataType":
+                type_names.append(el.get("name"))
+            elif name == "rvb" and cur_future is not None:
+                try:
+                    cur_future.append(int(el.get("i")))
+                except (TypeError, ValueError):
+                    cur_future.append(None)
+            elif name == "rc" and in_value_meta:
+                try:
+                    bk_rcs.append((int(el.get("t")), int(el.get("v"))))
+                except (TypeError, ValueError):
+                    pass
+            elif name == "bk":
+                if in_value_meta:
+                    # 一个 bk 对应一个 vm；多个 rc 时取 XLRICHVALUE 那个
+                    picked = (None, None)
+                    for t, v in bk_rcs:
+                        if 1 <= t <= len(type_names) and type_names[t - 1] == "XLRICHVALUE":
+                            picked = (t, v)
+                            break
+                    value_meta.append(picked)
+                    bk_rcs = []
+                el.clear()
+            elif name == "futureMetadata":
+                cur_future = None
+            elif name == "valueMetadata":
+                in_value_meta = False
+
+    rich = future.get("XLRICHVALUE", [])
+    out = []
+    for t, v in value_meta:
+        if t is None or t < 1 or t > len(type_names) or type_names[t - 1] != "XLRICHVALUE":
+            out.append(None)
+        elif 0 <= v < len(rich):
+            out.append(rich[v])
+        else:
+            out.append(None)
+    return out
+
+
+def _read_rv_structures(zf, part):
+    """
+    返回 [(structure_type, [key,...]), ...]
+    """
+    out = []
+    if not part:
+        return out
+    for el, _ in _stream(zf, part, "s"):
+        keys = [k.get("n") for k in el if _local(k.tag) == "k"]
+        out.append((el.get("t"), keys))
+    return out
+
+
+def _read_rich_values(zf, part, structures):
+    """
+    返回 [richValueRel 下标 或 None, ...]，下标 = rich value 序号
+    """
+    out = []
+    for rv, _ in _stream(zf, part, "rv"):
+        vals = [v.text for v in rv if _local(v.tag) == "v"]
+        pos = 0
+        try:
+            s = int(rv.get("s"))
+        except (TypeError, ValueError):
+            s = None
+        if s is not None and 0 <= s < len(structures):
+            stype, keys = structures[s]
+            if _LOCAL_IMAGE_KEY in keys:
+                pos = keys.index(_LOCAL_IMAGE_KEY)
+            elif stype != "_localImage":
+                out.append(None)
+                continue
+        try:
+            out.append(int(vals[pos]))
+        except (IndexError, TypeError, ValueError):
+            out.append(None)
+    return out
+
+
+def _read_rich_value_rels(zf, part):
+    """
+    返回 [media 部件路径 或 None, ...]，下标 = richValueRel 序号
+    """
+    rels = read_rels(zf, part)
+    out = []
+    for el, _ in _stream(zf, part, "rel"):
+        rid = el.get(_q(NS_REL, "id"))
+        target = rels.get(rid)
+        if target and target[0].endswith(REL_IMAGE) and _has_part(zf, target[1]):
+            out.append(target[1])
+        else:
+            out.append(None)
+    return out
+
+
+def _load_richvalue_index(zf):
+    """
+    构建 vm -> media 映射（整个工作簿一次）：返回 {vm(1-based): media_part}
+    工作簿没有 rich value 图片时返回 {}
+    """
+    wb_rels = workbook_rels(zf)
+    meta = _workbook_part_of(zf, wb_rels, REL_METADATA, "xl/metadata.xml")
+    rv_part = _workbook_part_of(zf, wb_rels, REL_RD_RICH_VALUE, "xl/richData/rdrichvalue.xml")
+    rel_part = _workbook_part_of(zf, wb_rels, REL_RICH_VALUE_REL, "xl/richData/richValueRel.xml")
+    if not meta or not rv_part or not rel_part:
+        return {}
+    st_part = _workbook_part_of(zf, wb_rels, REL_RD_RICH_VALUE_STRUCTURE,
+                                "xl/richData/rdrichvaluestructure.xml")
+
+    vm_list = _read_metadata_vm(zf, meta)
+    rv_list = _read_rich_values(zf, rv_part, _read_rv_structures(zf, st_part))
+    rel_list = _read_rich_value_rels(zf, rel_part)
+
+    out = {}
+    for i, rv_idx in enumerate(vm_list):
+        if rv_idx is None or not (0 <= rv_idx < len(rv_list)):
+            continue
+        rel_idx = rv_list[rv_idx]
+        if rel_idx is None or not (0 <= rel_idx < len(rel_list)):
+            continue
+        media = rel_list[rel_idx]
+        if media:
+            out[i + 1] = media
+    return out
+
+
+def load_richvalue_index(zf):
+    return _cached(zf, "richvalue_index", lambda: _load_richvalue_index(zf))
+
+
+# =========================
+# WPS 单元格图片：=DISPIMG("ID_xxx",1) 公式 + xl/cellimages.xml
+# cellImage/pic/nvPicPr/cNvPr@name = ID，blipFill/blip@r:embed -> cellimages.xml.rels -> media
+# =========================
+REL_WPS_CELL_IMAGE = "/cellImage"
+
+_DISPIMG_RE = re.compile(r'DISPIMG\(\s*"([^"]+)"', re.I)
+
+
+def _load_wps_cellimage_index(zf):
+    """
+    构建 WPS 图片 ID -> media 映射（整个工作簿一次）：返回 {ID: media_part}
+    非 WPS 文件（没有 cellimages.xml）返回 {}
+    """
+    wb_rels = workbook_rels(zf)
+    part = _workbook_part_of(zf, wb_rels, REL_WPS_CELL_IMAGE, "xl/cellimages.xml")
+    if not part:
+        return {}
+
+    rels = read_rels(zf, part)
+    out = {}
+    for ci, _ in _stream(zf, part, "cellImage"):
+        img_id = None
+        rid = None
+        for el in ci.iter():
+            name = _local(el.tag)
+            if name == "cNvPr" and img_id is None:
+                img_id = el.get("name")
+            elif name == "blip" and rid is None:
+                rid = el.get(_q(NS_REL, "embed"))
+        if not img_id or rid not in rels:
+            continue
+        rtype, media = rels[rid]
+        if rtype.endswith(REL_IMAGE) and _has_part(zf, media):
+            out[img_id] = media
+    return out
+
+
+def load_wps_cellimage_index(zf):
+    return _cached(zf, "wps_cellimage_index", lambda: _load_wps_cellimage_index(zf))
+
+
+def iter_cell_images(zf, sheet_part, vm_index, wps_index=None, inventory=None):
+    """
+    流式扫描工作表（单次遍历），产出单元格内图片：(row, col, media_part)
+    - vm_index:  load_richvalue_index 的结果（Excel「放置在单元格中」）
+    - wps_index: load_wps_cellimage_index 的结果（WPS DISPIMG 公式）
+    解析不到图片的单元格不产出
+    inventory（new_inventory 的结果）：同一次遍历顺带记录解析不到图片的 vm / DISPIMG 单元格，
+    以及 inventory["cols"] 各列的最后非空行（此时即使没有任何单元格图片索引也会扫描）
+    """
+    if not vm_index and not wps_index and inventory is None:
+        return
+    cols = inventory["cols"] if inventory is not None else ()
+    last_row = inventory["last_row"] if inventory is not None else None
+    tag_row = _q(NS_MAIN, "row")
+    tag_c = _q(NS_MAIN, "c")
+    tag_f = _q(NS_MAIN, "f")
+    tag_v = _q(NS_MAIN, "v")
+    tag_is = _q(NS_MAIN, "is")
+    r_cur = 0
+    for row_el, _ in _stream(zf, sheet_part, tag_row):
+        try:
+            r_cur = int(row_el.get("r"))
+        except (TypeError, ValueError):
+            r_cur += 1
+        c_cur = 0
+        for c in row_el.iter(tag_c):
+            _, cc = split_cell_ref(c.get("r"))
+            c_cur = cc if cc is not None else c_cur + 1
+
+            if c_cur in cols and (c.findtext(tag_v) or c.find(tag_is) is not None):
+                last_row[c_cur] = r_cur
+
+            media = None
+            ref = False
+            vm = c.get("vm")
+            if vm is not None:
+                ref = True
+                if vm_index:
+                    try:
+                        media = vm_index.get(int(vm))
+                    except ValueError:
+                        media = None
+
+            if media is None and (wps_index or inventory is not None):
+                text = c.findtext(tag_f) or c.findtext(tag_v) or ""
+                if "DISPIMG" in text.upper():
+                    ref = True
+                    m = _DISPIMG_RE.search(text)
+                    if m and wps_index:
+                        media = wps_index.get(m.group(1))
+
+            if media:
+                yield r_cur, c_cur, media
+            elif ref and inventory is not None:
+                inventory["unresolved"].append((r_cur, r_cur, c_cur, c_cur, "cell"))
+
+
+def read_media(zf, part):
+    return zf.read(part)
+
+
+# =========================
+# 媒体流式读取（低内存模式）：不把整张图片读进内存
+# =========================
+def open_media(zf, part):
+    """返回可分块 read() 的文件对象（边解压边读）"""
+    return zf.open(part)
+
+
+def media_size(zf, part):
+    """解压后的大小（zip 目录中的 file_size，不读取内容）"""
+    return zf.getinfo(part).file_size
+
+
+def read_media_head(zf, part, n=16):
+    """只读前 n 个字节（识别图片格式用）"""
+    with zf.open(part) as fp:
+        return fp.read(n)
+
+
+def same_media(zf, a, b, chunk=1024 * 1024):
+    """分块比较两个部件内容是否相同"""
+    if a == b:
+        return True
+    if media_size(zf, a) != media_size(zf, b):
+        return False
+    with zf.open(a) as fa, zf.open(b) as fb:
+        while True:
+            x = fa.read(chunk)
+            y = fb.read(chunk)
+            if x != y:
+                return False
+            if not x:
+                return True
+
+
+def media_signature(zf, part):
+    """
+    不读取内容的媒体指纹：zip 目录中的 CRC32 + 原始大小（增量导出判断是否变化）
+    """
+    info = zf.getinfo(part)
+    return "{:08x}:{}".format(info.CRC, info.file_size)